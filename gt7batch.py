@@ -0,0 +1,225 @@
+# pip3 install numpy
+import numpy as np
+from gt7capture import HEADER_SIZE, PAYLOAD_SIZE, RECORD_SIZE, int_to_ip, ip_to_int
+from gt7packet import KEY, LAYOUT, MAGIC, PACKET_SIZE
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Batch decoding of whole captures into columns, for offline analysis.
+#
+# Every packet has its own IV, but Salsa20 is the same arithmetic for all of
+# them, so the keystream is computed for thousands of packets at once with
+# NumPy, and only for the 64 byte blocks that hold the requested channels.
+#
+# A capture can hold several consoles: every row keeps its `source` address,
+# and packets are fresh per console. Analyses of one car take one console,
+# see single_source.
+
+BLOCK_SIZE = 64
+BLOCKS = (PACKET_SIZE + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+_NUMPY_CODES = {'i': '<i4', 'f': '<f4', 'h': '<i2', 'H': '<u2', 'B': 'u1'}
+
+PACKET_DTYPE = np.dtype({
+	'names': [name for offset, code, name in LAYOUT],
+	'formats': [_NUMPY_CODES[code] for offset, code, name in LAYOUT],
+	'offsets': [offset for offset, code, name in LAYOUT],
+	'itemsize': PACKET_SIZE,
+})
+
+RECORD_DTYPE = np.dtype({
+	'names': ['ts', 'source', 'length', 'data'],
+	'formats': ['<i8', '<u4', '<u2', ('u1', PAYLOAD_SIZE)],
+	'offsets': [0, 8, 12, 16],
+	'itemsize': RECORD_SIZE,
+})
+
+class BatchError(Exception):
+	pass
+
+_SIGMA = np.frombuffer(b'expand 32-byte k', dtype='<u4')
+_KEY = np.frombuffer(KEY, dtype='<u4')
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def salsa20_keystream(seeds, blocks):
+	# Keystream for many packets: seeds are the uint32 values at 0x40, blocks the
+	# block numbers wanted. Returns uint8 of shape (len(seeds), len(blocks) * 64).
+	seeds = np.asarray(seeds, dtype=np.uint32)
+	n = len(seeds)
+	nb = len(blocks)
+	m = n * nb
+	seed = np.repeat(seeds, nb)
+
+	state = np.empty((16, m), dtype=np.uint32)
+	state[0] = _SIGMA[0]
+	state[1:5] = _KEY[0:4, None]
+	state[5] = _SIGMA[1]
+	state[6] = seed ^ np.uint32(0xDEADBEAF)		# Notice DEADBEAF, not DEADBEEF
+	state[7] = seed
+	state[8] = np.tile(np.asarray(blocks, dtype=np.uint32), n)
+	state[9] = 0
+	state[10] = _SIGMA[2]
+	state[11:15] = _KEY[4:8, None]
+	state[15] = _SIGMA[3]
+
+	x = state.copy()
+	t = np.empty(m, dtype=np.uint32)
+	u = np.empty(m, dtype=np.uint32)
+
+	def quarter(a, b, c, d):
+		for dst, s1, s2, r in ((b, a, d, 7), (c, b, a, 9), (d, c, b, 13), (a, d, c, 18)):
+			np.add(x[s1], x[s2], out=t)
+			np.left_shift(t, r, out=u)
+			np.right_shift(t, 32 - r, out=t)
+			np.bitwise_or(t, u, out=t)
+			np.bitwise_xor(x[dst], t, out=x[dst])
+
+	for i in range(10):
+		# column round
+		quarter(0, 4, 8, 12)
+		quarter(5, 9, 13, 1)
+		quarter(10, 14, 2, 6)
+		quarter(15, 3, 7, 11)
+		# row round
+		quarter(0, 1, 2, 3)
+		quarter(5, 6, 7, 4)
+		quarter(10, 11, 8, 9)
+		quarter(15, 12, 13, 14)
+	x += state
+
+	return np.ascontiguousarray(x.T).view(np.uint8).reshape(n, nb * BLOCK_SIZE)
+
+def blocks_for(names):
+	# The Salsa20 blocks holding the given fields, always including the magic
+	blocks = {0}
+	for name in names:
+		offset = PACKET_DTYPE.fields[name][1]
+		size = PACKET_DTYPE.fields[name][0].itemsize
+		blocks.update(range(offset // BLOCK_SIZE, (offset + size - 1) // BLOCK_SIZE + 1))
+	return sorted(blocks)
+
+def records(reader):
+	# Structured view over the records of a CaptureReader, without copying
+	if reader.count == 0:
+		return np.zeros(0, dtype=RECORD_DTYPE)
+	return np.frombuffer(reader.map, dtype=RECORD_DTYPE, count=reader.count, offset=HEADER_SIZE)
+
+def decrypt(rec, blocks=range(BLOCKS)):
+	# Decrypt the given blocks of a slice of records into plain packets;
+	# bytes in blocks that were not asked for are left zero
+	n = len(rec)
+	plain = np.zeros((n, PACKET_SIZE), dtype=np.uint8)
+	if n == 0:
+		return plain
+	data = rec['data']
+	seeds = data[:, 0x40:0x44].copy().view('<u4')[:, 0]
+	stream = salsa20_keystream(seeds, blocks)
+	for i, block in enumerate(blocks):
+		start = block * BLOCK_SIZE
+		end = min(start + BLOCK_SIZE, PACKET_SIZE)
+		np.bitwise_xor(data[:, start:end], stream[:, i * BLOCK_SIZE:i * BLOCK_SIZE + end - start], out=plain[:, start:end])
+	return plain
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def output_dtype(channels):
+	return np.dtype([('ts', '<i8'), ('source', '<u4')] + [(name, PACKET_DTYPE.fields[name][0]) for name in channels if name not in ('ts', 'source')])
+
+def capture_sources(rec):
+	# The console addresses (as ints) of the full size datagrams in records
+	return np.unique(rec['source'][rec['length'] >= PACKET_SIZE])
+
+def single_source(rec, source=None):
+	# The console to decode for an analysis of one car: the one given, or the
+	# only one there is (None); several consoles need one picked
+	if source is not None:
+		return source
+	sources = capture_sources(rec)
+	if len(sources) > 1:
+		raise BatchError('capture has packets from {}: pick one with --source'.format(', '.join(int_to_ip(int(s)) for s in sources)))
+	return None
+
+def decode_records(rec, channels, out, source=None, fresh=True, newest=None):
+	# Decode a slice of records into `out` (an array of output_dtype(channels)).
+	# newest maps a source address to the highest packet id seen from it, and
+	# is carried from one slice to the next. Returns (rows written, newest).
+	if newest is None:
+		newest = {}
+	keep = rec['length'] >= PACKET_SIZE
+	if source is not None:
+		keep &= rec['source'] == ip_to_int(source)
+	rec = rec[keep]
+
+	names = list(channels)
+	if fresh and 'packet_id' not in names:
+		names.append('packet_id')
+	plain = decrypt(rec, blocks_for(names))
+	packets = plain.view(PACKET_DTYPE)[:, 0]
+
+	keep = packets['magic'] == MAGIC
+	if fresh and len(rec):
+		# Like the receiver: drop packets that are not newer than the newest
+		# so far from the same console
+		lowest = np.iinfo(np.int64).min
+		ids = packets['packet_id'].astype(np.int64)
+		ids[~keep] = lowest
+		sources = rec['source']
+		for s in np.unique(sources):
+			rows = np.flatnonzero(sources == s)
+			running = np.maximum.accumulate(np.r_[newest.get(int(s), lowest), ids[rows]])
+			keep[rows] &= ids[rows] > running[:-1]
+			newest[int(s)] = int(running[-1])
+
+	count = int(keep.sum())
+	out['ts'][:count] = rec['ts'][keep]
+	out['source'][:count] = rec['source'][keep]
+	for name in channels:
+		if name not in ('ts', 'source'):
+			out[name][:count] = packets[name][keep]
+	return count, newest
+
+def decode_capture(reader, channels=None, chunk=8192, source=None, fresh=True):
+	# Decode a whole capture into a structured array with one column per
+	# channel plus the receive time `ts` and the console `source`. Memory is the
+	# output plus one chunk.
+	if channels is None:
+		channels = [name for name in PACKET_DTYPE.names if name != 'magic']
+	rec = records(reader)
+	out = np.empty(len(rec), dtype=output_dtype(channels))
+	used = 0
+	newest = {}
+	for start in range(0, len(rec), chunk):
+		count = decode_records(rec[start:start + chunk], channels, out[used:], source, fresh, newest)[0]
+		used += count
+	return out[:used]
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Derived channels, computed the same way as TelemetryPacket does per packet
+
+def car_speed(data):
+	# kph
+	return 3.6 * data['speed']
+
+def tyre_speeds(data):
+	# kph, shape (n, 4) in FL, FR, RL, RR order
+	return np.abs(3.6 * np.stack([
+		data['tyre_diam_fl'] * data['wheel_speed_fl'],
+		data['tyre_diam_fr'] * data['wheel_speed_fr'],
+		data['tyre_diam_rl'] * data['wheel_speed_rl'],
+		data['tyre_diam_rr'] * data['wheel_speed_rr'],
+	], axis=1))
+
+def slip_ratios(data):
+	# tyre speed / car speed, shape (n, 4), NaN while standing still
+	speed = car_speed(data)[:, None]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return np.where(speed > 0, tyre_speeds(data) / speed, np.nan)
+
+def current_gear(data):
+	return data['gears'] & 0b00001111
+
+def suggested_gear(data):
+	return data['gears'] >> 4
+
+def boost(data):
+	return data['boost_raw'] - 1
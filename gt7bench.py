@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from gt7packet import FieldSelection, decode, decrypt_packet, peek_header, salsa20_dec
+from gt7stats import Histogram
+from gt7synth import SyntheticCar
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Benchmarks for the hot paths, on packets from the synthetic car (encrypted
+# with the real key and IV scheme, plausible values in every field the display
+# reads). Every benchmark calls its function over the same inputs again and
+# again for a while and reports calls per second and the latency per call.
+#
+#   header          peek_header, magic and packet id only
+#   decrypt         salsa20_dec of the whole packet
+#   decode          unpacking a decrypted packet
+#   receive-peek    peek_header, then salsa20_dec: a fresh packet checked and decrypted
+#   receive-once    decrypt_packet: the same in one decryption, as the receiver does
+#   fields          FieldSelection, decrypt and decode of a few fields
+#   render          draw_packet and a screen flush, to a null terminal
+#   track-scan-N    find_matching_track scanning N track bounds
+#   track-index-N   the same against a TrackIndex of N track bounds
+#
+# Track tables of growing size are the real table tiled over the map, so
+# every copy has its own start/finish segments; the queries are lap crossings
+# of the real tracks. Results go to a JSON file that a later run compares to.
+
+PACKETS = 3600
+TRACK_SIZES = [100, 1000, 10000, 100000]
+TILE = 5000.0		# m between copies of the track table
+
+def measure(fn, inputs, seconds=1.0):
+	# Returns (calls, elapsed seconds, latency Histogram); calls fn(x) for the
+	# inputs in turn, over and over, for about the given time
+	latency = Histogram()
+	clock = time.perf_counter_ns
+	deadline = clock() + int(seconds * 1e9)
+	calls = 0
+	elapsed = 0
+	while True:
+		for x in inputs:
+			t0 = clock()
+			fn(x)
+			t1 = clock()
+			latency.record(t1 - t0)
+			elapsed += t1 - t0
+			calls += 1
+			if t1 >= deadline:
+				return calls, elapsed / 1e9, latency
+
+def result(calls, elapsed, latency):
+	return {
+		'calls': calls,
+		'seconds': round(elapsed, 6),
+		'perSecond': round(calls / elapsed, 1) if elapsed else None,
+		'mean': round(latency.mean() / 1e3, 3),
+		'p50': round(latency.percentile(50) / 1e3, 3),
+		'p99': round(latency.percentile(99) / 1e3, 3),
+		'max': round(latency.max / 1e3, 3),
+	}
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def packet_inputs(count=PACKETS, seed=1):
+	# (datagrams, decrypted packets, decoded packets) of a synthetic session
+	car = SyntheticCar(seed=seed)
+	datagrams = [car.datagram() for i in range(count)]
+	decrypted = [salsa20_dec(d) for d in datagrams]
+	packets = [decode(d) for d in decrypted]
+	return datagrams, decrypted, packets
+
+def tiled_tracks(trackBounds, size):
+	# size track bounds: the real ones, repeated with an offset per copy
+	from gt7track import TrackBounds
+	tracks = []
+	copy = 0
+	while len(tracks) < size:
+		dx = TILE * (copy % 64)
+		dy = TILE * (copy // 64)
+		for e in trackBounds[:size - len(tracks)]:
+			tracks.append(TrackBounds(TRACK=e.TRACK + 10000 * copy, P1X=e.P1X + dx, P1Y=e.P1Y + dy, P2X=e.P2X + dx, P2Y=e.P2Y + dy, DIRECTION=e.DIRECTION, MINX=e.MINX + dx, MINY=e.MINY + dy, MAXX=e.MAXX + dx, MAXY=e.MAXY + dy))
+		copy += 1
+	return tracks
+
+def track_queries(trackBounds):
+	# A lap crossing of every real track: a short move across the middle of
+	# its start/finish segment in the direction it is driven, with its bounds
+	direction = {'PX': (1, 0), 'NX': (-1, 0), 'PY': (0, 1), 'NY': (0, -1)}
+	queries = []
+	for e in trackBounds:
+		if e.DIRECTION not in direction:
+			continue
+		ux, uy = direction[e.DIRECTION]
+		mx = (e.P1X + e.P2X) / 2
+		my = (e.P1Y + e.P2Y) / 2
+		queries.append((mx - ux, my - uy, mx + ux, my + uy, e.MINX, e.MINY, e.MAXX, e.MAXY))
+	return queries
+
+def run_benchmarks(seconds=1.0, only=None, trackCsv='gt7trackdetect.csv', out=sys.stderr):
+	results = {}
+
+	def wanted(name):
+		return not only or any(name.startswith(prefix) or prefix.startswith(name) for prefix in only)
+
+	def run(name, fn, inputs):
+		if not wanted(name):
+			return
+		results[name] = result(*measure(fn, inputs, seconds))
+		r = results[name]
+		print('{:<20} {:>12.0f}/s {:>10.2f} {:>10.2f} {:>10.2f}'.format(name, r['perSecond'], r['mean'], r['p50'], r['p99']), file=out)
+
+	print('{:<20} {:>14} {:>10} {:>10} {:>10}'.format('benchmark', 'calls/s', 'mean µs', 'p50 µs', 'p99 µs'), file=out)
+	datagrams, decrypted, packets = packet_inputs()
+	run('header', peek_header, datagrams)
+	run('decrypt', salsa20_dec, datagrams)
+	run('decode', decode, decrypted)
+	run('receive-peek', lambda d: salsa20_dec(d, peek_header(d)[1]), datagrams)
+	run('receive-once', decrypt_packet, datagrams)
+	selection = FieldSelection(['packet_id', 'rpm', 'speed', 'current_lap'])
+	run('fields', selection.read, datagrams)
+
+	if wanted('render'):
+		import gt7telemetry
+		null = open(os.devnull, 'w')
+		gt7telemetry.screen.out = null
+		gt7telemetry.draw_layout()
+		gt7telemetry.screen.flush()
+
+		def render(p):
+			gt7telemetry.draw_packet(p, p.current_lap * 1.5, 0.25)
+			gt7telemetry.screen.flush()
+		run('render', render, packets)
+		null.close()
+
+	if wanted('track') and os.path.exists(trackCsv):
+		from gt7track import TrackIndex, find_matching_track, load_track_bounds
+		trackBounds = load_track_bounds(trackCsv)
+		queries = track_queries(trackBounds)
+		for size in TRACK_SIZES:
+			tracks = tiled_tracks(trackBounds, size)
+			index = TrackIndex(tracks)
+			run(f'track-scan-{size}', lambda q: find_matching_track(*q, tracks), queries)
+			run(f'track-index-{size}', lambda q: index.find_matching_track(*q), queries)
+	return results
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def compare(results, baseline, out=sys.stdout):
+	# Calls per second against an earlier run, for the benchmarks in both
+	print('{:<20} {:>12} {:>12} {:>8}'.format('benchmark', 'before/s', 'now/s', 'ratio'), file=out)
+	for name, r in results.items():
+		old = baseline['results'].get(name)
+		if old is None or not old['perSecond']:
+			continue
+		ratio = r['perSecond'] / old['perSecond']
+		print('{:<20} {:>12.0f} {:>12.0f} {:>7.2f}x'.format(name, old['perSecond'], r['perSecond'], ratio), file=out)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Benchmark decryption, decoding, rendering and track matching on synthetic packets')
+	parser.add_argument('--seconds', type=float, default=1.0, help='time per benchmark (default 1)')
+	parser.add_argument('--only', action='append', metavar='PREFIX', help='only run benchmarks starting with this (repeatable)')
+	parser.add_argument('--output', metavar='FILE', help='save the results as JSON')
+	parser.add_argument('--label', help='label for the run in the JSON, e.g. a version')
+	parser.add_argument('--compare', metavar='FILE', help='compare with the results of an earlier run')
+	parser.add_argument('--csv', default='gt7trackdetect.csv', help='track bounds (default gt7trackdetect.csv)')
+	args = parser.parse_args()
+
+	results = run_benchmarks(args.seconds, args.only, args.csv)
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({
+				'label': args.label,
+				'time': time.time(),
+				'python': platform.python_version(),
+				'platform': platform.platform(),
+				'seconds': args.seconds,
+				'results': results,
+			}, f, indent=1)
+	if args.compare:
+		with open(args.compare) as f:
+			compare(results, json.load(f))
@@ -0,0 +1,214 @@
+import mmap
+import os
+import socket
+import struct
+import time
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Raw session capture format.
+#
+# A 64 byte file header followed by fixed-size records, one per received datagram:
+#
+#   int64   receive time (time.monotonic_ns)
+#   uint32  source IPv4 address
+#   uint16  datagram length
+#   2 bytes padding
+#   352     datagram bytes, still encrypted, zero padded
+#
+# Because every record has the same size, the records are their own index:
+# packet N lives at HEADER_SIZE + N * RECORD_SIZE, and a reader can mmap the
+# file and jump there without scanning. The file is only ever appended to.
+
+FILE_MAGIC = b'GT7C'
+FILE_VERSION = 1
+HEADER_SIZE = 64
+PAYLOAD_SIZE = 352			# largest GT7 packet is 0x158 bytes
+RECORD_SIZE = 16 + PAYLOAD_SIZE
+
+_HEADER = struct.Struct('<4sHHHHdq')		# magic, version, header size, record size, payload size, created, monotonic origin
+_RECORD = struct.Struct('<qIH2x')			# receive time, source, length
+_ZEROS = bytes(PAYLOAD_SIZE)
+
+def ip_to_int(ip):
+	return int.from_bytes(socket.inet_aton(ip), 'big')
+
+def int_to_ip(value):
+	return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+class CaptureError(Exception):
+	pass
+
+def read_header(f):
+	# Returns the header fields of an open capture file
+	data = f.read(HEADER_SIZE)
+	if len(data) < HEADER_SIZE:
+		raise CaptureError('truncated capture header')
+	magic, version, headerSize, recordSize, payloadSize, created, origin = _HEADER.unpack_from(data)
+	if magic != FILE_MAGIC:
+		raise CaptureError('not a GT7 capture file')
+	if version != FILE_VERSION or headerSize != HEADER_SIZE or recordSize != RECORD_SIZE or payloadSize != PAYLOAD_SIZE:
+		raise CaptureError(f'unsupported capture version {version}')
+	return created, origin
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class CaptureWriter:
+	# Appends raw datagrams to a capture file. Records are collected in a large
+	# block and written in one go, so recording costs the receive loop a
+	# pack_into and a slice copy per packet.
+	def __init__(self, filename, blockRecords=4096, flushInterval=5.0):
+		self.filename = filename
+		self.f = open(filename, 'ab')
+		size = self.f.tell()
+		if size == 0:
+			self.created = time.time()
+			self.origin = time.monotonic_ns()
+			self.f.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, HEADER_SIZE, RECORD_SIZE, PAYLOAD_SIZE, self.created, self.origin).ljust(HEADER_SIZE, b'\0'))
+			self.f.flush()
+		else:
+			with open(filename, 'rb') as f:
+				self.created, self.origin = read_header(f)
+			# Drop a partial record left behind by a crash, so records stay aligned
+			partial = (size - HEADER_SIZE) % RECORD_SIZE
+			if partial:
+				self.f.truncate(size - partial)
+				self.f.seek(0, os.SEEK_END)
+
+		self.block = bytearray(blockRecords * RECORD_SIZE)
+		self.view = memoryview(self.block)
+		self.used = 0
+		self.flushInterval = flushInterval
+		self.lastFlush = time.monotonic()
+		self.count = 0
+
+	def write(self, data, ts=None, source=0):
+		if ts is None:
+			ts = time.monotonic_ns()
+		length = min(len(data), PAYLOAD_SIZE)
+		pos = self.used
+		_RECORD.pack_into(self.block, pos, ts, source, length)
+		pos += _RECORD.size
+		self.view[pos:pos + length] = data[:length]
+		if length < PAYLOAD_SIZE:
+			self.view[pos + length:pos + PAYLOAD_SIZE] = _ZEROS[length:]
+		self.used += RECORD_SIZE
+		self.count += 1
+		if self.used == len(self.block) or time.monotonic() - self.lastFlush >= self.flushInterval:
+			self.flush()
+
+	def flush(self):
+		if self.used:
+			self.f.write(self.view[:self.used])
+			self.used = 0
+		self.f.flush()
+		self.lastFlush = time.monotonic()
+
+	def close(self):
+		if self.f is not None:
+			self.flush()
+			self.f.close()
+			self.f = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class CaptureReader:
+	# Memory-maps a capture file. Packet N is found by arithmetic, packet at
+	# time T by an interpolation guess over the (near uniform 60 Hz) receive
+	# times, so neither needs a scan of the file.
+	def __init__(self, filename):
+		self.filename = filename
+		self.f = open(filename, 'rb')
+		self.created, self.origin = read_header(self.f)
+		size = os.fstat(self.f.fileno()).st_size
+		self.count = (size - HEADER_SIZE) // RECORD_SIZE
+		if self.count > 0:
+			self.map = mmap.mmap(self.f.fileno(), HEADER_SIZE + self.count * RECORD_SIZE, access=mmap.ACCESS_READ)
+			self.view = memoryview(self.map)
+		else:
+			self.map = None
+			self.view = memoryview(b'')
+
+	def __len__(self):
+		return self.count
+
+	def offset(self, n):
+		if n < 0:
+			n += self.count
+		if n < 0 or n >= self.count:
+			raise IndexError('packet index out of range')
+		return HEADER_SIZE + n * RECORD_SIZE
+
+	def timestamp(self, n):
+		# Receive time in ns (time.monotonic_ns of the recording machine)
+		return _RECORD.unpack_from(self.view, self.offset(n))[0]
+
+	def __getitem__(self, n):
+		# Returns (receive time ns, source ip, datagram) with the datagram as a memoryview
+		pos = self.offset(n)
+		ts, source, length = _RECORD.unpack_from(self.view, pos)
+		pos += _RECORD.size
+		return ts, int_to_ip(source), self.view[pos:pos + length]
+
+	def __iter__(self):
+		for n in range(self.count):
+			yield self[n]
+
+	def find_time(self, seconds):
+		# Index of the first packet received at or after `seconds` since the first packet
+		if self.count == 0:
+			return 0
+		first = self.timestamp(0)
+		last = self.timestamp(self.count - 1)
+		target = first + int(seconds * 1e9)
+		if target <= first:
+			return 0
+		if target > last:
+			return self.count
+
+		# Guess from the average rate, then widen around the guess until the
+		# target is bracketed and bisect within that small window
+		guess = int((target - first) * (self.count - 1) / (last - first)) if last > first else 0
+		lo = hi = guess
+		step = 1
+		while lo > 0 and self.timestamp(lo) >= target:
+			lo = max(0, lo - step)
+			step *= 2
+		step = 1
+		while hi < self.count - 1 and self.timestamp(hi) < target:
+			hi = min(self.count - 1, hi + step)
+			step *= 2
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.timestamp(mid) < target:
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+	def duration(self):
+		if self.count < 2:
+			return 0.0
+		return (self.timestamp(self.count - 1) - self.timestamp(0)) / 1e9
+
+	def close(self):
+		self.view.release()
+		if self.map is not None:
+			try:
+				self.map.close()
+			except BufferError:
+				# packets handed out are still referenced, the map goes with them
+				pass
+			self.map = None
+		self.f.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import math
+import sys
+from array import array
+from gt7receiver import TelemetryReceiver
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Live delta to the best lap.
+#
+# Lap time is counted in packets (one per 1/60 s) rather than wall clock, and
+# distance along the lap is integrated from the position deltas. Each lap is
+# recorded as a distance -> ticks table; the fastest complete lap becomes the
+# reference, and the running delta is the ticks taken so far minus the ticks
+# the reference needed for the same distance. Distance only grows during a
+# lap, so the reference lookup is a cursor that moves forward (amortised O(1)).
+# All tables are preallocated arrays; a packet allocates nothing.
+
+TICK = 1 / 60
+PAUSED = 2			# 0x8E bit 1
+MAX_STEP = 10.0		# m per packet, larger jumps (a reset, a rewind) use the speed instead
+
+class DeltaEngine:
+	def __init__(self, capacity=60 * 60 * 10):
+		# current lap
+		self.dist = array('d', bytes(8 * capacity))
+		self.ticks = array('d', bytes(8 * capacity))
+		self.count = 0
+		# reference (best) lap
+		self.refDist = array('d', bytes(8 * capacity))
+		self.refTicks = array('d', bytes(8 * capacity))
+		self.refCount = 0
+		self.bestTicks = None
+		self.bestLap = None
+		self.cursor = 0
+
+		self.lap = None
+		self.lastId = None
+		self.complete = False		# current lap started at a lap crossing
+		self.lapTicks = 0
+		self.distance = 0.0
+		self.x = self.y = self.z = 0.0
+		self.delta = None			# seconds, + is slower than the best lap
+
+	def reset(self):
+		self.lap = None
+		self.lastId = None
+		self.count = 0
+		self.delta = None
+
+	def lap_time(self):
+		# seconds
+		return self.lapTicks * TICK
+
+	def _start_lap(self, lap, crossing):
+		if crossing and self.complete and self.count > 1 and (self.bestTicks is None or self.lapTicks < self.bestTicks):
+			# the lap that just ended is the new reference: swap the tables
+			self.refDist, self.dist = self.dist, self.refDist
+			self.refTicks, self.ticks = self.ticks, self.refTicks
+			self.refCount = self.count
+			self.bestTicks = self.lapTicks
+			self.bestLap = self.lap
+		self.lap = lap
+		self.complete = crossing
+		self.lapTicks = 0
+		self.distance = 0.0
+		self.count = 0
+		self.cursor = 0
+		self.delta = None
+
+	def update(self, p):
+		# Feed a TelemetryPacket (fresh ones only, in order)
+		if self.lap is None or p.current_lap < self.lap:
+			# first packet, or restarted: the lap in progress has no known start
+			self._start_lap(p.current_lap, False)
+			self.lastId = p.packet_id
+			self.x, self.y, self.z = p.pos_x, p.pos_y, p.pos_z
+			return
+		if p.current_lap != self.lap:
+			self._start_lap(p.current_lap, p.current_lap == self.lap + 1)
+
+		ticks = p.packet_id - self.lastId
+		self.lastId = p.packet_id
+		if p.flags & PAUSED:
+			return
+		self.lapTicks += ticks
+
+		dx = p.pos_x - self.x
+		dy = p.pos_y - self.y
+		dz = p.pos_z - self.z
+		self.x, self.y, self.z = p.pos_x, p.pos_y, p.pos_z
+		step = math.sqrt(dx * dx + dy * dy + dz * dz)
+		if step > MAX_STEP * ticks:
+			step = p.speed * ticks * TICK
+		self.distance += step
+
+		n = self.count
+		if n < len(self.dist):
+			self.dist[n] = self.distance
+			self.ticks[n] = self.lapTicks
+			self.count = n + 1
+		else:
+			# longer than the tables: not usable as a reference
+			self.complete = False
+
+		self.delta = self._delta()
+
+	def _delta(self):
+		# Ticks ahead of or behind the reference at the current distance, in seconds
+		refCount = self.refCount
+		if refCount < 2:
+			return None
+		d = self.distance
+		refDist = self.refDist
+		i = self.cursor
+		while i < refCount - 2 and refDist[i + 1] <= d:
+			i += 1
+		self.cursor = i
+		d0 = refDist[i]
+		d1 = refDist[i + 1]
+		t0 = self.refTicks[i]
+		if d1 > d0:
+			f = (d - d0) / (d1 - d0)
+			if f > 1.0:
+				f = 1.0
+			elif f < 0.0:
+				f = 0.0
+			t = t0 + f * (self.refTicks[i + 1] - t0)
+		else:
+			t = t0
+		return (self.lapTicks - t) * TICK
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+async def show(ips, interval=1.0):
+	# Listen to several consoles and print lap, lap time and delta per console
+	engines = {}
+
+	def on_packet(p, ts, console):
+		engine = engines.get(console.ip)
+		if engine is None:
+			engine = engines[console.ip] = DeltaEngine()
+		engine.update(p)
+
+	receiver = await TelemetryReceiver(ips, on_packet, drain=False).start()
+	try:
+		while True:
+			await asyncio.sleep(interval)
+			lines = ['{:<15} {:>5} {:>10} {:>10} {:>8} {:>10}'.format('console', 'lap', 'time', 'distance', 'delta', 'best')]
+			for ip, engine in engines.items():
+				delta = '–' if engine.delta is None else '{:+.3f}'.format(engine.delta)
+				best = '–' if engine.bestTicks is None else '{:.3f}'.format(engine.bestTicks * TICK)
+				lines.append('{:<15} {:>5} {:>10.3f} {:>10.1f} {:>8} {:>10}'.format(ip, engine.lap, engine.lap_time(), engine.distance, delta, best))
+			print('\n'.join(lines) + '\n', flush=True)
+	finally:
+		receiver.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Show the live delta to the best lap for one or more consoles')
+	parser.add_argument('ips', nargs='+', help='playstation ip addresses')
+	args = parser.parse_args()
+	try:
+		asyncio.run(show(args.ips))
+	except KeyboardInterrupt:
+		sys.exit(0)
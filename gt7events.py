@@ -0,0 +1,393 @@
+import argparse
+import asyncio
+import struct
+import sys
+# pip3 install numpy
+import numpy as np
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Driving events: wheel lockup and wheelspin (per wheel), rev limiter contact,
+# off-throttle coasting and gear changes.
+#
+# Each event has a condition checked per packet, debounced: it starts once the
+# condition held for `onTicks` packets in a row (from the first of them), and
+# ends when it has not held for `offTicks` packets (at the last one it held).
+# Gear changes count once the new gear has held for `gearTicks` packets.
+#
+# The streaming engine does O(1) work per packet. The batch mode computes the
+# same conditions for a whole capture with NumPy and groups the runs of each
+# condition the same way, so both give the same events in the same order.
+
+LOCKUP, WHEELSPIN, LIMITER, COASTING, GEAR = range(5)
+KINDS = ['lockup', 'wheelspin', 'limiter', 'coasting', 'gear']
+WHEELS = ['FL', 'FR', 'RL', 'RR']
+
+MIN_SPEED = 10.0		# kph, below this slip ratios and coasting mean little
+LOCKUP_SLIP = 0.8		# tyre speed / car speed, braking
+WHEELSPIN_SLIP = 1.1	# tyre speed / car speed, on throttle
+
+EVENT_DTYPE = np.dtype([
+	('kind', 'u1'),
+	('wheel', 'i1'),		# 0-3 for lockup and wheelspin, else -1
+	('gear_from', 'i1'),	# gear changes only, else -1
+	('gear_to', 'i1'),
+	('start_id', '<i4'),	# packet ids
+	('end_id', '<i4'),
+	('start_ts', '<i8'),	# receive time ns
+	('end_ts', '<i8'),
+	('value', '<f4'),		# lockup: lowest slip, wheelspin: highest slip, limiter: highest rpm, coasting: lowest kph
+])
+
+LOG_MAGIC = b'GT7E'
+LOG_VERSION = 1
+_LOG_HEADER = struct.Struct('<4sHH')	# magic, version, record size
+
+CHANNELS = ['packet_id', 'speed', 'throttle', 'brake', 'rpm', 'rev_limiter', 'gears',
+	'wheel_speed_fl', 'wheel_speed_fr', 'wheel_speed_rl', 'wheel_speed_rr',
+	'tyre_diam_fl', 'tyre_diam_fr', 'tyre_diam_rl', 'tyre_diam_rr']
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class Debouncer:
+	# One debounced condition; update() returns a finished event tuple or None
+	def __init__(self, kind, wheel, onTicks, offTicks, highest):
+		self.kind = kind
+		self.wheel = wheel
+		self.onTicks = onTicks
+		self.offTicks = offTicks
+		self.highest = highest		# peak is the highest value, else the lowest
+		self.run = 0
+		self.runId = self.runTs = 0
+		self.runPeak = 0.0
+		self.active = False
+		self.off = 0
+		self.startId = self.startTs = 0
+		self.lastId = self.lastTs = 0
+		self.peak = 0.0
+
+	def update(self, condition, value, pktid, ts):
+		if condition:
+			if self.run == 0:
+				self.runId = pktid
+				self.runTs = ts
+				self.runPeak = value
+			elif (value > self.runPeak) if self.highest else (value < self.runPeak):
+				self.runPeak = value
+			self.run += 1
+			self.off = 0
+			self.lastId = pktid
+			self.lastTs = ts
+			if self.active:
+				if (value > self.peak) if self.highest else (value < self.peak):
+					self.peak = value
+			elif self.run >= self.onTicks:
+				self.active = True
+				self.startId = self.runId
+				self.startTs = self.runTs
+				self.peak = self.runPeak
+			return None
+		self.run = 0
+		if self.active:
+			self.off += 1
+			if self.off >= self.offTicks:
+				return self.finish()
+		return None
+
+	def finish(self):
+		if not self.active:
+			return None
+		self.active = False
+		self.off = 0
+		return (self.kind, self.wheel, -1, -1, self.startId, self.lastId, self.startTs, self.lastTs, self.peak)
+
+class GearDetector:
+	def __init__(self, gearTicks):
+		self.gearTicks = gearTicks
+		self.stable = None
+		self.candidate = None
+		self.count = 0
+		self.candidateId = self.candidateTs = 0
+
+	def update(self, gear, pktid, ts):
+		if gear != self.candidate:
+			self.candidate = gear
+			self.count = 0
+			self.candidateId = pktid
+			self.candidateTs = ts
+		self.count += 1
+		if self.count == self.gearTicks:
+			previous = self.stable
+			self.stable = gear
+			if previous is not None and previous != gear:
+				return (GEAR, -1, previous, gear, self.candidateId, self.candidateId, self.candidateTs, self.candidateTs, 0.0)
+		return None
+
+class EventEngine:
+	# Streaming detection, feed it every fresh packet in order
+	def __init__(self, onTicks=3, offTicks=6, gearTicks=3):
+		self.detectors = (
+			[Debouncer(LOCKUP, w, onTicks, offTicks, False) for w in range(4)] +
+			[Debouncer(WHEELSPIN, w, onTicks, offTicks, True) for w in range(4)] +
+			[Debouncer(LIMITER, -1, onTicks, offTicks, True), Debouncer(COASTING, -1, onTicks, offTicks, False)])
+		self.gear = GearDetector(gearTicks)
+		self.count = 0
+
+	def update(self, p, ts):
+		# Returns the events that ended with this packet (usually none)
+		events = []
+		pktid = p.packet_id
+		carSpeed = p.car_speed
+		moving = carSpeed > MIN_SPEED
+		tyreSpeeds = p.tyre_speeds
+		d = self.detectors
+		for w in range(4):
+			slip = tyreSpeeds[w] / carSpeed if carSpeed > 0 else 0.0
+			e = d[w].update(moving and p.brake > 0 and slip < LOCKUP_SLIP, slip, pktid, ts)
+			if e is not None:
+				events.append(e)
+		for w in range(4):
+			slip = tyreSpeeds[w] / carSpeed if carSpeed > 0 else 0.0
+			e = d[4 + w].update(moving and p.throttle > 0 and slip > WHEELSPIN_SLIP, slip, pktid, ts)
+			if e is not None:
+				events.append(e)
+		e = d[8].update(p.rev_limiter > 0 and p.rpm >= p.rev_limiter, p.rpm, pktid, ts)
+		if e is not None:
+			events.append(e)
+		e = d[9].update(moving and p.throttle == 0 and p.brake == 0, carSpeed, pktid, ts)
+		if e is not None:
+			events.append(e)
+		e = self.gear.update(p.current_gear, pktid, ts)
+		if e is not None:
+			events.append(e)
+		self.count += 1
+		return events
+
+	def finish(self):
+		# Events still going at the end of the data
+		return [e for e in (d.finish() for d in self.detectors) if e is not None]
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Batch mode
+
+def conditions(data):
+	# (condition, value, highest) per detector, in EventEngine order, all
+	# computed in float64 like the per packet properties
+	speed = 3.6 * data['speed'].astype(np.float64)
+	moving = speed > MIN_SPEED
+	brake = data['brake'] > 0
+	throttle = data['throttle'] > 0
+	result = []
+	slips = []
+	for w in ('fl', 'fr', 'rl', 'rr'):
+		tyre = np.abs(3.6 * data['tyre_diam_' + w].astype(np.float64) * data['wheel_speed_' + w].astype(np.float64))
+		with np.errstate(divide='ignore', invalid='ignore'):
+			slips.append(np.where(speed > 0, tyre / speed, 0.0))
+	for slip in slips:
+		result.append((moving & brake & (slip < LOCKUP_SLIP), slip, False))
+	for slip in slips:
+		result.append((moving & throttle & (slip > WHEELSPIN_SLIP), slip, True))
+	rpm = data['rpm'].astype(np.float64)
+	limiter = data['rev_limiter']
+	result.append(((limiter > 0) & (rpm >= limiter), rpm, True))
+	result.append((moving & ~throttle & ~brake, speed, False))
+	return result
+
+def true_runs(condition):
+	# (first row, last row) of every run of True
+	edges = np.diff(np.r_[0, condition.astype(np.int8), 0])
+	return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+def debounce(condition, value, highest, onTicks, offTicks):
+	# Events of one condition: (start row, end row, emit row, peak) arrays
+	starts, ends = true_runs(condition)
+	if len(starts) == 0:
+		return [np.zeros(0, dtype=np.int64)] * 3 + [np.zeros(0)]
+	# runs closer than offTicks to the previous one belong to its group
+	gaps = starts[1:] - ends[:-1] - 1
+	group = np.r_[0, np.cumsum(gaps >= offTicks)]
+	long = (ends - starts + 1) >= onTicks
+	groups = group[-1] + 1
+	# an event starts at the first long run of a group and ends with its last run
+	runIndex = np.arange(len(starts))
+	first = np.full(groups, len(starts))
+	np.minimum.at(first, group[long], runIndex[long])
+	has = first < len(starts)
+	last = np.searchsorted(group, np.arange(groups), side='right') - 1
+	first = first[has]
+	last = last[has]
+	eventStart = starts[first]
+	eventEnd = ends[last]
+	# reported offTicks rows after the end, or at the end of the data
+	emit = np.minimum(eventEnd + offTicks, len(condition))
+
+	# peak over the rows where the condition held
+	masked = np.where(condition, value, -np.inf if highest else np.inf)
+	if len(eventStart):
+		reduce = np.maximum if highest else np.minimum
+		bounds = np.stack([eventStart, eventEnd + 1], axis=1).ravel()
+		peaks = reduce.reduceat(masked, bounds[:-1] if bounds[-1] == len(masked) else bounds)[::2]
+	else:
+		peaks = np.zeros(0)
+	return eventStart, eventEnd, emit, peaks
+
+def gear_changes(gear, gearTicks):
+	# (row, from, to, emit row) of every gear change
+	starts = np.flatnonzero(np.r_[True, gear[1:] != gear[:-1]])
+	stops = np.r_[starts[1:], len(gear)]
+	stable = (stops - starts) >= gearTicks
+	starts = starts[stable]
+	values = gear[starts]
+	change = np.flatnonzero(values[1:] != values[:-1]) + 1
+	return starts[change], values[change - 1], values[change], starts[change] + gearTicks - 1
+
+def detect_batch(data, onTicks=3, offTicks=6, gearTicks=3):
+	# Events of decoded rows (from gt7batch, with CHANNELS and ts), in the order
+	# the streaming engine reports them
+	ids = data['packet_id']
+	ts = data['ts']
+	parts = []
+	for order, (condition, value, highest) in enumerate(conditions(data)):
+		start, end, emit, peak = debounce(condition, value, highest, onTicks, offTicks)
+		e = np.zeros(len(start), dtype=EVENT_DTYPE)
+		e['kind'] = LOCKUP if order < 4 else WHEELSPIN if order < 8 else LIMITER if order == 8 else COASTING
+		e['wheel'] = order % 4 if order < 8 else -1
+		e['gear_from'] = e['gear_to'] = -1
+		e['start_id'] = ids[start]
+		e['end_id'] = ids[end]
+		e['start_ts'] = ts[start]
+		e['end_ts'] = ts[end]
+		e['value'] = peak
+		parts.append((e, emit, np.full(len(e), order)))
+	if len(data):
+		row, before, after, emit = gear_changes(data['gears'] & 0b00001111, gearTicks)
+		e = np.zeros(len(row), dtype=EVENT_DTYPE)
+		e['kind'] = GEAR
+		e['wheel'] = -1
+		e['gear_from'] = before
+		e['gear_to'] = after
+		e['start_id'] = e['end_id'] = ids[row]
+		e['start_ts'] = e['end_ts'] = ts[row]
+		parts.append((e, emit, np.full(len(e), len(parts))))
+	events = np.concatenate([p[0] for p in parts])
+	emit = np.concatenate([p[1] for p in parts])
+	order = np.concatenate([p[2] for p in parts])
+	return events[np.lexsort((order, emit))]
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class EventLog:
+	# Appends events as fixed size binary records
+	def __init__(self, filename):
+		self.f = open(filename, 'ab')
+		if self.f.tell() == 0:
+			self.f.write(_LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, EVENT_DTYPE.itemsize))
+
+	def write(self, events):
+		if len(events):
+			self.f.write(np.array(events, dtype=EVENT_DTYPE).tobytes())
+
+	def flush(self):
+		self.f.flush()
+
+	def close(self):
+		self.f.close()
+
+def read_log(filename):
+	with open(filename, 'rb') as f:
+		magic, version, size = _LOG_HEADER.unpack(f.read(_LOG_HEADER.size))
+		if magic != LOG_MAGIC or version != LOG_VERSION or size != EVENT_DTYPE.itemsize:
+			raise ValueError(f'{filename} is not a compatible event log')
+		return np.fromfile(f, dtype=EVENT_DTYPE)
+
+def describe(e):
+	kind = int(e['kind'])
+	duration = (int(e['end_ts']) - int(e['start_ts'])) / 1e9
+	if kind == GEAR:
+		return f'{int(e["start_id"]):>9}  gear       {int(e["gear_from"])} -> {int(e["gear_to"])}'
+	what = KINDS[kind] + (' ' + WHEELS[int(e['wheel'])] if int(e['wheel']) >= 0 else '')
+	return f'{int(e["start_id"]):>9}  {what:<13} {duration:6.2f} s  {int(e["end_id"]) - int(e["start_id"]) + 1:>5} packets  peak {float(e["value"]):.2f}'
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def detect_stream(reader, source=None, **kwargs):
+	# The streaming engine run over a capture (the packets of one console), for
+	# comparing with detect_batch
+	from gt7packet import fresh_packets
+	engine = EventEngine(**kwargs)
+	events = []
+	for ts, address, p in fresh_packets(reader, source):
+		events.extend(engine.update(p, ts))
+	events.extend(engine.finish())
+	return np.array(events, dtype=EVENT_DTYPE)
+
+async def live(ips, log=None):
+	from gt7receiver import TelemetryReceiver
+	engines = {}
+
+	def on_packet(p, ts, console):
+		engine = engines.get(console.ip)
+		if engine is None:
+			engine = engines[console.ip] = EventEngine()
+		events = engine.update(p, ts)
+		if events:
+			if log is not None:
+				log.write(events)
+			for e in np.array(events, dtype=EVENT_DTYPE):
+				print(f'{console.ip:<15} {describe(e)}', flush=True)
+
+	# every packet counts for the debouncing, so no draining
+	receiver = await TelemetryReceiver(ips, on_packet, drain=False).start()
+	try:
+		while True:
+			await asyncio.sleep(1)
+			if log is not None:
+				log.flush()
+	finally:
+		receiver.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Detect lockups, wheelspin, limiter contact, coasting and gear changes')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('live', help='listen to consoles and print events as they happen')
+	p.add_argument('ips', nargs='+', help='playstation ip addresses')
+	p.add_argument('--log', help='append events to this event log')
+	p = sub.add_parser('batch', help='detect the events of a capture')
+	p.add_argument('capture', help='capture file recorded with --record')
+	p.add_argument('--log', help='append events to this event log')
+	p.add_argument('--check', action='store_true', help='also run the streaming engine and compare')
+	p.add_argument('--source', help='only packets from this console ip')
+	p = sub.add_parser('show', help='print an event log')
+	p.add_argument('log', help='event log')
+	args = parser.parse_args()
+
+	if args.command == 'live':
+		log = EventLog(args.log) if args.log else None
+		try:
+			asyncio.run(live(args.ips, log))
+		except KeyboardInterrupt:
+			pass
+		finally:
+			if log is not None:
+				log.close()
+	elif args.command == 'batch':
+		from gt7batch import BatchError, decode_capture, records, single_source
+		from gt7capture import CaptureReader
+		with CaptureReader(args.capture) as reader:
+			try:
+				source = single_source(records(reader), args.source)
+			except BatchError as e:
+				sys.exit(str(e))
+			events = detect_batch(decode_capture(reader, CHANNELS, source=source))
+			if args.check:
+				streamed = detect_stream(reader, source)
+				same = len(streamed) == len(events) and bool((streamed == events).all())
+				print(f'streaming engine: {len(streamed)} events, {"same" if same else "DIFFERENT"}', file=sys.stderr)
+		for e in events:
+			print(describe(e))
+		if args.log:
+			log = EventLog(args.log)
+			log.write(events)
+			log.close()
+	else:
+		for e in read_log(args.log):
+			print(describe(e))
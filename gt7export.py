@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import json
+import math
+import socket
+import struct
+import sys
+from gt7packet import FieldSelection
+from gt7pipeline import DROP_NEWEST, PACKET, Pipeline
+from gt7receiver import TelemetryReceiver
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Headless export: selected fields of every fresh packet, streamed to stdout,
+# a file or a local socket, as packed binary records, CSV or JSON lines.
+#
+# Only the part of the packet the fields need is decrypted (FieldSelection).
+# Binary records are copied straight out of the decrypted bytes through
+# memoryview slices, a run of adjacent fields in one go, into a preallocated
+# block; text lines are formatted from one struct unpack with a template made
+# once for the selection. Output is written a block at a time, and at least
+# every flush interval so a slow packet rate still streams.
+#
+# Fields are exported in packet order. A binary export starts with a header:
+#
+#   magic 'GT7X', version (u16), length of the JSON that follows (u16),
+#   JSON {"channels": [[name, struct code], ...], "recordSize": n}
+#
+# followed by the records, little-endian and without padding.
+
+FORMATS = ['binary', 'csv', 'jsonl']
+EXPORT_MAGIC = b'GT7X'
+EXPORT_VERSION = 1
+_HEADER = struct.Struct('<4sHH')
+EXPORT_WAKE = 256		# packets the export thread is woken for, else every flush interval
+
+class ExportError(Exception):
+	pass
+
+class Exporter:
+	# Writes the selected fields of decrypted packets (as FieldSelection.decrypt
+	# returns them) to a binary stream, in blocks of about blockSize bytes
+	def __init__(self, out, selection, fmt='binary', blockSize=1 << 16):
+		if fmt not in FORMATS:
+			raise ExportError(f'unknown format {fmt}')
+		self.out = out
+		self.selection = selection
+		self.fmt = fmt
+		self.records = 0
+		self.unpack = selection.struct.unpack_from
+		codes = [code for offset, code, name in selection.layout]
+
+		if fmt == 'binary':
+			self.record = struct.Struct('<' + ''.join(codes))
+			# (from, to, position in the record): adjacent fields are one copy
+			self.copies = []
+			pos = 0
+			for offset, code, name in selection.layout:
+				size = struct.calcsize('<' + code)
+				if self.copies and self.copies[-1][1] == offset:
+					self.copies[-1] = (self.copies[-1][0], offset + size, self.copies[-1][2])
+				else:
+					self.copies.append((offset, offset + size, pos))
+				pos += size
+			self.block = bytearray(max(1, blockSize // self.record.size) * self.record.size)
+			self.pos = 0
+		else:
+			conversions = ['%.9g' if code == 'f' else '%d' for code in codes]		# 9 digits keep a float32 exact
+			if fmt == 'csv':
+				self.template = ','.join(conversions) + '\n'
+			else:
+				self.template = '{' + ','.join('"%s":%s' % (name, conversion) for name, conversion in zip(selection.names, conversions)) + '}\n'
+			# JSON has no nan or inf, both of which have an n in them: a line
+			# with more n's than the template itself is written the slow way
+			self.letters = (self.template % ((0,) * len(codes))).count('n')
+			self.lines = []
+			self.linesPerBlock = max(1, blockSize // (10 * len(codes)))
+
+	def write_header(self):
+		if self.fmt == 'binary':
+			meta = json.dumps({'channels': [[name, code] for offset, code, name in self.selection.layout], 'recordSize': self.record.size}).encode()
+			self.out.write(_HEADER.pack(EXPORT_MAGIC, EXPORT_VERSION, len(meta)) + meta)
+		elif self.fmt == 'csv':
+			self.out.write((','.join(self.selection.names) + '\n').encode())
+
+	def write(self, ddata):
+		self.records += 1
+		if self.fmt == 'binary':
+			block = self.block
+			pos = self.pos
+			view = memoryview(ddata)
+			for start, end, at in self.copies:
+				block[pos + at:pos + at + end - start] = view[start:end]
+			self.pos = pos + self.record.size
+			if self.pos == len(block):
+				self.flush()
+		else:
+			line = self.template % self.unpack(ddata)
+			if self.fmt == 'jsonl' and line.count('n') != self.letters:
+				values = [None if isinstance(v, float) and not math.isfinite(v) else v for v in self.unpack(ddata)]
+				line = json.dumps(dict(zip(self.selection.names, values)), separators=(',', ':')) + '\n'
+			self.lines.append(line)
+			if len(self.lines) >= self.linesPerBlock:
+				self.flush()
+
+	def flush(self):
+		if self.fmt == 'binary':
+			if self.pos:
+				with memoryview(self.block) as view:
+					self.out.write(view[:self.pos])
+				self.pos = 0
+		elif self.lines:
+			self.out.write(''.join(self.lines).encode())
+			self.lines.clear()
+		self.out.flush()
+
+	def close(self):
+		self.flush()
+		if self.out is not sys.stdout.buffer:
+			self.out.close()
+
+def open_output(target):
+	# '-' is stdout, unix:PATH and tcp:HOST:PORT connect to a listening socket,
+	# anything else is a file
+	if target == '-':
+		return sys.stdout.buffer
+	if target.startswith('unix:'):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.connect(target[5:])
+		return sock.makefile('wb')
+	if target.startswith('tcp:'):
+		host, port = target[4:].rsplit(':', 1)
+		sock = socket.create_connection((host, int(port)))
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		return sock.makefile('wb')
+	return open(target, 'wb')
+
+def read_binary(f):
+	# Returns (channel names, iterator of record tuples) of a binary export
+	header = f.read(_HEADER.size)
+	if len(header) < _HEADER.size:
+		raise ExportError('not a binary export')
+	magic, version, length = _HEADER.unpack(header)
+	if magic != EXPORT_MAGIC or version != EXPORT_VERSION:
+		raise ExportError('not a binary export')
+	meta = json.loads(f.read(length))
+	record = struct.Struct('<' + ''.join(code for name, code in meta['channels']))
+
+	def records():
+		rest = b''
+		while True:
+			block = f.read(record.size * 4096)
+			if not block:
+				return
+			block = rest + block
+			end = len(block) - len(block) % record.size
+			yield from record.iter_unpack(block[:end])
+			rest = block[end:]
+
+	return [name for name, code in meta['channels']], records()
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+async def export(ip, target, names, fmt='binary', flushInterval=0.1, queueSize=1 << 16):
+	# Stream every fresh packet of a console until cancelled. The exporter runs
+	# on its own thread behind a queue (gt7pipeline.py), so a slow output only
+	# drops packets (counted) and never holds up the receiver
+	selection = FieldSelection(names)
+	exporter = Exporter(open_output(target), selection, fmt)
+	exporter.write_header()
+	pipeline = Pipeline()
+	stage = pipeline.add('export', lambda item: exporter.write(item[0]), PACKET, queueSize, DROP_NEWEST, flush=exporter.flush, interval=flushInterval, wake=EXPORT_WAKE)
+	receiver = TelemetryReceiver(ip, pipeline.on_packet, drain=False, fields=selection)
+	pipeline.start()
+	await receiver.start()
+	try:
+		while True:
+			await asyncio.sleep(flushInterval)
+			# the output is gone (or failed): stop
+			if stage.lastError is not None:
+				raise stage.lastError
+	finally:
+		receiver.close()
+		pipeline.stop()
+		console = receiver.consoles[ip]
+		print(f'{exporter.records} packets exported, {console.lost} lost, {stage.queue.dropped} dropped behind a slow output', file=sys.stderr)
+		exporter.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Print a binary export (gt7telemetry.py --export binary) as CSV')
+	parser.add_argument('file', help='binary export file')
+	args = parser.parse_args()
+
+	with open(args.file, 'rb') as f:
+		names, records = read_binary(f)
+		print(','.join(names))
+		for r in records:
+			print(','.join(str(v) for v in r))
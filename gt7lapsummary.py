@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import math
+import os
+import sys
+from collections import deque
+# pip3 install numpy
+import numpy as np
+from gt7session import LAP_CHANNELS, SessionError, format_laptime, lap_index
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Per lap summaries for strategy: fuel burned, tyre temperatures (min, max and
+# mean per tyre), oil and water temperature peaks, top speed and time at full
+# throttle, and how many laps the fuel left lasts.
+#
+# The streaming summariser keeps running statistics of the lap in progress
+# only (O(1) per lap) and emits a summary when the lap number changes, like
+# the lap state of the receiver. A lap is complete when the next lap is its
+# number plus one; its fuel and ticks then reach up to the next lap's first
+# packet, as in the session lap index. Paused packets (0x8E bit 1) count for
+# nothing but the ticks.
+#
+# The batch mode computes the same summaries for a whole capture or session
+# with NumPy, lap by lap on the lap index, so both give the same numbers (up
+# to the rounding of the mean temperatures).
+
+PAUSED = 2			# 0x8E bit 1
+FULL_THROTTLE = 255
+FUEL_WINDOW = 3		# complete laps the fuel projection averages over
+WHEELS = ['fl', 'fr', 'rl', 'rr']
+
+SUMMARY_DTYPE = np.dtype([
+	('lap', '<i4'),
+	('first_id', '<i4'),	# packet ids
+	('last_id', '<i4'),
+	('ticks', '<i4'),		# packets (1/60 s), as in the lap index
+	('lap_time', '<i4'),	# ms, from 0x7C once the next lap started; -1 if unknown
+	('complete', '?'),		# followed by the next lap
+	('fuel_start', '<f4'),
+	('fuel_end', '<f4'),	# at the next lap's first packet for a complete lap
+	('fuel_used', '<f4'),
+	('laps_left', '<f4'),	# fuel_end / mean fuel used by the last complete laps, NaN if none yet
+] + [(f'tyre_min_{w}', '<f4') for w in WHEELS] + [(f'tyre_max_{w}', '<f4') for w in WHEELS] + [(f'tyre_mean_{w}', '<f4') for w in WHEELS] + [
+	('oil_peak', '<f4'),
+	('water_peak', '<f4'),
+	('top_speed', '<f4'),	# kph
+	('full_throttle', '<f4'),	# s
+])
+
+CHANNELS = LAP_CHANNELS + ['flags', 'fuel_level', 'speed', 'throttle', 'oil_temp', 'water_temp'] + [f'tyre_temp_{w}' for w in WHEELS]
+
+class FuelProjection:
+	# Laps left on the fuel at the end of a lap, from the mean fuel used by the
+	# last `window` complete laps that used any (refuelling laps are left out)
+	def __init__(self, window=FUEL_WINDOW):
+		self.used = deque(maxlen=window)
+
+	def update(self, complete, used, fuelEnd):
+		if complete and used > 0:
+			self.used.append(used)
+		if not self.used:
+			return math.nan
+		return fuelEnd / (sum(self.used) / len(self.used))
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class LapSummarizer:
+	# Streaming summaries, feed it every fresh packet in order
+	def __init__(self, window=FUEL_WINDOW):
+		self.projection = FuelProjection(window)
+		self.lap = None
+		self.lastId = None
+		self.lastFuel = 0.0
+
+	def _start(self, p):
+		self.lap = p.current_lap
+		self.firstId = p.packet_id
+		self.fuelStart = p.fuel_level
+		self.count = 0
+		self.tyreMin = [math.inf] * 4
+		self.tyreMax = [-math.inf] * 4
+		self.tyreSum = [0.0] * 4
+		self.oilPeak = -math.inf
+		self.waterPeak = -math.inf
+		self.topSpeed = -math.inf
+		self.fullTicks = 0
+
+	def update(self, p):
+		# Returns the summary of the lap that ended with the packet before this
+		# one (a tuple in SUMMARY_DTYPE order), or None
+		summary = None
+		if self.lap is None or p.current_lap != self.lap:
+			if self.lap is not None:
+				summary = self._summary(p if p.current_lap == self.lap + 1 else None)
+			self._start(p)
+
+		ticks = p.packet_id - self.lastId if self.lastId is not None else 1
+		self.lastId = p.packet_id
+		self.lastFuel = p.fuel_level
+		if p.flags & PAUSED:
+			return summary
+
+		self.count += 1
+		for w, t in enumerate((p.tyre_temp_fl, p.tyre_temp_fr, p.tyre_temp_rl, p.tyre_temp_rr)):
+			if t < self.tyreMin[w]:
+				self.tyreMin[w] = t
+			if t > self.tyreMax[w]:
+				self.tyreMax[w] = t
+			self.tyreSum[w] += t
+		if p.oil_temp > self.oilPeak:
+			self.oilPeak = p.oil_temp
+		if p.water_temp > self.waterPeak:
+			self.waterPeak = p.water_temp
+		speed = p.car_speed
+		if speed > self.topSpeed:
+			self.topSpeed = speed
+		if p.throttle == FULL_THROTTLE:
+			self.fullTicks += ticks
+		return summary
+
+	def finish(self):
+		# The lap still going at the end of the data
+		if self.lap is None:
+			return None
+		return self._summary(None)
+
+	def _summary(self, following):
+		# following: the first packet of the next lap if this lap is complete
+		complete = following is not None
+		if complete:
+			ticks = following.packet_id - self.firstId
+			lapTime = following.last_lap
+			fuelEnd = following.fuel_level
+		else:
+			ticks = self.lastId - self.firstId + 1
+			lapTime = -1
+			fuelEnd = self.lastFuel
+		used = self.fuelStart - fuelEnd
+		lapsLeft = self.projection.update(complete, used, fuelEnd)
+		n = self.count
+		if n:
+			tyres = self.tyreMin + self.tyreMax + [s / n for s in self.tyreSum]
+			peaks = [self.oilPeak, self.waterPeak, self.topSpeed]
+		else:
+			tyres = [math.nan] * 12
+			peaks = [math.nan] * 3
+		return tuple([self.lap, self.firstId, self.lastId, ticks, lapTime, complete, self.fuelStart, fuelEnd, used, lapsLeft] + tyres + peaks + [self.fullTicks / 60])
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Batch mode
+
+def summarize_batch(data, laps=None, window=FUEL_WINDOW):
+	# Summaries of decoded rows with the CHANNELS (from gt7batch or a session),
+	# laps being their lap index (computed when not given)
+	if not len(data):
+		return np.zeros(0, dtype=SUMMARY_DTYPE)
+	if laps is None:
+		laps = lap_index(data)
+	out = np.zeros(len(laps), dtype=SUMMARY_DTYPE)
+	starts = laps['start'].astype(np.int64)
+	stops = laps['stop'].astype(np.int64)
+	complete = np.r_[laps['lap'][1:] == laps['lap'][:-1] + 1, False]
+	for name in ('lap', 'first_id', 'last_id', 'ticks', 'lap_time'):
+		out[name] = laps[name]
+	out['complete'] = complete
+
+	fuel = data['fuel_level'].astype(np.float64)
+	fuelStart = fuel[starts]
+	fuelEnd = np.where(complete, fuel[np.minimum(stops, len(fuel) - 1)], fuel[stops - 1])
+	used = fuelStart - fuelEnd
+	out['fuel_start'] = fuelStart
+	out['fuel_end'] = fuelEnd
+	out['fuel_used'] = used
+	projection = FuelProjection(window)
+	out['laps_left'] = [projection.update(bool(c), float(u), float(f)) for c, u, f in zip(complete, used, fuelEnd)]
+
+	active = (data['flags'] & PAUSED) == 0
+	count = np.add.reduceat(active.astype(np.int64), starts)
+	empty = count == 0
+
+	def per_lap(ufunc, values, fill):
+		result = ufunc.reduceat(np.where(active, values.astype(np.float64), fill), starts)
+		result[empty] = np.nan
+		return result
+
+	for w in WHEELS:
+		t = data[f'tyre_temp_{w}']
+		out[f'tyre_min_{w}'] = per_lap(np.minimum, t, np.inf)
+		out[f'tyre_max_{w}'] = per_lap(np.maximum, t, -np.inf)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			out[f'tyre_mean_{w}'] = per_lap(np.add, t, 0.0) / count
+	out['oil_peak'] = per_lap(np.maximum, data['oil_temp'], -np.inf)
+	out['water_peak'] = per_lap(np.maximum, data['water_temp'], -np.inf)
+	out['top_speed'] = per_lap(np.maximum, 3.6 * data['speed'].astype(np.float64), -np.inf)
+
+	# ticks since the previous packet, the first packet counting one
+	ids = data['packet_id'].astype(np.int64)
+	ticks = np.diff(ids, prepend=ids[0] - 1)
+	full = active & (data['throttle'] == FULL_THROTTLE)
+	out['full_throttle'] = np.add.reduceat(np.where(full, ticks, 0), starts) / 60
+	return out
+
+def summarize_stream(reader, window=FUEL_WINDOW, source=None):
+	# The streaming summariser run over a capture (the packets of one console),
+	# for comparing with summarize_batch
+	from gt7packet import fresh_packets
+	summarizer = LapSummarizer(window)
+	summaries = []
+	for ts, address, p in fresh_packets(reader, source):
+		s = summarizer.update(p)
+		if s is not None:
+			summaries.append(s)
+	s = summarizer.finish()
+	if s is not None:
+		summaries.append(s)
+	return np.array(summaries, dtype=SUMMARY_DTYPE)
+
+def same_summaries(a, b):
+	# Equal, but for float rounding (the means are summed in a different order)
+	if len(a) != len(b):
+		return False
+	for name in SUMMARY_DTYPE.names:
+		if SUMMARY_DTYPE[name].kind == 'f':
+			if not np.allclose(a[name], b[name], rtol=1e-6, equal_nan=True):
+				return False
+		elif not (a[name] == b[name]).all():
+			return False
+	return True
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def header():
+	return '{:>5} {:>10} {:>1} {:>8} {:>7} {:>17} {:>17} {:>17} {:>17} {:>6} {:>6} {:>7} {:>6}'.format(
+		'lap', 'time', '', 'fuel', 'laps', 'tyre FL', 'tyre FR', 'tyre RL', 'tyre RR', 'oil', 'water', 'top kph', 'full s')
+
+def describe(s):
+	tyres = ['{:5.1f}/{:5.1f}/{:5.1f}'.format(float(s[f'tyre_min_{w}']), float(s[f'tyre_mean_{w}']), float(s[f'tyre_max_{w}'])) for w in WHEELS]
+	return '{:>5} {:>10} {:>1} {:>8.2f} {:>7.1f} {} {:>6.1f} {:>6.1f} {:>7.1f} {:>6.1f}'.format(
+		int(s['lap']), format_laptime(int(s['lap_time'])), '' if s['complete'] else '*', float(s['fuel_used']), float(s['laps_left']),
+		' '.join(tyres), float(s['oil_peak']), float(s['water_peak']), float(s['top_speed']), float(s['full_throttle']))
+
+async def live(ips, window=FUEL_WINDOW):
+	from gt7receiver import TelemetryReceiver
+	summarizers = {}
+
+	def on_packet(p, ts, console):
+		summarizer = summarizers.get(console.ip)
+		if summarizer is None:
+			summarizer = summarizers[console.ip] = LapSummarizer(window)
+		s = summarizer.update(p)
+		if s is not None:
+			print(f'{console.ip:<15} {describe(np.array([s], dtype=SUMMARY_DTYPE)[0])}', flush=True)
+
+	# every packet counts for the throttle time and the peaks, so no draining
+	receiver = await TelemetryReceiver(ips, on_packet, drain=False).start()
+	print(f'{"console":<15} {header()}', flush=True)
+	try:
+		while True:
+			await asyncio.sleep(1)
+	finally:
+		receiver.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Summarise fuel, tyre temperatures, oil and water peaks, top speed and full throttle per lap')
+	parser.add_argument('--window', type=int, default=FUEL_WINDOW, help=f'complete laps the fuel projection averages over (default {FUEL_WINDOW})')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('live', help='listen to consoles and print each lap as it ends')
+	p.add_argument('ips', nargs='+', help='playstation ip addresses')
+	p = sub.add_parser('batch', help='summarise the laps of a capture or a session directory')
+	p.add_argument('path', help='capture file recorded with --record, or a gt7session.py directory')
+	p.add_argument('--output', metavar='FILE', help='also save the summaries to a .npy file')
+	p.add_argument('--check', action='store_true', help='also run the streaming summariser and compare (captures only)')
+	p.add_argument('--source', help='only packets from this console ip (captures only)')
+	args = parser.parse_args()
+
+	if args.command == 'live':
+		try:
+			asyncio.run(live(args.ips, args.window))
+		except KeyboardInterrupt:
+			pass
+	else:
+		if os.path.isdir(args.path):
+			from gt7session import Session
+			if args.check:
+				parser.error('--check needs a capture')
+			try:
+				with Session(args.path) as session:
+					summaries = summarize_batch(session.read(CHANNELS), session.laps, args.window)
+			except SessionError as e:
+				sys.exit(str(e))
+		else:
+			from gt7batch import BatchError, decode_capture, records, single_source
+			from gt7capture import CaptureReader
+			with CaptureReader(args.path) as reader:
+				try:
+					source = single_source(records(reader), args.source)
+				except BatchError as e:
+					sys.exit(str(e))
+				summaries = summarize_batch(decode_capture(reader, CHANNELS, source=source), window=args.window)
+				if args.check:
+					streamed = summarize_stream(reader, args.window, source)
+					same = same_summaries(streamed, summaries)
+					print(f'streaming summariser: {len(streamed)} laps, {"same" if same else "DIFFERENT"}', file=sys.stderr)
+		print(header())
+		for s in summaries:
+			print(describe(s))
+		if args.output:
+			np.save(args.output, summaries)
@@ -0,0 +1,271 @@
+import struct
+from collections import namedtuple
+# pip3 install salsa20
+from salsa20 import Salsa20_xor
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# G7S0 packet layout, shared by the display, the recorder and the analysis tools.
+# See https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs
+
+KEY = b'Simulator Interface Packet GT7 ver 0.0'[0:32]
+MAGIC = 0x47375330
+PACKET_SIZE = 0x128
+
+# (offset, struct format, field name)
+LAYOUT = [
+	(0x00, 'i', 'magic'),
+	(0x04, 'f', 'pos_x'),
+	(0x08, 'f', 'pos_y'),
+	(0x0C, 'f', 'pos_z'),
+	(0x10, 'f', 'vel_x'),
+	(0x14, 'f', 'vel_y'),
+	(0x18, 'f', 'vel_z'),
+	(0x1C, 'f', 'rot_pitch'),
+	(0x20, 'f', 'rot_yaw'),
+	(0x24, 'f', 'rot_roll'),
+	(0x28, 'f', 'unknown_28'),			# rot ??? (N/S)
+	(0x2C, 'f', 'angvel_x'),
+	(0x30, 'f', 'angvel_y'),
+	(0x34, 'f', 'angvel_z'),
+	(0x38, 'f', 'ride_height'),
+	(0x3C, 'f', 'rpm'),
+										# 0x40 - 0x44 is the IV seed, garbage once decrypted
+	(0x44, 'f', 'fuel_level'),
+	(0x48, 'f', 'fuel_capacity'),
+	(0x4C, 'f', 'speed'),				# m/s
+	(0x50, 'f', 'boost_raw'),			# boost + 1
+	(0x54, 'f', 'oil_pressure'),
+	(0x58, 'f', 'water_temp'),
+	(0x5C, 'f', 'oil_temp'),
+	(0x60, 'f', 'tyre_temp_fl'),
+	(0x64, 'f', 'tyre_temp_fr'),
+	(0x68, 'f', 'tyre_temp_rl'),
+	(0x6C, 'f', 'tyre_temp_rr'),
+	(0x70, 'i', 'packet_id'),
+	(0x74, 'h', 'current_lap'),
+	(0x76, 'h', 'total_laps'),
+	(0x78, 'i', 'best_lap'),			# ms, -1 if none
+	(0x7C, 'i', 'last_lap'),			# ms, -1 if none
+	(0x80, 'i', 'time_of_day'),			# ms
+	(0x84, 'h', 'position'),
+	(0x86, 'h', 'total_positions'),
+	(0x88, 'H', 'rev_warning'),
+	(0x8A, 'H', 'rev_limiter'),
+	(0x8C, 'h', 'est_top_speed'),
+	(0x8E, 'B', 'flags'),
+	(0x8F, 'B', 'flags2'),
+	(0x90, 'B', 'gears'),				# low nibble current, high nibble suggested
+	(0x91, 'B', 'throttle'),
+	(0x92, 'B', 'brake'),
+	(0x93, 'B', 'unknown_93'),
+	(0x94, 'f', 'unknown_94'),
+	(0x98, 'f', 'unknown_98'),
+	(0x9C, 'f', 'unknown_9c'),
+	(0xA0, 'f', 'unknown_a0'),
+	(0xA4, 'f', 'wheel_speed_fl'),		# rad/s
+	(0xA8, 'f', 'wheel_speed_fr'),
+	(0xAC, 'f', 'wheel_speed_rl'),
+	(0xB0, 'f', 'wheel_speed_rr'),
+	(0xB4, 'f', 'tyre_diam_fl'),
+	(0xB8, 'f', 'tyre_diam_fr'),
+	(0xBC, 'f', 'tyre_diam_rl'),
+	(0xC0, 'f', 'tyre_diam_rr'),
+	(0xC4, 'f', 'susp_fl'),
+	(0xC8, 'f', 'susp_fr'),
+	(0xCC, 'f', 'susp_rl'),
+	(0xD0, 'f', 'susp_rr'),
+	(0xD4, 'f', 'unknown_d4'),
+	(0xD8, 'f', 'unknown_d8'),
+	(0xDC, 'f', 'unknown_dc'),
+	(0xE0, 'f', 'unknown_e0'),
+	(0xE4, 'f', 'unknown_e4'),
+	(0xE8, 'f', 'unknown_e8'),
+	(0xEC, 'f', 'unknown_ec'),
+	(0xF0, 'f', 'unknown_f0'),
+	(0xF4, 'f', 'clutch'),
+	(0xF8, 'f', 'clutch_engaged'),
+	(0xFC, 'f', 'rpm_after_clutch'),
+	(0x100, 'f', 'gear_unknown'),		# ??? gear
+	(0x104, 'f', 'gear_1'),
+	(0x108, 'f', 'gear_2'),
+	(0x10C, 'f', 'gear_3'),
+	(0x110, 'f', 'gear_4'),
+	(0x114, 'f', 'gear_5'),
+	(0x118, 'f', 'gear_6'),
+	(0x11C, 'f', 'gear_7'),
+	(0x120, 'f', 'gear_8'),
+	(0x124, 'i', 'car_id'),
+]
+
+def build_struct(layout, size):
+	# Build one little-endian format string for the whole layout, padding the gaps
+	fmt = '<'
+	pos = 0
+	for offset, code, name in sorted(layout):
+		if offset < pos:
+			raise ValueError(f'overlapping field {name} at 0x{offset:X}')
+		if offset > pos:
+			fmt += f'{offset - pos}x'
+		fmt += code
+		pos = offset + struct.calcsize('<' + code)
+	if size > pos:
+		fmt += f'{size - pos}x'
+	return struct.Struct(fmt)
+
+PACKET_STRUCT = build_struct(LAYOUT, PACKET_SIZE)
+FIELDS = [name for offset, code, name in sorted(LAYOUT)]
+OFFSETS = {name: (offset, code) for offset, code, name in LAYOUT}
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class TelemetryPacket(namedtuple('TelemetryPacket', FIELDS)):
+	__slots__ = ()
+
+	@property
+	def car_speed(self):
+		# kph
+		return 3.6 * self.speed
+
+	@property
+	def current_gear(self):
+		return self.gears & 0b00001111
+
+	@property
+	def suggested_gear(self):
+		return self.gears >> 4
+
+	@property
+	def boost(self):
+		return self.boost_raw - 1
+
+	@property
+	def has_turbo(self):
+		return self.boost_raw > 0
+
+	@property
+	def is_ev(self):
+		return not self.fuel_capacity > 0
+
+	@property
+	def tyre_speeds(self):
+		# kph, (FL, FR, RL, RR)
+		return (
+			abs(3.6 * self.tyre_diam_fl * self.wheel_speed_fl),
+			abs(3.6 * self.tyre_diam_fr * self.wheel_speed_fr),
+			abs(3.6 * self.tyre_diam_rl * self.wheel_speed_rl),
+			abs(3.6 * self.tyre_diam_rr * self.wheel_speed_rr),
+		)
+
+	@property
+	def slip_ratios(self):
+		# tyre speed / car speed, (FL, FR, RL, RR), None while standing still
+		carSpeed = self.car_speed
+		if carSpeed > 0:
+			return tuple(tyreSpeed / carSpeed for tyreSpeed in self.tyre_speeds)
+		return None
+
+	@property
+	def gear_ratios(self):
+		return (self.gear_1, self.gear_2, self.gear_3, self.gear_4, self.gear_5, self.gear_6, self.gear_7, self.gear_8)
+
+_make = TelemetryPacket._make
+_unpack_from = PACKET_STRUCT.unpack_from
+
+def decode(ddata, offset=0):
+	# Decode a decrypted packet with a single unpack
+	return _make(_unpack_from(ddata, offset))
+
+def encode(packet):
+	# Pack a TelemetryPacket back into a plain (decrypted) packet
+	return PACKET_STRUCT.pack(*packet)
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+_SEED = struct.Struct('<I')
+_IV = struct.Struct('<II')
+_HEADER = struct.Struct('<i108xi')	# magic at 0x00, packet id at 0x70
+HEADER_SIZE = _HEADER.size
+
+def packet_iv(dat):
+	# Seed IV is always located here
+	iv1 = _SEED.unpack_from(dat, 0x40)[0]
+	# Notice DEADBEAF, not DEADBEEF
+	return _IV.pack(iv1 ^ 0xDEADBEAF, iv1)
+
+def peek_header(dat):
+	# Decrypt only the first two Salsa20 blocks (magic and packet id).
+	# Returns (packet id, iv) or None for foreign packets.
+	if len(dat) < PACKET_SIZE:
+		return None
+	iv = packet_iv(dat)
+	magic, pktid = _HEADER.unpack(Salsa20_xor(bytes(dat[:HEADER_SIZE]), iv, KEY))
+	if magic != MAGIC:
+		return None
+	return pktid, iv
+
+def decrypt_packet(dat, end=PACKET_SIZE):
+	# Decrypt the first `end` bytes (at least the header) in one go, for a
+	# packet that is going to be used: cheaper than peek_header and a second
+	# decryption. Returns (packet id, decrypted bytes) or None for foreign packets.
+	if len(dat) < PACKET_SIZE:
+		return None
+	ddata = Salsa20_xor(bytes(dat[:max(end, HEADER_SIZE)]), packet_iv(dat), KEY)
+	magic, pktid = _HEADER.unpack_from(ddata)
+	if magic != MAGIC:
+		return None
+	return pktid, ddata
+
+# data stream decoding
+def salsa20_dec(dat, iv=None):
+	if iv is None:
+		iv = packet_iv(dat)
+	ddata = Salsa20_xor(bytes(dat), iv, KEY)
+	magic = int.from_bytes(ddata[0:4], byteorder='little')
+	if magic != MAGIC:
+		return bytearray(b'')
+	return ddata
+
+def fresh_packets(datagrams, source=None):
+	# (ts, address, TelemetryPacket) for the datagrams (ts, address, data) of a
+	# capture that are newer than the newest so far from their console, as the
+	# receiver hands them on; only those from `source` when given
+	newest = {}
+	for ts, address, data in datagrams:
+		if source is not None and address != source:
+			continue
+		packet = decrypt_packet(data)
+		if packet is None or packet[0] <= newest.get(address, -1):
+			continue
+		newest[address] = packet[0]
+		yield ts, address, decode(packet[1])
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class FieldSelection:
+	# Decrypts and decodes only the named fields of a packet. The salsa20 module
+	# has no block counter, so the keystream is generated up to the last byte
+	# needed rather than per range; fields near the start are the cheapest.
+	def __init__(self, names):
+		layout = [(OFFSETS[name][0], OFFSETS[name][1], name) for name in names]
+		self.layout = sorted(layout)
+		self.names = [name for offset, code, name in self.layout]
+		self.end = max(offset + struct.calcsize('<' + code) for offset, code, name in layout)
+		self.struct = build_struct(layout, self.end)
+		self.record = namedtuple('Fields', self.names)._make
+
+	def decrypt(self, dat, iv=None):
+		if iv is None:
+			iv = packet_iv(dat)
+		return Salsa20_xor(bytes(dat[:self.end]), iv, KEY)
+
+	def read(self, dat, iv=None):
+		return self.record(self.struct.unpack(self.decrypt(dat, iv)))
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def salsa20_enc(ddata, seed):
+	# Encrypt a plain packet the way the console does: the seed is stored
+	# in the clear at 0x40 and the IV is derived from it as in packet_iv
+	dat = bytearray(Salsa20_xor(bytes(ddata), _IV.pack(seed ^ 0xDEADBEAF, seed), KEY))
+	_SEED.pack_into(dat, 0x40, seed)
+	return bytes(dat)
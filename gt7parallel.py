@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool, shared_memory
+# pip3 install numpy
+import numpy as np
+from gt7batch import PACKET_DTYPE, decode_records, output_dtype, records
+from gt7capture import CaptureReader
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Parallel decoding of large captures.
+#
+# Each packet carries its own IV, so shards of a capture decrypt independently.
+# Workers map the capture themselves and write their decoded rows straight into
+# one shared memory output array; only the row counts travel back through the
+# pool. The parent then merges the shards in console and packet id order.
+
+# per worker process state, set up by _init_worker
+_worker = {}
+
+def _init_worker(filename, shmName, channels):
+	reader = CaptureReader(filename)
+	shm = shared_memory.SharedMemory(name=shmName)
+	dtype = output_dtype(channels)
+	_worker['reader'] = reader
+	_worker['records'] = records(reader)
+	_worker['shm'] = shm
+	_worker['out'] = np.ndarray((reader.count,), dtype=dtype, buffer=shm.buf)
+	_worker['channels'] = channels
+
+def _decode_shard(start, stop, chunk, source):
+	# Decode records [start, stop) into output rows starting at `start`
+	rec = _worker['records']
+	out = _worker['out']
+	channels = _worker['channels']
+	used = start
+	for pos in range(start, stop, chunk):
+		count = decode_records(rec[pos:min(pos + chunk, stop)], channels, out[used:stop], source, fresh=False)[0]
+		used += count
+	return start, used - start
+
+def shards(count, parts):
+	# Split [0, count) into `parts` contiguous ranges of near equal size
+	bounds = np.linspace(0, count, parts + 1).astype(np.int64)
+	return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def decode_parallel(filename, channels=None, workers=None, chunk=8192, source=None, unique=True):
+	# Decode a capture with a process pool into a structured array sorted by
+	# console (source), then packet id. With `unique`, a packet id repeated by
+	# the same console keeps its first arrival.
+	if channels is None:
+		channels = [name for name in PACKET_DTYPE.names if name != 'magic']
+	channels = list(channels)
+	if 'packet_id' not in channels:
+		channels.append('packet_id')
+	dtype = output_dtype(channels)
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	with CaptureReader(filename) as reader:
+		count = reader.count
+	if count == 0:
+		return np.zeros(0, dtype=dtype)
+
+	shm = shared_memory.SharedMemory(create=True, size=count * dtype.itemsize)
+	try:
+		out = np.ndarray((count,), dtype=dtype, buffer=shm.buf)
+		# a few shards per worker evens out the load at the end
+		ranges = shards(count, workers * 4)
+		with Pool(workers, initializer=_init_worker, initargs=(filename, shm.name, channels)) as pool:
+			results = pool.starmap(_decode_shard, [(start, stop, chunk, source) for start, stop in ranges])
+
+		# merge in console and packet id order, copying out of shared memory once
+		merged = np.concatenate([out[start:start + used] for start, used in results])
+		del out
+		order = np.lexsort((merged['packet_id'], merged['source']))
+		merged = merged[order]
+		if unique and len(merged):
+			keep = np.empty(len(merged), dtype=bool)
+			keep[0] = True
+			keep[1:] = (merged['packet_id'][1:] != merged['packet_id'][:-1]) | (merged['source'][1:] != merged['source'][:-1])
+			merged = merged[keep]
+		return merged
+	finally:
+		shm.close()
+		shm.unlink()
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Decode a capture file in parallel into a NumPy .npy file')
+	parser.add_argument('capture', help='capture file recorded with --record')
+	parser.add_argument('output', help='output .npy file')
+	parser.add_argument('--channels', help='comma separated channel names (default all)')
+	parser.add_argument('--workers', type=int, help='number of worker processes (default one per core)')
+	parser.add_argument('--source', help='only decode packets from this console ip')
+	args = parser.parse_args()
+
+	channels = args.channels.split(',') if args.channels else None
+	start = time.perf_counter()
+	data = decode_parallel(args.capture, channels, args.workers, source=args.source)
+	elapsed = time.perf_counter() - start
+	np.save(args.output, data)
+	print(f'{len(data)} packets in {elapsed:.2f} s ({len(data) / max(elapsed, 1e-9):.0f}/s)', file=sys.stderr)
@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Consumer pipeline: the receiver hands every packet (and, for a recorder,
+# every datagram) to the consumers that registered for it, each of which runs
+# on its own worker thread behind a bounded queue. Publishing is an append
+# under a lock that a worker only holds to take items off, so a slow consumer
+# (a terminal flush, a disk write, a socket) never holds up the receive path.
+#
+# When a queue is full, its overflow policy decides:
+#
+#   drop-oldest   the oldest item makes room (a display only wants the newest)
+#   drop-newest   the new item is dropped (a recording keeps what it has, with a gap)
+#   block         the publisher waits for room; only for publishers that may
+#                 wait, such as a capture being replayed, never the receiver
+#
+# Every queue counts what was offered, dropped and its deepest backlog. Work
+# that releases the GIL (file and socket writes) runs alongside the receiver;
+# CPU bound consumers share the interpreter with it, and are better off in a
+# separate process reading the shared memory ring (gt7ring.py).
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+BLOCK = 'block'
+POLICIES = [DROP_OLDEST, DROP_NEWEST, BLOCK]
+
+# what the receiver callbacks publish: decoded packets as (packet, receive
+# time ns, console), and raw datagrams as (data, address, receive time ns);
+# a publisher may hand anything else to stages under a name of its own
+PACKET = 'packet'
+DATAGRAM = 'datagram'
+
+# batch sizes the recorder and the track detector are woken for
+RECORD_WAKE = 256
+TRACK_WAKE = 32
+
+class PipelineError(Exception):
+	pass
+
+class StageQueue:
+	# The worker is woken once `wake` items are queued (or by its timeout), so
+	# a consumer that is fine with some latency takes batches instead of a
+	# thread switch per packet
+	def __init__(self, capacity, policy=DROP_OLDEST, wake=1):
+		if policy not in POLICIES:
+			raise PipelineError(f'unknown overflow policy {policy}')
+		if capacity < 1:
+			raise PipelineError('queue capacity must be at least 1')
+		self.capacity = capacity
+		self.policy = policy
+		self.wake = min(max(wake, 1), capacity)
+		self.items = deque()
+		self.lock = threading.Lock()
+		self.notEmpty = threading.Condition(self.lock)
+		self.notFull = threading.Condition(self.lock)
+		self.closed = False
+
+		# counters
+		self.offered = 0
+		self.dropped = 0
+		self.waits = 0				# puts that had to wait for room (block)
+		self.maxDepth = 0
+
+	def put(self, item):
+		# Returns False when an item was dropped, this one or the oldest
+		with self.lock:
+			self.offered += 1
+			if self.closed:
+				self.dropped += 1
+				return False
+			kept = True
+			if len(self.items) >= self.capacity:
+				if self.policy == DROP_NEWEST:
+					self.dropped += 1
+					return False
+				if self.policy == DROP_OLDEST:
+					self.items.popleft()
+					self.dropped += 1
+					kept = False
+				else:
+					self.waits += 1
+					while len(self.items) >= self.capacity and not self.closed:
+						self.notFull.wait()
+			self.items.append(item)
+			depth = len(self.items)
+			if depth > self.maxDepth:
+				self.maxDepth = depth
+			if depth >= self.wake:
+				self.notEmpty.notify()
+			return kept
+
+	def get(self, limit, timeout=None):
+		# Up to limit items, waiting at most timeout seconds for `wake` of
+		# them; None once closed and empty
+		with self.lock:
+			if len(self.items) < self.wake and not self.closed:
+				self.notEmpty.wait(timeout)
+			if not self.items:
+				return None if self.closed else []
+			items = self.items
+			if len(items) <= limit:
+				batch = list(items)
+				items.clear()
+			else:
+				batch = [items.popleft() for i in range(limit)]
+			if self.policy == BLOCK:
+				self.notFull.notify_all()
+			return batch
+
+	def depth(self):
+		return len(self.items)
+
+	def close(self):
+		with self.lock:
+			self.closed = True
+			self.notEmpty.notify_all()
+			self.notFull.notify_all()
+
+class Stage:
+	# One consumer: its worker thread takes the queued items in batches and
+	# calls consume(item) for each. flush(), if given, runs after every batch,
+	# or with an interval once every interval seconds, items or not
+	def __init__(self, name, consume, capacity=1024, policy=DROP_OLDEST, flush=None, interval=None, wake=1, batch=256):
+		if wake > 1 and interval is None:
+			raise PipelineError(f'stage {name} waits for {wake} items and needs an interval')
+		self.name = name
+		self.consume = consume
+		self.flush = flush
+		self.interval = interval
+		self.batch = batch
+		self.queue = StageQueue(capacity, policy, wake)
+		self.thread = threading.Thread(target=self._run, name=f'gt7-{name}', daemon=True)
+
+		# counters
+		self.processed = 0
+		self.errors = 0
+		self.lastError = None
+
+	def _run(self):
+		consume = self.consume
+		interval = self.interval
+		lastFlush = time.monotonic()
+		while True:
+			timeout = None if interval is None else max(0.0, lastFlush + interval - time.monotonic())
+			items = self.queue.get(self.batch, timeout)
+			if items is None:
+				break
+			for item in items:
+				try:
+					consume(item)
+				except Exception as e:
+					self.errors += 1
+					self.lastError = e
+			self.processed += len(items)
+			if self.flush is None:
+				continue
+			if interval is None and not items:
+				continue
+			if interval is not None:
+				now = time.monotonic()
+				if now - lastFlush < interval:
+					continue
+				lastFlush = now
+			try:
+				self.flush()
+			except Exception as e:
+				self.errors += 1
+				self.lastError = e
+		if self.flush is not None:
+			try:
+				self.flush()
+			except Exception as e:
+				self.errors += 1
+				self.lastError = e
+
+	def counters(self):
+		q = self.queue
+		return {
+			'policy': q.policy,
+			'capacity': q.capacity,
+			'depth': q.depth(),
+			'maxDepth': q.maxDepth,
+			'offered': q.offered,
+			'dropped': q.dropped,
+			'waits': q.waits,
+			'processed': self.processed,
+			'errors': self.errors,
+		}
+
+class Pipeline:
+	# The registered stages, and the callbacks a TelemetryReceiver publishes through
+	def __init__(self):
+		self.stages = {}
+		self.routes = {PACKET: [], DATAGRAM: []}
+		self.started = False
+
+	def add(self, name, consume, source=PACKET, capacity=1024, policy=DROP_OLDEST, flush=None, interval=None, wake=1):
+		if name in self.stages:
+			raise PipelineError(f'stage {name} is already registered')
+		stage = Stage(name, consume, capacity, policy, flush, interval, wake)
+		self.stages[name] = stage
+		self.routes.setdefault(source, []).append(stage)
+		if self.started:
+			stage.thread.start()
+		return stage
+
+	def start(self):
+		for stage in self.stages.values():
+			stage.thread.start()
+		self.started = True
+		return self
+
+	def stop(self, timeout=2.0):
+		# Let every worker finish what is queued, then wait for it (at most
+		# timeout seconds per stage)
+		for stage in self.stages.values():
+			stage.queue.close()
+		if self.started:
+			for stage in self.stages.values():
+				stage.thread.join(timeout)
+
+	def publish(self, source, item):
+		for stage in self.routes.get(source, ()):
+			stage.queue.put(item)
+
+	def wants(self, source):
+		return bool(self.routes.get(source))
+
+	def on_packet(self, packet, ts, console):
+		for stage in self.routes[PACKET]:
+			stage.queue.put((packet, ts, console))
+
+	def on_datagram(self, data, address, ts):
+		for stage in self.routes[DATAGRAM]:
+			stage.queue.put((data, address, ts))
+
+	# ––– output ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+	def counters(self):
+		return {name: stage.counters() for name, stage in self.stages.items()}
+
+	def panel(self):
+		# One line for the display: depth/capacity and drops per queue
+		parts = ['queues']
+		for name, stage in self.stages.items():
+			q = stage.queue
+			parts.append(f'{name} {q.depth()}/{q.capacity} drop {q.dropped}' + (f' err {stage.errors}' if stage.errors else ''))
+		return '  '.join(parts)
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class TrackConsumer:
+	# Streaming track detection as a stage: feed it packets; `track` is the
+	# detected track id, or None so far
+	def __init__(self, csvFile='gt7trackdetect.csv', printsFile='gt7trackprints.csv'):
+		from gt7trackdb import load_database
+		from gt7track import StreamingDetector
+		index, tables = load_database(csvFile, printsFile)
+		self.detector = StreamingDetector(index, tables=tables)
+		self.track = None
+		self.lap = None
+
+	def __call__(self, item):
+		p = item[0]
+		if self.lap is not None and p.current_lap < self.lap:
+			# restarted, maybe somewhere else
+			self.detector.reset()
+			self.track = None
+		self.lap = p.current_lap
+		# 0x8E: car on track, not paused, not loading
+		if self.track is None and (p.flags & 0b111) == 0b001:
+			self.track = self.detector.update(p.pos_x, p.pos_z, p.vel_x, p.vel_z)
+
+async def monitor(ips, record=None, track=False, delay=0.0, capacity=1024, policy=DROP_OLDEST, interval=1.0):
+	# Listen to consoles with the chosen consumers and print the queue counters
+	from gt7receiver import TelemetryReceiver
+	pipeline = Pipeline()
+	recorder = None
+	if record:
+		from gt7capture import CaptureWriter, ip_to_int
+		recorder = CaptureWriter(record)
+		pipeline.add('record', lambda item: recorder.write(item[0], ts=item[2], source=ip_to_int(item[1][0])), DATAGRAM, 1 << 16, DROP_NEWEST, interval=1.0, wake=RECORD_WAKE)
+	detector = None
+	if track:
+		detector = TrackConsumer()
+		pipeline.add('track', detector, PACKET, 1 << 12, DROP_NEWEST, interval=0.5, wake=TRACK_WAKE)
+	if delay:
+		# a consumer that takes delay seconds per packet, to watch the policies
+		pipeline.add('slow', lambda item: time.sleep(delay), PACKET, capacity, policy)
+	pipeline.start()
+	receiver = TelemetryReceiver(ips, pipeline.on_packet, pipeline.on_datagram if pipeline.wants(DATAGRAM) else None, drain=False)
+	await receiver.start()
+	try:
+		while True:
+			await asyncio.sleep(interval)
+			lines = ['{:<8} {:<12} {:>8} {:>8} {:>10} {:>10} {:>10} {:>6}'.format('queue', 'policy', 'depth', 'max', 'offered', 'dropped', 'processed', 'errors')]
+			for name, c in pipeline.counters().items():
+				lines.append('{:<8} {:<12} {:>8} {:>8} {:>10} {:>10} {:>10} {:>6}'.format(name, c['policy'], f'{c["depth"]}/{c["capacity"]}', c['maxDepth'], c['offered'], c['dropped'], c['processed'], c['errors']))
+			if detector is not None:
+				lines.append(f'track: {"–" if detector.track is None else detector.track}')
+			print('\n'.join(lines) + '\n', flush=True)
+	finally:
+		receiver.close()
+		pipeline.stop()
+		if recorder is not None:
+			recorder.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Run consumers behind bounded queues and show their depth and drops')
+	parser.add_argument('ips', nargs='+', help='playstation ip addresses')
+	parser.add_argument('--record', metavar='FILE', help='record every datagram to a capture file')
+	parser.add_argument('--track', action='store_true', help='detect the track')
+	parser.add_argument('--delay', type=float, default=0.0, help='add a consumer taking this many seconds per packet')
+	parser.add_argument('--capacity', type=int, default=1024, help='queue capacity of that consumer (default 1024)')
+	parser.add_argument('--policy', choices=POLICIES, default=DROP_OLDEST, help=f'overflow policy of that consumer (default {DROP_OLDEST})')
+	args = parser.parse_args()
+	if args.policy == BLOCK:
+		parser.error('the receiver never waits: block is for publishers that may')
+	try:
+		asyncio.run(monitor(args.ips, args.record, args.track, args.delay, args.capacity, args.policy))
+	except KeyboardInterrupt:
+		sys.exit(0)
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from gt7packet import PACKET_SIZE, decrypt_packet, peek_header, salsa20_dec, decode
+
+# ports for send and receive data
+SendPort = 33739
+ReceivePort = 33740
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class ConsoleState:
+	# Everything the receiver tracks for one PlayStation
+	def __init__(self, ip):
+		self.ip = ip
+		self.pktid = 0
+		self.newest = None
+		self.lastPacket = time.monotonic()
+
+		# lap state, from delivered packets
+		self.lap = -1
+		self.lapStartId = None
+		self.lapStartTs = None
+
+		# counters
+		self.received = 0
+		self.foreign = 0
+		self.stale = 0				# older than or the same as the newest, dropped
+		self.outOfOrder = 0			# of those, older than the newest (not duplicates)
+		self.lost = 0
+		self.gaps = 0				# holes in the packet ids, lost counts the packets
+		self.magic = 0				# full size datagrams with a bad magic
+		self.skipped = 0
+		self.delivered = 0
+
+		# packet rate
+		self.rateStart = time.monotonic()
+		self.rateCount = 0
+		self.packetsPerSecond = 0.0
+
+	def update_lap(self, packet, ts):
+		# Returns True when this packet starts a new lap
+		if packet.current_lap != self.lap:
+			self.lap = packet.current_lap
+			self.lapStartId = packet.packet_id
+			self.lapStartTs = ts
+			return True
+		return False
+
+	def rate(self, now=None):
+		# Fresh packets per second, averaged over the last second or so
+		if now is None:
+			now = time.monotonic()
+		elapsed = now - self.rateStart
+		if elapsed >= 1:
+			self.packetsPerSecond = self.rateCount / elapsed
+			self.rateCount = 0
+			self.rateStart = now
+		return self.packetsPerSecond
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class TelemetryReceiver(asyncio.DatagramProtocol):
+	# Receives, filters and decodes the datagrams of one or more consoles on an
+	# asyncio loop. All consoles share the one socket on 33740; datagrams are
+	# routed to their ConsoleState by source address.
+	#
+	# The heartbeat runs on its own timer, so a slow consumer can no longer
+	# starve the consoles of heartbeats. In drain mode, every wakeup reads the
+	# whole socket backlog and hands the consumer only the newest packet of
+	# each console, so latency stays bounded when the consumer falls behind;
+	# the packets passed over are counted in `skipped`.
+	#
+	# A packet that is going to be delivered is decrypted once, header and all;
+	# only a packet that a later one of the same console in the same backlog
+	# supersedes has just its header peeked at, for the counters.
+	#
+	# With a PipelineStats (gt7stats.py), every stage of a packet is timed and
+	# kernel receive timestamps are read; without, none of that costs anything.
+	#
+	# With a FieldSelection as fields, only the part of the packet those fields
+	# need is decrypted and the consumer gets the decrypted bytes instead of a
+	# TelemetryPacket (no decoding, no lap tracking); see gt7export.py.
+	def __init__(self, ips, onPacket, onDatagram=None, heartbeatInterval=1.0, drain=True, rcvbuf=4 << 20, stats=None, fields=None):
+		if isinstance(ips, str):
+			ips = [ips]
+		self.consoles = {ip: ConsoleState(ip) for ip in ips}
+		self.onPacket = onPacket			# onPacket(packet, receive time ns, console)
+		self.onDatagram = onDatagram		# onDatagram(data, address, receive time ns), every datagram
+		self.heartbeatInterval = heartbeatInterval
+		self.drain = drain
+		self.maxDrain = 4096				# bound one wakeup, so timers still run during a flood
+		self.rcvbuf = rcvbuf
+		self.stats = stats
+		self.fields = fields
+		self.sock = None
+		self.transport = None
+		self.heartbeatHandle = None
+		self.pending = []
+		self.lastError = None
+
+		# counters
+		self.unknown = 0
+		self.heartbeats = 0
+		self.errors = 0
+
+	async def start(self, bind='0.0.0.0', port=ReceivePort):
+		loop = asyncio.get_running_loop()
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+		self.sock.bind((bind, port))
+		self.sock.setblocking(False)
+		if self.stats is not None:
+			self.stats.enable_timestamps(self.sock)
+		await loop.create_datagram_endpoint(lambda: self, sock=self.sock)
+		return self
+
+	def close(self):
+		if self.heartbeatHandle is not None:
+			self.heartbeatHandle.cancel()
+			self.heartbeatHandle = None
+		if self.transport is not None:
+			self.transport.close()
+
+	# send heartbeat
+	def send_hb(self):
+		for ip in self.consoles:
+			self.transport.sendto(b'A', (ip, SendPort))
+		self.heartbeats += 1
+
+	def _heartbeat(self):
+		self.send_hb()
+		self.heartbeatHandle = asyncio.get_running_loop().call_later(self.heartbeatInterval, self._heartbeat)
+
+	# ––– protocol callbacks ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+	def connection_made(self, transport):
+		self.transport = transport
+		self._heartbeat()
+
+	def connection_lost(self, exc):
+		if self.heartbeatHandle is not None:
+			self.heartbeatHandle.cancel()
+			self.heartbeatHandle = None
+
+	def error_received(self, exc):
+		self.errors += 1
+		self.lastError = exc
+
+	def datagram_received(self, data, address):
+		stats = self.stats
+		stamp = None if stats is None else stats.kernel_stamp(self.sock)
+		if not self.drain:
+			self._receive(data, address, time.monotonic_ns(), stamp, False)
+			return
+		backlog = [(data, address, time.monotonic_ns(), stamp)]
+		recvfrom = self.sock.recvfrom
+		for i in range(self.maxDrain):
+			try:
+				data, address = recvfrom(4096)
+			except (BlockingIOError, InterruptedError):
+				break
+			except OSError as exc:
+				self.error_received(exc)
+				break
+			backlog.append((data, address, time.monotonic_ns(), None if stats is None else stats.kernel_stamp(self.sock)))
+		if len(backlog) == 1:
+			self._receive(*backlog[0], False)
+		else:
+			# the last datagram of each console is the one likely to be delivered
+			last = {address[0]: n for n, (data, address, ts, stamp) in enumerate(backlog)}
+			for n, (data, address, ts, stamp) in enumerate(backlog):
+				self._receive(data, address, ts, stamp, last[address[0]] != n)
+		pending = self.pending
+		self.pending = []
+		for console in pending:
+			self._deliver(console)
+
+	# –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+	def _receive(self, data, address, ts, stamp, peek):
+		# peek: only look at the header, the packet is likely superseded
+		stats = self.stats
+		console = self.consoles.get(address[0])
+		if console is None:
+			self.unknown += 1
+			return
+		console.received += 1
+		if self.onDatagram is not None:
+			self.onDatagram(data, address, ts)
+		if stats is not None:
+			t0 = time.monotonic_ns()
+		if peek:
+			header = peek_header(data)
+		else:
+			header = decrypt_packet(data, PACKET_SIZE if self.fields is None else self.fields.end)
+		if stats is not None:
+			stats.record('header' if peek else 'decrypt', time.monotonic_ns() - t0)
+		if header is None:
+			console.foreign += 1
+			if len(data) >= PACKET_SIZE:
+				console.magic += 1
+			return
+		# iv None: data is already decrypted
+		if peek:
+			pktid, iv = header
+		else:
+			pktid, data = header
+			iv = None
+		if pktid <= console.pktid:
+			console.stale += 1
+			if pktid < console.pktid:
+				console.outOfOrder += 1
+			return
+		if console.pktid and pktid > console.pktid + 1:
+			console.lost += pktid - console.pktid - 1
+			console.gaps += 1
+		if stats is not None:
+			stats.arrived(console.ip, pktid, stamp)
+		console.pktid = pktid
+		console.lastPacket = time.monotonic()
+		console.rateCount += 1
+		if console.newest is not None:
+			console.skipped += 1
+		elif self.drain:
+			self.pending.append(console)
+		console.newest = (data, iv, ts)
+		if not self.drain:
+			self._deliver(console)
+
+	def _deliver(self, console):
+		if console.newest is None:
+			return
+		data, iv, ts = console.newest
+		console.newest = None
+		stats = self.stats
+		fields = self.fields
+		try:
+			if stats is None:
+				if iv is not None:
+					data = salsa20_dec(data, iv) if fields is None else fields.decrypt(data, iv)
+				if fields is None:
+					packet = decode(data)
+					console.update_lap(packet, ts)
+				else:
+					packet = data
+				self.onPacket(packet, ts, console)
+			else:
+				t0 = time.monotonic_ns()
+				if iv is None:
+					ddata = data
+				else:
+					ddata = salsa20_dec(data, iv) if fields is None else fields.decrypt(data, iv)
+				t1 = time.monotonic_ns()
+				if fields is None:
+					packet = decode(ddata)
+					console.update_lap(packet, ts)
+				else:
+					packet = ddata
+				t2 = time.monotonic_ns()
+				self.onPacket(packet, ts, console)
+				t3 = time.monotonic_ns()
+				stats.record('queue', t0 - ts)
+				if iv is not None:
+					stats.record('decrypt', t1 - t0)
+				stats.record('decode', t2 - t1)
+				stats.record('consumer', t3 - t2)
+			console.delivered += 1
+		except Exception as e:
+			self.errors += 1
+			self.lastError = e
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+async def status(ips, interval=1.0):
+	# Listen to several consoles and print a status line per console
+	receiver = await TelemetryReceiver(ips, lambda packet, ts, console: None).start()
+	try:
+		while True:
+			await asyncio.sleep(interval)
+			now = time.monotonic()
+			lines = ['{:<15} {:>8} {:>10} {:>8} {:>8} {:>8} {:>5}'.format('console', 'pkt/s', 'packet', 'lost', 'stale', 'foreign', 'lap')]
+			for console in receiver.consoles.values():
+				lines.append('{:<15} {:>8.1f} {:>10} {:>8} {:>8} {:>8} {:>5}'.format(console.ip, console.rate(now), console.pktid, console.lost, console.stale, console.foreign, console.lap))
+			print('\n'.join(lines) + '\n', flush=True)
+	finally:
+		receiver.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Listen to one or more consoles and show packet rate and loss per console')
+	parser.add_argument('ips', nargs='+', help='playstation ip addresses')
+	args = parser.parse_args()
+	try:
+		asyncio.run(status(args.ips))
+	except KeyboardInterrupt:
+		sys.exit(0)
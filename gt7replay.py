@@ -0,0 +1,143 @@
+import argparse
+import socket
+import struct
+import sys
+import time
+from gt7capture import CaptureReader
+from gt7packet import peek_header, salsa20_dec, salsa20_enc
+from gt7synth import TICK, SyntheticCar
+
+# ports for send and receive data, seen from the console
+SendPort = 33739
+ReceivePort = 33740
+
+# a console stops streaming when it has not heard a heartbeat for a while
+HEARTBEAT_TIMEOUT = 5.0
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def capture_packets(reader, source=None, loop=False):
+	# Yields (seconds since start, datagram) from a capture. When looping, later
+	# passes are re-encrypted with shifted packet ids so they stay "newer".
+	offset = 0
+	timeOffset = 0.0
+	while True:
+		first = None
+		minId = maxId = None
+		t = timeOffset
+		for ts, address, data in reader:
+			if source is not None and address != source:
+				continue
+			if first is None:
+				first = ts
+			t = (ts - first) / 1e9 + timeOffset
+			header = peek_header(data)
+			if header is not None:
+				pktid, iv = header
+				minId = pktid if minId is None else min(minId, pktid)
+				maxId = pktid if maxId is None else max(maxId, pktid)
+				if offset:
+					ddata = bytearray(salsa20_dec(data, iv))
+					struct.pack_into('<i', ddata, 0x70, pktid + offset)
+					data = salsa20_enc(ddata, struct.unpack_from('<I', data, 0x40)[0])
+			yield t, data
+		if not loop or first is None:
+			return
+		timeOffset = t + TICK
+		if maxId is not None:
+			offset += maxId - minId + 1
+
+def synthetic_packets(seed=None):
+	# Yields (seconds since start, datagram) from a synthetic car, forever
+	car = SyntheticCar(seed=seed)
+	tick = 0
+	while True:
+		yield tick * TICK, car.datagram()
+		tick += 1
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class Console:
+	# Plays the PlayStation side of the protocol: waits for the 'A' heartbeat on
+	# 33739 and streams to the sender's 33740, pausing when heartbeats stop.
+	def __init__(self, bind='127.0.0.1', sendPort=SendPort, receivePort=ReceivePort):
+		self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.s.bind((bind, sendPort))
+		self.receivePort = receivePort
+		self.clients = {}		# (ip, port) -> time of last heartbeat
+		self.sent = 0
+
+	def poll(self, timeout=0.0):
+		# Collect heartbeats, returns the clients that are still listening
+		self.s.settimeout(timeout)
+		while True:
+			try:
+				data, address = self.s.recvfrom(64)
+			except (socket.timeout, BlockingIOError):
+				break
+			self.clients[(address[0], self.receivePort)] = time.monotonic()
+			self.s.settimeout(0.0)
+		now = time.monotonic()
+		return [client for client, seen in self.clients.items() if now - seen < HEARTBEAT_TIMEOUT]
+
+	def serve(self, packets, speed=1.0, count=None, out=sys.stderr):
+		# Stream packets, speed is the replay rate (0 for as fast as possible)
+		clients = []
+		while not clients:
+			clients = self.poll(1.0)
+		print(f'streaming to {", ".join(ip for ip, port in clients)}', file=out)
+
+		start = time.monotonic()
+		pollEvery = 64
+		for t, data in packets:
+			if speed > 0:
+				delay = start + t / speed - time.monotonic()
+				if delay > 0.001:
+					time.sleep(delay)
+			for client in clients:
+				self.s.sendto(data, client)
+			self.sent += 1
+			if self.sent % pollEvery == 0:
+				clients = self.poll()
+				while not clients:
+					print('no heartbeat, waiting', file=out)
+					clients = self.poll(1.0)
+					start = time.monotonic() - t / speed if speed > 0 else start
+			if count is not None and self.sent >= count:
+				break
+
+		elapsed = time.monotonic() - start
+		print(f'sent {self.sent} packets in {elapsed:.1f} s ({self.sent / max(elapsed, 1e-9):.0f}/s)', file=out)
+
+	def close(self):
+		self.s.close()
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Serve a recorded capture (or a synthetic car) like a PlayStation would')
+	parser.add_argument('capture', nargs='?', help='capture file recorded with --record')
+	parser.add_argument('--speed', type=float, default=1.0, help='replay rate, e.g. 2 or 10; 0 for as fast as possible')
+	parser.add_argument('--loop', action='store_true', help='start over at the end of the capture')
+	parser.add_argument('--source', help='only replay packets from this console ip')
+	parser.add_argument('--synth', action='store_true', help='generate packets from a synthetic car instead of a capture')
+	parser.add_argument('--seed', type=int, help='random seed for --synth')
+	parser.add_argument('--count', type=int, help='stop after this many packets')
+	parser.add_argument('--bind', default='127.0.0.1', help='address to listen for heartbeats on (default 127.0.0.1)')
+	args = parser.parse_args()
+
+	if args.synth:
+		packets = synthetic_packets(args.seed)
+	elif args.capture:
+		reader = CaptureReader(args.capture)
+		packets = capture_packets(reader, args.source, args.loop)
+	else:
+		parser.error('give a capture file or --synth')
+
+	console = Console(args.bind)
+	try:
+		console.serve(packets, args.speed, args.count)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		console.close()
@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from gt7capture import int_to_ip, ip_to_int
+from gt7packet import PACKET_SIZE, decode, encode
+from gt7receiver import TelemetryReceiver
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Shared memory ring buffer of decoded frames.
+#
+# One ingest process receives and decodes, and publishes every fresh packet
+# as a fixed-size frame; any number of local processes attach and read. There
+# is a single writer and no locks: each slot carries the sequence number of
+# the frame in it, which the writer invalidates before and sets after writing
+# the slot, and a reader checks it before and after reading. A reader that is
+# lapped by the writer skips ahead and counts the frames it missed.
+#
+# Frames of every console go into the one ring, and the header lists the
+# consoles, so a reader that shows one car can pick (or insist on) one.
+#
+#   header   magic, version, slot count, slot size, head (next sequence number),
+#            console count, console IPv4s
+#   slot     sequence, receive time ns, source IPv4, 4 bytes padding, packet
+
+RING_MAGIC = b'GT7R'
+RING_VERSION = 2
+DEFAULT_NAME = 'gt7telemetry'
+DEFAULT_SLOTS = 1 << 14			# about 4.5 minutes at 60 Hz
+
+_HEADER = struct.Struct('<4sHxxII')	# magic, version, slots, slot size
+_HEAD = struct.Struct('<Q')
+HEAD_OFFSET = 16
+_SOURCES = struct.Struct('<I')
+SOURCES_OFFSET = 24
+HEADER_SIZE = 64
+MAX_SOURCES = (HEADER_SIZE - SOURCES_OFFSET - _SOURCES.size) // 4
+_SLOT = struct.Struct('<QqI4x')		# sequence, receive time, source
+SLOT_SIZE = _SLOT.size + PACKET_SIZE
+EMPTY = (1 << 64) - 1
+
+class RingError(Exception):
+	pass
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class FrameWriter:
+	# sources: the console ips that publish to the ring
+	def __init__(self, name=DEFAULT_NAME, slots=DEFAULT_SLOTS, sources=()):
+		if len(sources) > MAX_SOURCES:
+			raise RingError(f'a ring takes at most {MAX_SOURCES} consoles')
+		self.slots = slots
+		self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + slots * SLOT_SIZE)
+		self.buf = self.shm.buf
+		_HEADER.pack_into(self.buf, 0, RING_MAGIC, RING_VERSION, slots, SLOT_SIZE)
+		_SOURCES.pack_into(self.buf, SOURCES_OFFSET, len(sources))
+		for i, ip in enumerate(sources):
+			_SOURCES.pack_into(self.buf, SOURCES_OFFSET + 4 * (i + 1), ip_to_int(ip))
+		for i in range(slots):
+			_SLOT.pack_into(self.buf, HEADER_SIZE + i * SLOT_SIZE, EMPTY, 0, 0)
+		self.head = 0
+		_HEAD.pack_into(self.buf, HEAD_OFFSET, 0)
+
+	def publish(self, packet, ts, source=0):
+		# packet is a TelemetryPacket; frames are stored in packed packet form
+		n = self.head
+		pos = HEADER_SIZE + (n % self.slots) * SLOT_SIZE
+		buf = self.buf
+		_SLOT.pack_into(buf, pos, EMPTY, ts, source)
+		buf[pos + _SLOT.size:pos + SLOT_SIZE] = encode(packet)
+		_SLOT.pack_into(buf, pos, n, ts, source)
+		self.head = n + 1
+		_HEAD.pack_into(buf, HEAD_OFFSET, n + 1)
+
+	def close(self):
+		self.buf = None
+		self.shm.close()
+		self.shm.unlink()
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class FrameReader:
+	# Attach to a ring by name. Reading starts at the newest frame, or at the
+	# oldest one still in the ring with fromStart.
+	def __init__(self, name=DEFAULT_NAME, fromStart=False):
+		self.shm = shared_memory.SharedMemory(name=name)
+		# the ingest process owns the segment; without this, the resource
+		# tracker would unlink it when this reader exits
+		resource_tracker.unregister(self.shm._name, 'shared_memory')
+		self.buf = self.shm.buf
+		magic, version, self.slots, slotSize = _HEADER.unpack_from(self.buf, 0)
+		if magic != RING_MAGIC or version != RING_VERSION or slotSize != SLOT_SIZE:
+			raise RingError(f'{name} is not a compatible frame ring')
+		count = _SOURCES.unpack_from(self.buf, SOURCES_OFFSET)[0]
+		self.sources = [int_to_ip(_SOURCES.unpack_from(self.buf, SOURCES_OFFSET + 4 * (i + 1))[0]) for i in range(count)]
+		head = self.head()
+		self.next = max(0, head - self.slots) if fromStart else head
+		self.lost = 0
+		self.read = 0
+
+	def head(self):
+		return _HEAD.unpack_from(self.buf, HEAD_OFFSET)[0]
+
+	def _frame(self, n):
+		# Returns (sequence, receive time ns, source ip, packet) or None when overwritten
+		pos = HEADER_SIZE + (n % self.slots) * SLOT_SIZE
+		seq, ts, source = _SLOT.unpack_from(self.buf, pos)
+		if seq != n:
+			return None
+		packet = decode(self.buf, pos + _SLOT.size)
+		if _SLOT.unpack_from(self.buf, pos)[0] != n:
+			return None
+		return n, ts, int_to_ip(source), packet
+
+	def poll(self, limit=None):
+		# All frames published since the last poll, oldest first
+		head = self.head()
+		if head - self.next > self.slots:
+			self.lost += head - self.slots - self.next
+			self.next = head - self.slots
+		stop = head if limit is None else min(head, self.next + limit)
+		frames = []
+		for n in range(self.next, stop):
+			frame = self._frame(n)
+			if frame is None:
+				# lapped while reading
+				self.lost += 1
+				continue
+			frames.append(frame)
+		self.read += len(frames)
+		self.next = stop
+		return frames
+
+	def latest(self):
+		# The newest frame, skipping (and counting) anything older that was not read
+		head = self.head()
+		if head <= self.next:
+			return None
+		self.lost += head - 1 - self.next
+		self.next = head
+		frame = self._frame(head - 1)
+		if frame is None:
+			self.lost += 1
+		else:
+			self.read += 1
+		return frame
+
+	def close(self):
+		self.buf = None
+		self.shm.close()
+
+def ring_source(reader, source=None):
+	# The console to follow for a display of one car: the one given, which
+	# has to publish to the ring, or the only one there is
+	if source is not None:
+		if source not in reader.sources:
+			raise RingError('{} is not in the ring, which has {}'.format(source, ', '.join(reader.sources) or 'no consoles'))
+		return source
+	if len(reader.sources) > 1:
+		raise RingError('the ring has frames from {}: pick one with --source'.format(', '.join(reader.sources)))
+	return reader.sources[0] if reader.sources else None
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+async def ingest(ips, name=DEFAULT_NAME, slots=DEFAULT_SLOTS):
+	# Receive from the consoles and publish every fresh packet into the ring
+	writer = FrameWriter(name, slots, ips)
+
+	def on_packet(packet, ts, console):
+		writer.publish(packet, ts, ip_to_int(console.ip))
+
+	receiver = await TelemetryReceiver(ips, on_packet, drain=False).start()
+	print(f'publishing {", ".join(ips)} to {name}', file=sys.stderr)
+	try:
+		while True:
+			await asyncio.sleep(1)
+	finally:
+		receiver.close()
+		writer.close()
+
+def tail(name=DEFAULT_NAME):
+	# Print one line per second with the newest frame
+	reader = FrameReader(name)
+	try:
+		while True:
+			time.sleep(1)
+			frames = reader.poll()
+			if frames:
+				seq, ts, source, p = frames[-1]
+				print(f'{source:<15} seq {seq:>9} packet {p.packet_id:>9} lap {p.current_lap:>3} {p.car_speed:6.1f} kph {p.rpm:6.0f} rpm  ({len(frames)} frames, {reader.lost} lost)', flush=True)
+	finally:
+		reader.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Publish decoded frames to a shared memory ring, or follow one')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('ingest', help='receive from consoles and publish')
+	p.add_argument('ips', nargs='+', help='playstation ip addresses')
+	p.add_argument('--name', default=DEFAULT_NAME, help=f'shared memory name (default {DEFAULT_NAME})')
+	p.add_argument('--slots', type=int, default=DEFAULT_SLOTS, help=f'frames kept in the ring (default {DEFAULT_SLOTS})')
+	p = sub.add_parser('tail', help='print the newest frame once per second')
+	p.add_argument('--name', default=DEFAULT_NAME, help=f'shared memory name (default {DEFAULT_NAME})')
+	args = parser.parse_args()
+
+	try:
+		if args.command == 'ingest':
+			asyncio.run(ingest(args.ips, args.name, args.slots))
+		else:
+			tail(args.name)
+	except KeyboardInterrupt:
+		pass
+	except RingError as e:
+		sys.exit(str(e))
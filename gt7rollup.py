@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import sys
+import time
+# pip3 install numpy
+import numpy as np
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Multi-resolution rollups of a few channels, for graphs over long sessions.
+#
+# Every level keeps min, max, mean and last value per channel in fixed-size
+# buckets (1 s, 10 s, 1 min by default) in a ring of preallocated arrays, so
+# memory does not depend on how long the session runs. Packets only touch the
+# open bucket of the finest level; a bucket that closes is written to its ring
+# and folded into the open bucket of the next level. Time is counted in packet
+# ids (1/60 s), like the lap timing.
+
+TICK = 1 / 60
+
+DEFAULT_CHANNELS = ['rpm', 'car_speed', 'tyre_temp_fl', 'tyre_temp_fr', 'tyre_temp_rl', 'tyre_temp_rr', 'oil_temp', 'water_temp', 'fuel_level']
+
+# (bucket seconds, buckets kept): an hour at 1 s, a day at 10 s, a week at 1 min
+DEFAULT_LEVELS = [(1, 3600), (10, 8640), (60, 10080)]
+
+class Level:
+	def __init__(self, resolution, size, channels):
+		self.resolution = resolution
+		self.size = size
+		self.bucket = np.full(size, -1, dtype=np.int64)		# bucket number held in each slot
+		self.min = np.zeros((size, channels))
+		self.max = np.zeros((size, channels))
+		self.sum = np.zeros((size, channels))
+		self.count = np.zeros(size, dtype=np.int64)
+		self.last = np.zeros((size, channels))
+
+		# the open bucket
+		self.open = None
+		self.openMin = np.zeros(channels)
+		self.openMax = np.zeros(channels)
+		self.openSum = np.zeros(channels)
+		self.openCount = 0
+		self.openLast = np.zeros(channels)
+
+	def start(self, bucket):
+		self.open = bucket
+		self.openMin.fill(np.inf)
+		self.openMax.fill(-np.inf)
+		self.openSum.fill(0.0)
+		self.openCount = 0
+
+	def add(self, values):
+		np.minimum(self.openMin, values, out=self.openMin)
+		np.maximum(self.openMax, values, out=self.openMax)
+		self.openSum += values
+		self.openCount += 1
+		self.openLast[:] = values
+
+	def fold(self, other):
+		# Add another level's open bucket to this one's
+		np.minimum(self.openMin, other.openMin, out=self.openMin)
+		np.maximum(self.openMax, other.openMax, out=self.openMax)
+		self.openSum += other.openSum
+		self.openCount += other.openCount
+		self.openLast[:] = other.openLast
+
+	def store(self):
+		slot = self.open % self.size
+		self.bucket[slot] = self.open
+		self.min[slot] = self.openMin
+		self.max[slot] = self.openMax
+		self.sum[slot] = self.openSum
+		self.count[slot] = self.openCount
+		self.last[slot] = self.openLast
+
+	def nbytes(self):
+		return sum(a.nbytes for a in (self.bucket, self.min, self.max, self.sum, self.count, self.last))
+
+class Rollup:
+	def __init__(self, channels=DEFAULT_CHANNELS, levels=DEFAULT_LEVELS):
+		self.channels = list(channels)
+		self.levels = [Level(resolution, size, len(self.channels)) for resolution, size in levels]
+		self.values = np.zeros(len(self.channels))
+		self.firstId = None
+		self.now = 0.0
+
+	def update(self, p):
+		# Feed a TelemetryPacket (fields and properties can both be channels)
+		if self.firstId is None:
+			self.firstId = p.packet_id
+		self.values[:] = [getattr(p, name) for name in self.channels]
+		self.add((p.packet_id - self.firstId) * TICK, self.values)
+
+	def add(self, t, values):
+		# Feed values for time t (seconds, not going back)
+		self.now = t
+		level = self.levels[0]
+		bucket = int(t // level.resolution)
+		if level.open != bucket:
+			if level.open is not None:
+				self._close(0)
+			level.start(bucket)
+		level.add(values)
+
+	def _close(self, i):
+		level = self.levels[i]
+		level.store()
+		if i + 1 < len(self.levels):
+			coarser = self.levels[i + 1]
+			bucket = level.open * level.resolution // coarser.resolution
+			if coarser.open != bucket:
+				if coarser.open is not None:
+					self._close(i + 1)
+				coarser.start(bucket)
+			coarser.fold(level)
+
+	def nbytes(self):
+		return sum(level.nbytes() for level in self.levels)
+
+	def query(self, start=None, end=None, maxPoints=1000):
+		# Buckets overlapping [start, end] seconds (default the whole session
+		# as far as kept), from the finest level that still covers start and
+		# gives at most maxPoints buckets. Returns a dict with 'resolution',
+		# 'channels', 't' (bucket start) and 'min', 'max', 'mean', 'last' of
+		# shape (buckets, channels). The last buckets may still be open.
+		if end is None:
+			end = self.now
+		if start is None:
+			start = 0.0
+		chosen = None
+		for i, level in enumerate(self.levels):
+			if level.open is None:
+				break
+			oldest = (level.open - level.size + 1) * level.resolution
+			chosen = i
+			if oldest <= start and (end - start) / level.resolution <= maxPoints:
+				break
+		if chosen is None:
+			return None
+		level = self.levels[chosen]
+		r = level.resolution
+
+		b0 = max(int(start // r), level.open - level.size + 1, 0)
+		b1 = min(int(end // r), level.open - 1)
+		buckets = np.arange(b0, b1 + 1, dtype=np.int64)
+		slots = buckets % level.size
+		valid = level.bucket[slots] == buckets
+		slots = slots[valid]
+		t = buckets[valid] * r
+		mins = level.min[slots]
+		maxs = level.max[slots]
+		sums = level.sum[slots]
+		counts = level.count[slots]
+		lasts = level.last[slots]
+
+		# the open buckets, made up of this level's open bucket and those of the
+		# finer levels that were not folded in yet (which can be a newer bucket)
+		pending = {}
+		for finer in self.levels[:chosen + 1][::-1]:
+			if finer.open is not None and finer.openCount:
+				bucket = finer.open * finer.resolution // r
+				current = pending.get(bucket)
+				if current is None:
+					current = pending[bucket] = Level(r, 1, len(self.channels))
+					current.start(bucket)
+				current.fold(finer)
+		for bucket in sorted(pending):
+			if bucket < b0 or bucket * r > end:
+				continue
+			current = pending[bucket]
+			t = np.r_[t, bucket * r]
+			mins = np.vstack([mins, current.openMin])
+			maxs = np.vstack([maxs, current.openMax])
+			sums = np.vstack([sums, current.openSum])
+			counts = np.r_[counts, current.openCount]
+			lasts = np.vstack([lasts, current.openLast])
+		return {
+			'resolution': r,
+			'channels': self.channels,
+			't': t.astype(np.float64),
+			'min': mins,
+			'max': maxs,
+			'mean': sums / np.maximum(counts, 1)[:, None],
+			'last': lasts,
+		}
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def print_window(window, channel):
+	i = window['channels'].index(channel)
+	print(f'{channel} at {window["resolution"]} s')
+	print('{:>10} {:>10} {:>10} {:>10} {:>10}'.format('t', 'min', 'mean', 'max', 'last'))
+	for t, lo, mean, hi, last in zip(window['t'], window['min'][:, i], window['mean'][:, i], window['max'][:, i], window['last'][:, i]):
+		print(f'{t:>10.0f} {lo:>10.1f} {mean:>10.1f} {hi:>10.1f} {last:>10.1f}')
+
+async def live(ip, channel, seconds, points):
+	from gt7receiver import TelemetryReceiver
+	rollup = Rollup()
+	receiver = await TelemetryReceiver(ip, lambda p, ts, console: rollup.update(p), drain=False).start()
+	try:
+		while True:
+			await asyncio.sleep(seconds / points)
+			window = rollup.query(rollup.now - seconds, None, points)
+			if window is not None:
+				print_window(window, channel)
+				print(flush=True)
+	finally:
+		receiver.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Roll channels up into 1 s / 10 s / 1 min buckets and show a window')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('live', help='listen to a console and print the last minutes')
+	p.add_argument('ip', help='playstation ip address')
+	p = sub.add_parser('replay', help='roll up a capture and print a window')
+	p.add_argument('capture', help='capture file recorded with --record')
+	p.add_argument('--start', type=float, help='window start, seconds into the session')
+	p.add_argument('--end', type=float, help='window end, seconds into the session')
+	p.add_argument('--source', help='only packets from this console ip')
+	for p in sub.choices.values():
+		p.add_argument('--channel', default='car_speed', choices=DEFAULT_CHANNELS, help='channel to print (default car_speed)')
+		p.add_argument('--seconds', type=float, default=300, help='window length for live (default 300)')
+		p.add_argument('--points', type=int, default=30, help='most buckets to print (default 30)')
+	args = parser.parse_args()
+
+	if args.command == 'live':
+		try:
+			asyncio.run(live(args.ip, args.channel, args.seconds, args.points))
+		except KeyboardInterrupt:
+			pass
+	else:
+		from gt7batch import BatchError, records, single_source
+		from gt7capture import CaptureReader
+		from gt7packet import fresh_packets
+		rollup = Rollup()
+		count = 0
+		start = time.perf_counter()
+		with CaptureReader(args.capture) as reader:
+			# a rollup is one car's
+			try:
+				source = single_source(records(reader), args.source)
+			except BatchError as e:
+				sys.exit(str(e))
+			for ts, address, p in fresh_packets(reader, source):
+				rollup.update(p)
+				count += 1
+		elapsed = time.perf_counter() - start
+		print(f'{count} packets, {rollup.now:.0f} s in {elapsed:.2f} s, {rollup.nbytes() / 1e6:.1f} MB', file=sys.stderr)
+		window = rollup.query(args.start, args.end, args.points)
+		if window is not None:
+			print_window(window, args.channel)
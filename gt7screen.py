@@ -0,0 +1,86 @@
+import sys
+import time
+
+# ansi prefix
+pref = "\033["
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class Screen:
+	# Screen model for the fixed layout: every printAt lands in a cell keyed by
+	# (row, column), and a frame only writes the cells whose text or attributes
+	# changed since they were last shown, in one buffered write.
+	def __init__(self, out=None):
+		self.out = out if out is not None else sys.stdout
+		self.cells = {}			# (row, column) -> (sgr, text) as shown on the terminal
+		self.pending = {}		# (row, column) -> (sgr, text) waiting for the next frame
+		self.attrs = ()			# sticky attributes, as the terminal would carry them
+		self.bytesWritten = 0
+		self.framesWritten = 0
+		self.rateStart = time.monotonic()
+		self.rateBytes = 0
+		self.bytesPerSecond = 0.0
+
+	def put(self, text, row=1, column=1, bold=0, underline=0, reverse=0):
+		# Attributes carry over until a plain write resets them, just like the
+		# escape codes printAt used to write straight to the terminal
+		if not bold and not underline and not reverse:
+			self.attrs = ()
+		else:
+			attrs = set(self.attrs)
+			if reverse:
+				attrs.add('7')
+			if bold:
+				attrs.add('1')
+			if underline:
+				attrs.add('4')
+			self.attrs = tuple(sorted(attrs))
+
+		key = (row, column)
+		cell = (self.attrs, text)
+		if self.cells.get(key) != cell:
+			self.pending[key] = cell
+		else:
+			self.pending.pop(key, None)
+
+	def invalidate(self):
+		# Redraw everything on the next frame, in original drawing order
+		for key, cell in self.cells.items():
+			self.pending.setdefault(key, cell)
+
+	def flush(self):
+		# Write all changed cells in a single write, returns the number of bytes written
+		if not self.pending:
+			return 0
+		parts = []
+		sgr = None
+		for (row, column), cell in self.pending.items():
+			attrs, text = cell
+			parts.append(f'{pref}{row};{column}H')
+			if attrs != sgr:
+				parts.append(f'{pref}{";".join(("0",) + attrs)}m')
+				sgr = attrs
+			parts.append(text)
+			self.cells[(row, column)] = cell
+		self.pending.clear()
+
+		frame = ''.join(parts)
+		self.out.write(frame)
+		self.out.flush()
+
+		size = len(frame.encode('utf-8'))
+		self.bytesWritten += size
+		self.rateBytes += size
+		self.framesWritten += 1
+		return size
+
+	def rate(self, now=None):
+		# Bytes written per second, averaged over the last second or so
+		if now is None:
+			now = time.monotonic()
+		elapsed = now - self.rateStart
+		if elapsed >= 1:
+			self.bytesPerSecond = self.rateBytes / elapsed
+			self.rateBytes = 0
+			self.rateStart = now
+		return self.bytesPerSecond
@@ -0,0 +1,299 @@
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+import zlib
+# pip3 install numpy
+import numpy as np
+from gt7batch import PACKET_DTYPE, BatchError, decode_records, output_dtype, records, single_source
+from gt7capture import CaptureReader
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Columnar session store.
+#
+# A session is a directory with one file per channel, holding the channel's
+# values in chunks of `chunk` packets, each chunk compressed on its own, and
+#
+#   session.json   version, channels and their types, chunk size, packet count, track
+#   chunks.npy     byte offset of every chunk in every channel file, shape
+#                  (channels, chunks + 1)
+#   laps.npy       the lap index: rows and packet ids of every lap, its time
+#                  from the lap time fields (0x78/0x7C) and its length in ticks
+#
+# A query maps only the files of the channels asked for and decompresses only
+# the chunks that overlap the rows (or laps) asked for.
+
+SESSION_VERSION = 1
+DEFAULT_CHUNK = 4096
+
+# needed for the lap index and the track, always stored
+LAP_CHANNELS = ['packet_id', 'current_lap', 'best_lap', 'last_lap']
+TRACK_CHANNELS = ['pos_x', 'pos_z', 'flags']
+
+LAP_DTYPE = np.dtype([
+	('lap', '<i4'),			# lap number, 0x74
+	('start', '<i8'),		# first row
+	('stop', '<i8'),		# one past the last row
+	('first_id', '<i4'),	# packet id of the first row
+	('last_id', '<i4'),		# packet id of the last row
+	('ticks', '<i4'),		# packets (1/60 s) from this lap's start to the next lap's
+	('lap_time', '<i4'),	# ms, from 0x7C once the next lap started; -1 if unknown
+	('best_lap', '<i4'),	# ms, 0x78 at the end of the lap
+])
+
+class SessionError(Exception):
+	pass
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def lap_index(data):
+	# The lap index of decoded rows with the LAP_CHANNELS
+	lap = data['current_lap']
+	starts = np.flatnonzero(np.r_[True, lap[1:] != lap[:-1]]) if len(lap) else np.zeros(0, dtype=np.int64)
+	stops = np.r_[starts[1:], len(lap)]
+	laps = np.zeros(len(starts), dtype=LAP_DTYPE)
+	laps['lap'] = lap[starts]
+	laps['start'] = starts
+	laps['stop'] = stops
+	laps['first_id'] = data['packet_id'][starts]
+	laps['last_id'] = data['packet_id'][stops - 1]
+	laps['best_lap'] = data['best_lap'][stops - 1]
+	laps['lap_time'] = -1
+	laps['ticks'] = laps['last_id'] - laps['first_id'] + 1
+	if len(starts) > 1:
+		# a completed lap: the next lap reports it in 0x7C, and ticks reach
+		# up to the next lap's first packet
+		following = laps[1:]
+		done = following['lap'] == laps['lap'][:-1] + 1
+		laps['lap_time'][:-1] = np.where(done, data['last_lap'][starts[1:]], -1)
+		laps['ticks'][:-1] = np.where(done, following['first_id'] - laps['first_id'][:-1], laps['ticks'][:-1])
+	return laps
+
+class SessionWriter:
+	# Appends decoded rows and writes them out one full chunk at a time
+	def __init__(self, directory, channels, chunk=DEFAULT_CHUNK):
+		os.makedirs(directory, exist_ok=True)
+		if os.path.exists(os.path.join(directory, 'session.json')):
+			# overwriting a session: unfinished until the new session.json is in place
+			os.remove(os.path.join(directory, 'session.json'))
+		self.directory = directory
+		self.channels = ['ts'] + [name for name in channels if name != 'ts']
+		self.dtype = output_dtype(self.channels[1:])
+		self.chunk = chunk
+		self.pending = np.empty(chunk, dtype=self.dtype)
+		self.used = 0
+		self.count = 0
+		self.files = [open(os.path.join(directory, f'{name}.z'), 'wb') for name in self.channels]
+		self.offsets = [[0] for name in self.channels]
+
+	def write(self, rows):
+		while len(rows):
+			n = min(len(rows), self.chunk - self.used)
+			self.pending[self.used:self.used + n] = rows[:n]
+			self.used += n
+			rows = rows[n:]
+			if self.used == self.chunk:
+				self.flush_chunk()
+
+	def flush_chunk(self):
+		if self.used == 0:
+			return
+		for f, offsets, name in zip(self.files, self.offsets, self.channels):
+			blob = zlib.compress(np.ascontiguousarray(self.pending[name][:self.used]).tobytes(), 1)
+			f.write(blob)
+			offsets.append(offsets[-1] + len(blob))
+		self.count += self.used
+		self.used = 0
+
+	def close(self, track=-1, source=None):
+		self.flush_chunk()
+		for f in self.files:
+			f.close()
+		np.save(os.path.join(self.directory, 'chunks.npy'), np.array(self.offsets, dtype=np.int64))
+		meta = {
+			'version': SESSION_VERSION,
+			'channels': {name: self.dtype.fields[name][0].str for name in self.channels},
+			'chunk': self.chunk,
+			'count': self.count,
+			'track': track,
+			'source': source,
+			'created': time.time(),
+		}
+		# session.json last: a directory without it is an unfinished write
+		with open(os.path.join(self.directory, 'session.json'), 'w') as f:
+			json.dump(meta, f, indent=1)
+
+def write_session(capture, directory, channels=None, chunk=DEFAULT_CHUNK, track=None, source=None, batch=8192):
+	# Decode a capture into a session directory. The track is looked up the way
+	# gt7tracktag.py does, unless given. A session is one car: a capture with
+	# several consoles needs `source`.
+	if channels is None:
+		channels = [name for name in PACKET_DTYPE.names if name != 'magic']
+	channels = list(channels) + [name for name in LAP_CHANNELS + TRACK_CHANNELS if name not in channels]
+	newest = {}
+	kept = []		# the few channels the lap index and track need, for the whole session
+	with CaptureReader(capture) as reader:
+		rec = records(reader)
+		source = single_source(rec, source)
+		writer = SessionWriter(directory, channels, chunk)
+		out = np.empty(batch, dtype=writer.dtype)
+		for start in range(0, len(rec), batch):
+			count = decode_records(rec[start:start + batch], writer.channels[1:], out, source, True, newest)[0]
+			writer.write(out[:count])
+			kept.append(out[LAP_CHANNELS + TRACK_CHANNELS][:count].copy())
+		del rec
+
+	data = np.concatenate(kept) if kept else np.zeros(0, dtype=out[LAP_CHANNELS + TRACK_CHANNELS].dtype)
+	np.save(os.path.join(directory, 'laps.npy'), lap_index(data))
+	if track is None:
+		track = detect_track(data)
+	writer.close(track, source)
+	return writer.count
+
+def detect_track(data):
+	# Track of the first run with a match, -1 when there is none
+	from gt7tracktag import match_runs
+	from gt7trackdb import load_database
+	try:
+		index = load_database()[0]
+	except FileNotFoundError:
+		return -1
+	for best in match_runs(data, index):
+		if best is not None:
+			return int(best[0][1])
+	return -1
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class Session:
+	def __init__(self, directory):
+		self.directory = directory
+		try:
+			with open(os.path.join(directory, 'session.json')) as f:
+				self.meta = json.load(f)
+		except FileNotFoundError:
+			raise SessionError(f'{directory} is not a (finished) session')
+		if self.meta['version'] != SESSION_VERSION:
+			raise SessionError(f'{directory}: unsupported session version {self.meta["version"]}')
+		self.channels = {name: np.dtype(code) for name, code in self.meta['channels'].items()}
+		self.order = list(self.channels)
+		self.chunk = self.meta['chunk']
+		self.count = self.meta['count']
+		self.track = self.meta['track']
+		self.offsets = np.load(os.path.join(directory, 'chunks.npy'), mmap_mode='r')
+		path = os.path.join(directory, 'laps.npy')
+		self.laps = np.load(path, mmap_mode='r') if os.path.exists(path) else np.zeros(0, dtype=LAP_DTYPE)
+		self.maps = {}
+
+	def _map(self, name):
+		mm = self.maps.get(name)
+		if mm is None:
+			with open(os.path.join(self.directory, f'{name}.z'), 'rb') as f:
+				size = os.fstat(f.fileno()).st_size
+				mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+			self.maps[name] = mm
+		return mm
+
+	def _column(self, name, start, stop):
+		# Rows [start, stop) of one channel, decompressing only the chunks needed
+		dtype = self.channels[name]
+		offsets = self.offsets[self.order.index(name)]
+		mm = self._map(name)
+		first = start // self.chunk
+		last = (stop - 1) // self.chunk
+		parts = []
+		for c in range(first, last + 1):
+			values = np.frombuffer(zlib.decompress(mm[offsets[c]:offsets[c + 1]]), dtype=dtype)
+			a = max(start - c * self.chunk, 0)
+			b = min(stop - c * self.chunk, len(values))
+			parts.append(values[a:b])
+		if len(parts) == 1:
+			return parts[0]
+		return np.concatenate(parts)
+
+	def read(self, channels=None, start=0, stop=None):
+		# Rows [start, stop) of the given channels as a structured array
+		if channels is None:
+			channels = self.order
+		unknown = [name for name in channels if name not in self.channels]
+		if unknown:
+			raise SessionError(f'channels not in session: {", ".join(unknown)}')
+		if stop is None or stop > self.count:
+			stop = self.count
+		start = max(0, start)
+		out = np.empty(max(0, stop - start), dtype=[(name, self.channels[name]) for name in channels])
+		if len(out):
+			for name in channels:
+				out[name] = self._column(name, start, stop)
+		return out
+
+	def lap(self, number, channels=None):
+		# The rows of a lap by its number (the first stretch with that number)
+		found = np.flatnonzero(self.laps['lap'] == number)
+		if len(found) == 0:
+			raise SessionError(f'no lap {number} in session')
+		row = self.laps[found[0]]
+		return self.read(channels, int(row['start']), int(row['stop']))
+
+	def close(self):
+		for mm in self.maps.values():
+			if isinstance(mm, mmap.mmap):
+				mm.close()
+		self.maps = {}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def format_laptime(ms):
+	if ms < 0:
+		return '–'
+	return '{:01.0f}:{:06.3f}'.format(ms // 60000, ms % 60000 / 1000)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Store captures as columnar sessions with a lap index, and query them')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('write', help='decode a capture into a session directory')
+	p.add_argument('capture', help='capture file recorded with --record')
+	p.add_argument('session', help='session directory')
+	p.add_argument('--channels', help='comma separated channel names (default all)')
+	p.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help=f'packets per compressed chunk (default {DEFAULT_CHUNK})')
+	p.add_argument('--track', type=int, help='track id (default detected)')
+	p.add_argument('--source', help='only store packets from this console ip')
+	p = sub.add_parser('laps', help='list the laps of a session')
+	p.add_argument('session', help='session directory')
+	p = sub.add_parser('query', help='save channels of a lap (or of the whole session) to a .npy file')
+	p.add_argument('session', help='session directory')
+	p.add_argument('output', help='output .npy file')
+	p.add_argument('--lap', type=int, help='lap number (default the whole session)')
+	p.add_argument('--channels', help='comma separated channel names (default all)')
+	args = parser.parse_args()
+
+	try:
+		if args.command == 'write':
+			start = time.perf_counter()
+			channels = args.channels.split(',') if args.channels else None
+			count = write_session(args.capture, args.session, channels, args.chunk, args.track, args.source)
+			print(f'{count} packets in {time.perf_counter() - start:.2f} s', file=sys.stderr)
+		elif args.command == 'laps':
+			with Session(args.session) as session:
+				print(f'track {session.track}, {session.count} packets')
+				print('{:>5} {:>10} {:>10} {:>10} {:>10} {:>10}'.format('lap', 'first id', 'last id', 'time', 'ticks', 'best'))
+				for lap in session.laps:
+					print('{:>5} {:>10} {:>10} {:>10} {:>10.3f} {:>10}'.format(lap['lap'], lap['first_id'], lap['last_id'], format_laptime(int(lap['lap_time'])), lap['ticks'] / 60, format_laptime(int(lap['best_lap']))))
+		else:
+			with Session(args.session) as session:
+				channels = args.channels.split(',') if args.channels else None
+				start = time.perf_counter()
+				data = session.read(channels) if args.lap is None else session.lap(args.lap, channels)
+				elapsed = time.perf_counter() - start
+			np.save(args.output, data)
+			print(f'{len(data)} rows in {elapsed * 1000:.1f} ms', file=sys.stderr)
+	except (SessionError, BatchError) as e:
+		sys.exit(str(e))
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from gt7receiver import TelemetryReceiver
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Pipeline instrumentation: where does the latency come from?
+#
+# The receiver times every stage of a packet (see TelemetryReceiver with
+# stats), the display adds the drawing, and the histograms below collect them:
+#
+#   network    kernel receive timestamp to the receiver reading the datagram
+#              (socket queue and event loop wakeup), needs kernel timestamps
+#   header     decrypting magic and packet id (peek_header)
+#   queue      receive to decrypt, time spent behind a backlog in drain mode
+#   decrypt    decrypting the whole packet
+#   decode     unpacking the fields
+#   consumer   the onPacket callback
+#   draw       building and writing one screen frame
+#   age        receive to on screen, for the packet shown
+#   arrival    time between fresh packets of a console
+#   jitter     arrival time minus 1/60 s per packet id, either way
+#
+# Kernel receive timestamps come from the SIOCGSTAMPNS ioctl after each read,
+# the stamp of the last datagram read from the socket; asyncio reads with
+# recvfrom, so ancillary data (SO_TIMESTAMPNS) is not available. The ioctl
+# only works while SO_TIMESTAMPNS is off, and the first call switches the
+# stamping on. Without it (not Linux), arrival falls back to time.time_ns().
+
+SIOCGSTAMPNS = 0x8907
+_TIMESPEC = struct.Struct('@ll')
+
+TICK_NS = 1e9 / 60
+STAGES = ['network', 'header', 'queue', 'decrypt', 'decode', 'consumer', 'draw', 'age', 'arrival', 'jitter']
+
+class Histogram:
+	# HDR style histogram of nanoseconds: below 2^BITS every value has its own
+	# bucket, above that every power of two is split into 2^(BITS-1) buckets,
+	# so any value is kept to within about 3%, from 1 ns to MAX_VALUE, in a
+	# fixed array of counts
+	BITS = 6
+	MAX_VALUE = 1 << 36			# about 69 s, larger values are counted here
+
+	def __init__(self):
+		self.half = 1 << (self.BITS - 1)
+		self.counts = array('q', bytes(8 * (self._index(self.MAX_VALUE) + 1)))
+		self.reset()
+
+	def reset(self):
+		for i in range(len(self.counts)):
+			self.counts[i] = 0
+		self.count = 0
+		self.total = 0
+		self.min = None
+		self.max = None
+
+	def _index(self, value):
+		if value < 2 * self.half:
+			return value
+		shift = value.bit_length() - self.BITS
+		return (shift << (self.BITS - 1)) + (value >> shift)
+
+	def _value(self, index):
+		# lowest value of a bucket
+		if index < 2 * self.half:
+			return index
+		shift = index // self.half - 1
+		return (index - shift * self.half) << shift
+
+	def record(self, value):
+		value = int(value)
+		if value < 0:
+			value = 0
+		elif value > self.MAX_VALUE:
+			value = self.MAX_VALUE
+		self.counts[self._index(value)] += 1
+		self.count += 1
+		self.total += value
+		if self.min is None or value < self.min:
+			self.min = value
+		if self.max is None or value > self.max:
+			self.max = value
+
+	def percentile(self, q):
+		# The value at percentile q (0 - 100), as the middle of its bucket
+		if not self.count:
+			return None
+		rank = max(1, int(q / 100 * self.count + 0.5))
+		seen = 0
+		for index, n in enumerate(self.counts):
+			seen += n
+			if seen >= rank:
+				low = self._value(index)
+				high = self._value(index + 1)
+				return min(max((low + high) / 2, self.min), self.max)
+		return self.max
+
+	def mean(self):
+		return self.total / self.count if self.count else None
+
+	def to_dict(self, scale=1e-3):
+		# Summary in microseconds, and the non-empty buckets (lowest value in
+		# ns, count) so histograms from several runs can be added up
+		def scaled(value):
+			return None if value is None else round(value * scale, 3)
+		return {
+			'count': self.count,
+			'min': scaled(self.min),
+			'mean': scaled(self.mean()),
+			'p50': scaled(self.percentile(50)),
+			'p90': scaled(self.percentile(90)),
+			'p99': scaled(self.percentile(99)),
+			'p999': scaled(self.percentile(99.9)),
+			'max': scaled(self.max),
+			'buckets': [[self._value(index), n] for index, n in enumerate(self.counts) if n],
+		}
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class PipelineStats:
+	def __init__(self):
+		self.histograms = {stage: Histogram() for stage in STAGES}
+		self.kernel = None			# kernel timestamps work (None: not known yet)
+		self.arrivals = {}			# console ip -> (arrival ns, packet id)
+		self.started = time.time()
+		self._stamp = bytearray(_TIMESPEC.size)
+
+	def record(self, stage, ns):
+		self.histograms[stage].record(ns)
+
+	def reset(self):
+		for histogram in self.histograms.values():
+			histogram.reset()
+		self.started = time.time()
+
+	def enable_timestamps(self, sock):
+		# The first SIOCGSTAMPNS switches receive timestamps on (and fails
+		# with ENOENT as nothing was stamped yet)
+		try:
+			fcntl.ioctl(sock.fileno(), SIOCGSTAMPNS, self._stamp, True)
+		except OSError:
+			pass
+
+	def kernel_stamp(self, sock):
+		# Receive time of the datagram just read from sock (time.time_ns clock),
+		# or None without kernel timestamps
+		if self.kernel is False:
+			return None
+		try:
+			fcntl.ioctl(sock.fileno(), SIOCGSTAMPNS, self._stamp, True)
+		except OSError:
+			if self.kernel is None:
+				self.kernel = False
+			return None
+		self.kernel = True
+		seconds, nanoseconds = _TIMESPEC.unpack(self._stamp)
+		return seconds * 1000000000 + nanoseconds
+
+	def arrived(self, ip, pktid, stamp):
+		# A fresh packet, stamp as kernel_stamp returns it
+		now = time.time_ns()
+		if stamp is None:
+			stamp = now
+		else:
+			self.record('network', now - stamp)
+		last = self.arrivals.get(ip)
+		if last is not None:
+			interval = stamp - last[0]
+			self.record('arrival', interval)
+			self.record('jitter', abs(interval - (pktid - last[1]) * TICK_NS))
+		self.arrivals[ip] = (stamp, pktid)
+
+	# ––– output ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+	def to_dict(self, receiver=None, pipeline=None):
+		result = {
+			'time': time.time(),
+			'since': self.started,
+			'kernelTimestamps': bool(self.kernel),
+			'stages': {stage: histogram.to_dict() for stage, histogram in self.histograms.items()},
+		}
+		if receiver is not None:
+			result['receiver'] = {'unknown': receiver.unknown, 'heartbeats': receiver.heartbeats, 'errors': receiver.errors}
+			result['consoles'] = {ip: {
+				'received': console.received,
+				'delivered': console.delivered,
+				'lost': console.lost,
+				'gaps': console.gaps,
+				'outOfOrder': console.outOfOrder,
+				'stale': console.stale,
+				'skipped': console.skipped,
+				'foreign': console.foreign,
+				'magic': console.magic,
+			} for ip, console in receiver.consoles.items()}
+		if pipeline is not None:
+			result['queues'] = pipeline.counters()
+		return result
+
+	def dump(self, filename, receiver=None, pipeline=None):
+		# Write the dump as JSON, replacing the file in one step for readers
+		temp = filename + '.tmp'
+		with open(temp, 'w') as f:
+			json.dump(self.to_dict(receiver, pipeline), f, indent=1)
+		os.replace(temp, filename)
+
+	def panel(self, receiver=None):
+		# Two lines for the display: p50/p99 per stage in µs, then the counters
+		parts = ['µs p50/p99']
+		for stage, label in (('network', 'net'), ('header', 'hdr'), ('decrypt', 'dec'), ('decode', 'parse'), ('consumer', 'cb'), ('draw', 'draw'), ('age', 'age')):
+			histogram = self.histograms[stage]
+			if histogram.count:
+				parts.append('{} {:.0f}/{:.0f}'.format(label, histogram.percentile(50) / 1e3, histogram.percentile(99) / 1e3))
+			else:
+				parts.append('{} –'.format(label))
+		jitter = self.histograms['jitter']
+		counters = []
+		if receiver is not None:
+			lost = gaps = outOfOrder = stale = magic = skipped = 0
+			for console in receiver.consoles.values():
+				lost += console.lost
+				gaps += console.gaps
+				outOfOrder += console.outOfOrder
+				stale += console.stale
+				magic += console.magic
+				skipped += console.skipped
+			counters.append(f'lost {lost} in {gaps} gaps  out of order {outOfOrder}  stale {stale}  bad magic {magic}  skipped {skipped}')
+		if jitter.count:
+			counters.append('jitter p99 {:.2f} ms'.format(jitter.percentile(99) / 1e6))
+		return '  '.join(parts), '  '.join(counters)
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+async def monitor(ips, interval=1.0, asJson=False, dumpFile=None):
+	# Listen to consoles, decode every fresh packet and print the stats
+	stats = PipelineStats()
+	receiver = TelemetryReceiver(ips, lambda packet, ts, console: None, stats=stats)
+	await receiver.start()
+	try:
+		while True:
+			await asyncio.sleep(interval)
+			if dumpFile is not None:
+				stats.dump(dumpFile, receiver)
+			if asJson:
+				print(json.dumps(stats.to_dict(receiver)), flush=True)
+			else:
+				print('\n'.join(stats.panel(receiver)) + '\n', flush=True)
+	finally:
+		receiver.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Show packet loss, jitter and per stage latency of the receive pipeline')
+	parser.add_argument('ips', nargs='+', help='playstation ip addresses')
+	parser.add_argument('--interval', type=float, default=1.0, help='seconds between reports (default 1)')
+	parser.add_argument('--json', action='store_true', help='print one JSON document per report')
+	parser.add_argument('--dump', metavar='FILE', help='also keep the latest report in a JSON file')
+	args = parser.parse_args()
+	try:
+		asyncio.run(monitor(args.ips, args.interval, args.json, args.dump))
+	except KeyboardInterrupt:
+		sys.exit(0)
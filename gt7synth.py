@@ -0,0 +1,180 @@
+import math
+import random
+from gt7packet import FIELDS, MAGIC, TelemetryPacket, encode, salsa20_enc
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Synthetic console: a car lapping an oval at 60 Hz, with plausible values for
+# every field the display reads. Used by the replayer and the benchmarks when
+# there is no PlayStation around.
+
+TICK = 1 / 60
+
+# 0x8E flags, see SimulatorPacketG7S0.cs
+FLAG_CAR_ON_TRACK = 1 << 0
+FLAG_PAUSED = 1 << 1
+FLAG_LOADING = 1 << 2
+FLAG_IN_GEAR = 1 << 3
+FLAG_HAS_TURBO = 1 << 4
+FLAG_REV_LIMITER = 1 << 5
+FLAG_HANDBRAKE = 1 << 6
+FLAG_LIGHTS = 1 << 7
+
+GEAR_RATIOS = (3.321, 2.184, 1.601, 1.264, 1.032, 0.862, 0.0, 0.0)
+FINAL_DRIVE = 3.9
+TYRE_RADIUS = 0.33
+REV_LIMIT = 7800
+REV_WARNING = 7000
+
+class SyntheticCar:
+	def __init__(self, seed=None, length=2400.0, vmin=22.0, vmax=75.0, laps=5, carId=3381, packetId=1):
+		self.rng = random.Random(seed)
+		self.length = length					# track length in m
+		self.radiusX = length / (2 * math.pi) * 1.4
+		self.radiusZ = length / (2 * math.pi) * 0.6
+		self.vmin = vmin						# m/s at the apexes
+		self.vmax = vmax						# m/s at the end of the straights
+		self.laps = laps
+		self.carId = carId
+		self.packetId = packetId
+		self.distance = 0.0
+		self.speed = vmin
+		self.lap = 1
+		self.lapTicks = 0
+		self.bestLap = -1
+		self.lastLap = -1
+		self.timeOfDay = 14 * 3600 * 1000
+		self.fuel = 100.0
+		self.tyreTemp = [60.0, 60.0, 60.0, 60.0]
+		self.oilTemp = 90.0
+		self.waterTemp = 85.0
+		self.gear = 1
+		self.values = dict.fromkeys(FIELDS, 0)
+		self.values['magic'] = MAGIC
+
+	def target_speed(self, distance):
+		# Two straights and two hairpins per lap
+		return self.vmin + (self.vmax - self.vmin) * (0.5 + 0.5 * math.cos(4 * math.pi * distance / self.length))
+
+	def step(self):
+		# Advance one tick and return the new TelemetryPacket
+		rng = self.rng
+		target = self.target_speed(self.distance + self.speed)
+		if target > self.speed:
+			throttle = min(255, int(160 + 95 * (target - self.speed)))
+			brake = 0
+			accel = min(target - self.speed, 6.0 * TICK)
+		elif self.speed - target < 0.01:
+			# lift and coast into the braking zone
+			throttle = 0
+			brake = 0
+			accel = -0.5 * TICK
+		else:
+			throttle = 0
+			brake = min(255, int(60 + 2000 * (self.speed - target)))
+			accel = max(target - self.speed, -12.0 * TICK)
+		self.speed += accel
+		self.distance += self.speed * TICK
+		self.lapTicks += 1
+
+		if self.distance >= self.length:
+			self.distance -= self.length
+			lapTime = int(self.lapTicks * TICK * 1000)
+			self.lastLap = lapTime
+			if self.bestLap == -1 or lapTime < self.bestLap:
+				self.bestLap = lapTime
+			self.lapTicks = 0
+			self.lap += 1
+
+		# pick the highest gear that keeps the revs up
+		wheelRps = self.speed / TYRE_RADIUS
+		gear = 1
+		for i, ratio in enumerate(GEAR_RATIOS):
+			if ratio == 0.0:
+				break
+			if wheelRps * ratio * FINAL_DRIVE * 60 / (2 * math.pi) > 3500 or i == 0:
+				gear = i + 1
+		self.gear = gear
+		rpm = min(REV_LIMIT, wheelRps * GEAR_RATIOS[gear - 1] * FINAL_DRIVE * 60 / (2 * math.pi))
+		suggested = gear + 1 if rpm > REV_WARNING and GEAR_RATIOS[gear] > 0 else 15
+
+		angle = 2 * math.pi * self.distance / self.length
+		heading = math.atan2(self.radiusZ * math.cos(angle), -self.radiusX * math.sin(angle))
+
+		self.fuel = max(0.0, self.fuel - 0.000012 * self.speed * (1 + throttle / 255))
+		for i in range(4):
+			load = 0.01 * self.speed * (1.5 if brake else 1.0)
+			self.tyreTemp[i] += (load - 0.02 * (self.tyreTemp[i] - 60)) * TICK * 10
+		self.oilTemp += (0.0005 * rpm / 100 - 0.01 * (self.oilTemp - 90)) * TICK
+		self.waterTemp += (0.0004 * rpm / 100 - 0.01 * (self.waterTemp - 85)) * TICK
+		self.timeOfDay += int(TICK * 1000)
+
+		driveSlip = 1.12 if throttle > 200 and gear <= 3 else 1.0
+		brakeSlip = 0.75 if brake == 255 and self.speed > 60 else 1.0
+
+		v = self.values
+		v['pos_x'] = self.radiusX * math.cos(angle)
+		v['pos_y'] = 12.5 + 0.5 * math.sin(3 * angle)
+		v['pos_z'] = self.radiusZ * math.sin(angle)
+		v['vel_x'] = self.speed * math.cos(heading)
+		v['vel_y'] = 0.0
+		v['vel_z'] = self.speed * math.sin(heading)
+		v['rot_pitch'] = 0.002 * (brake - throttle) / 255
+		v['rot_yaw'] = heading / math.pi
+		v['rot_roll'] = 0.01 * math.sin(2 * angle)
+		v['unknown_28'] = math.cos(heading / 2)
+		v['angvel_x'] = rng.gauss(0, 0.01)
+		v['angvel_y'] = self.speed / self.radiusX * 0.5
+		v['angvel_z'] = rng.gauss(0, 0.01)
+		v['ride_height'] = 0.072 + 0.002 * rng.random()
+		v['rpm'] = rpm
+		v['fuel_level'] = self.fuel
+		v['fuel_capacity'] = 100.0
+		v['speed'] = self.speed
+		v['boost_raw'] = 1.0 + 0.9 * throttle / 255
+		v['oil_pressure'] = 2.0 + 3.0 * rpm / REV_LIMIT
+		v['water_temp'] = self.waterTemp
+		v['oil_temp'] = self.oilTemp
+		v['tyre_temp_fl'], v['tyre_temp_fr'], v['tyre_temp_rl'], v['tyre_temp_rr'] = self.tyreTemp
+		v['packet_id'] = self.packetId
+		v['current_lap'] = self.lap
+		v['total_laps'] = self.laps
+		v['best_lap'] = self.bestLap
+		v['last_lap'] = self.lastLap
+		v['time_of_day'] = self.timeOfDay
+		v['position'] = 1
+		v['total_positions'] = 16
+		v['rev_warning'] = REV_WARNING
+		v['rev_limiter'] = REV_LIMIT
+		v['est_top_speed'] = 287
+		v['flags'] = FLAG_CAR_ON_TRACK | FLAG_IN_GEAR | FLAG_HAS_TURBO | (FLAG_REV_LIMITER if rpm >= REV_WARNING else 0)
+		v['flags2'] = 0
+		v['gears'] = (suggested << 4) | gear
+		v['throttle'] = throttle
+		v['brake'] = brake
+		v['unknown_93'] = 0
+		v['unknown_94'] = rng.random()
+		v['unknown_98'] = rng.random()
+		v['unknown_9c'] = rng.random()
+		v['unknown_a0'] = rng.random()
+		front = wheelRps * brakeSlip
+		rear = wheelRps * driveSlip
+		v['wheel_speed_fl'] = -front
+		v['wheel_speed_fr'] = -front
+		v['wheel_speed_rl'] = -rear
+		v['wheel_speed_rr'] = -rear
+		v['tyre_diam_fl'] = v['tyre_diam_fr'] = v['tyre_diam_rl'] = v['tyre_diam_rr'] = TYRE_RADIUS
+		v['susp_fl'] = v['susp_fr'] = 0.08 + 0.01 * brake / 255
+		v['susp_rl'] = v['susp_rr'] = 0.08 + 0.01 * throttle / 255
+		v['clutch'] = 0.0
+		v['clutch_engaged'] = 1.0
+		v['rpm_after_clutch'] = rpm
+		v['gear_unknown'] = FINAL_DRIVE
+		v['gear_1'], v['gear_2'], v['gear_3'], v['gear_4'], v['gear_5'], v['gear_6'], v['gear_7'], v['gear_8'] = GEAR_RATIOS
+		v['car_id'] = self.carId
+
+		self.packetId += 1
+		return TelemetryPacket(**v)
+
+	def datagram(self):
+		# Advance one tick and return the packet encrypted like the console sends it
+		return salsa20_enc(encode(self.step()), self.rng.getrandbits(32))
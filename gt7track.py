@@ -0,0 +1,494 @@
+import csv
+import math
+import os
+# pip3 install numpy
+import numpy as np
+from gt7batch import decode_capture
+from gt7capture import CaptureReader
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Track data and matching, shared by the track detector (gt7trackdetect.py),
+# the track database (gt7trackdb.py), the archive tagger (gt7tracktag.py) and
+# the pipeline's track consumer.
+#
+#   TrackBounds          a row of gt7trackdetect.csv: start/finish segment,
+#                        direction and the bounding box of the layout
+#   find_matching_track  a lap crossing against a list of TrackBounds, or
+#                        against a TrackIndex of them
+#   StreamingDetector    the track narrowed down from the first metres driven,
+#                        by bounding box and fingerprint
+
+class TrackBounds:
+	def __init__(self, **kwargs):
+		for key, value in kwargs.items():
+			# Convert the value to the appropriate data type
+			if key in ['TRACK']:
+				value = int(value)
+			elif key in ['DIRECTION']:
+				value = str(value)
+			else:
+				value = float(value)
+
+			# Set the attribute on the instance
+			setattr(self, key, value)
+
+	def __str__(self):
+		# Create a list of strings for the properties
+		prop_strings = []
+		for key, value in self.__dict__.items():
+			prop_strings.append(f'{key}: {value} ({type(value).__name__})')
+	
+		# Join the strings with newlines
+		return '\n'.join(prop_strings)
+
+def load_track_bounds(filename):
+	# Open the CSV file
+	with open(filename, 'r') as f:
+		# Read the rows from the CSV file
+		rows = list(csv.DictReader(f))
+
+	# Create a list of TrackBounds instances
+	track_bounds = []
+	for row in rows:
+		track_bounds.append(TrackBounds(**row))
+
+	return track_bounds
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def line_intersects(p0_x, p0_y, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y):
+
+	s1_x = p1_x - p0_x
+	s1_y = p1_y - p0_y
+	s2_x = p3_x - p2_x
+	s2_y = p3_y - p2_y
+
+	d = line_direction(s2_x, s2_y)
+
+	denominator = -s2_x * s1_y + s1_x * s2_y
+	if denominator == 0:
+		# Parallel (or degenerate) segments never cross
+		return (0, d)
+	s = (-s1_y * (p0_x - p2_x) + s1_x * (p0_y - p2_y)) / denominator
+	t = (s2_x * (p0_y - p2_y) - s2_y * (p0_x - p2_x)) / denominator
+
+	if s >= 0 and s <= 1 and t >= 0 and t <= 1:
+		# Collision detected
+		return (1, d)
+	return (0, d) # No collision
+
+def line_direction(s2_x, s2_y):
+	d = '--'
+	if s2_x > 0:
+		# Second set of coordinates has a positive x direction
+		d = 'PX'
+	elif s2_x < 0:
+		# Second set of coordinates has a negative x direction
+		d = 'NX'
+	elif s2_y > 0:
+		# Second set of coordinates has a positive y direction
+		d = 'PY'
+	elif s2_y < 0:
+		# Second set of coordinates has a negative y direction
+		d = 'NY'
+	else:
+		# Second set of coordinates has no discernible direction
+		d = '??'
+	return d
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def get_bounding_box(x1, y1, x2, y2):
+	return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+def get_bounding_box_area(box):
+	return (box[2] - box[0]) * (box[3] - box[1])
+
+def get_bounding_box_intersection(box1, box2):
+	left = max(box1[0], box2[0])
+	right = min(box1[2], box2[2])
+	top = max(box1[1], box2[1])
+	bottom = min(box1[3], box2[3])
+	if left > right or top > bottom:
+		# The bounding boxes do not overlap
+		return None
+	return left, top, right, bottom
+
+def calculate_iou(outer_bounding_box, inner_bounding_box):
+	# Calculate the area of the intersection of the bounding boxes
+	intersection = get_bounding_box_intersection(outer_bounding_box, inner_bounding_box)
+	if intersection is None:
+		return 0
+	intersection_area = get_bounding_box_area(intersection)
+	outer_area = get_bounding_box_area(outer_bounding_box)
+	inner_area = get_bounding_box_area(inner_bounding_box)
+	iou = intersection_area / (outer_area + inner_area - intersection_area)
+	return iou
+
+def find_matching_track(L1X, L1Y, L2X, L2Y, MinX, MinY, MaxX, MaxY, track_bounds, max_matches=3, min_iou=0.02):
+	# track_bounds: a list of TrackBounds, scanned one by one, or a TrackIndex
+	if isinstance(track_bounds, TrackIndex):
+		return track_bounds.find_matching_track(L1X, L1Y, L2X, L2Y, MinX, MinY, MaxX, MaxY, max_matches, min_iou)
+
+	# Calculate the outer bounding box for the line defined by L1X, L1Y, L2X and L2Y
+	outer_bounding_box = get_bounding_box(MinX, MinY, MaxX, MaxY)
+
+	# Find the elements with the highest IoUs
+	matches = []
+	for element in track_bounds:
+		# Calculate the inner bounding box for the line defined by P1X, P1Y, P2X and P2Y
+		inner_bounding_box = get_bounding_box(element.MINX, element.MINY, element.MAXX, element.MAXY)
+
+		# Check if the lines intersect
+		intersects, direction = line_intersects(element.P1X, element.P1Y, element.P2X, element.P2Y, L1X, L1Y, L2X, L2Y)
+		if intersects == 0:
+			# The lines do not intersect, so skip this element
+			continue
+
+		# Check if the direction of the element matches the direction of the intersection point
+		if element.DIRECTION != direction:
+			# The direction does not match, so skip this element
+			continue
+
+		# Calculate the IoU
+		iou = calculate_iou(outer_bounding_box, inner_bounding_box)
+
+		# The lines intersect, so add the element and its direction to the matches list
+		matches.append((iou, element.TRACK))
+
+	# Sort the matches list in descending order of IoU
+	matches.sort(key=lambda x: x[0], reverse=True)
+
+	# Return the top max_matches elements in the matches list
+	if not matches:
+		return None
+
+	# Get the best match
+	best_match = matches[0]
+
+	# Filter out matches that are not within 2-3% of the best match
+	filtered_matches = [match for match in matches if match[0] >= best_match[0] * (1 - min_iou)]
+	if len(filtered_matches) > max_matches:
+		filtered_matches = filtered_matches[:max_matches]
+
+	return filtered_matches
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+DIRECTIONS = ['PX', 'NX', 'PY', 'NY', '??']
+
+# TrackIndex arrays, in the order gt7trackdb.py stores them
+INDEX_COLUMNS = ['track', 'p1x', 'p1y', 'p2x', 'p2y', 'direction', 'minx', 'miny', 'maxx', 'maxy']
+
+def cell_code(cx, cy, h=0):
+	# One sortable integer for a grid cell (and heading sector); cells up to
+	# 2^20 either side of the origin
+	return ((cx + (1 << 20)) << 25) | ((cy + (1 << 20)) << 4) | h
+
+class CellTable:
+	# Cell code -> row numbers, as a sorted array of codes with the rows of
+	# each code packed into one array. Lookups are a binary search, and the
+	# three arrays can be stored and mapped back as they are.
+	def __init__(self, codes, offsets, rows):
+		self.codes = codes
+		self.offsets = offsets
+		self.rows = rows
+
+	@classmethod
+	def from_dict(cls, cells):
+		codes = np.array(sorted(cells), dtype=np.int64)
+		offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+		offsets[1:] = np.cumsum([len(cells[code]) for code in codes.tolist()])
+		rows = np.array([row for code in codes.tolist() for row in sorted(cells[code])], dtype=np.int64)
+		return cls(codes, offsets, rows)
+
+	def get(self, code):
+		i = int(np.searchsorted(self.codes, code))
+		if i < len(self.codes) and self.codes[i] == code:
+			return self.rows[self.offsets[i]:self.offsets[i + 1]]
+		return None
+
+class TrackIndex:
+	# The track bounds compiled into NumPy columns, plus a uniform grid over the
+	# start/finish segments. A lap crossing only looks at the segments in the
+	# grid cells its own movement touches, and tests them all at once. Gives the
+	# same matches, in the same order, as scanning the list of TrackBounds.
+	def __init__(self, track_bounds, cellSize=50.0):
+		self.count = len(track_bounds)
+		self.track = np.array([e.TRACK for e in track_bounds], dtype=np.int64)
+		self.p1x = np.array([e.P1X for e in track_bounds], dtype=np.float64)
+		self.p1y = np.array([e.P1Y for e in track_bounds], dtype=np.float64)
+		self.p2x = np.array([e.P2X for e in track_bounds], dtype=np.float64)
+		self.p2y = np.array([e.P2Y for e in track_bounds], dtype=np.float64)
+		self.direction = np.array([DIRECTIONS.index(e.DIRECTION) if e.DIRECTION in DIRECTIONS else -1 for e in track_bounds], dtype=np.int8)
+		self.minx = np.array([e.MINX for e in track_bounds], dtype=np.float64)
+		self.miny = np.array([e.MINY for e in track_bounds], dtype=np.float64)
+		self.maxx = np.array([e.MAXX for e in track_bounds], dtype=np.float64)
+		self.maxy = np.array([e.MAXY for e in track_bounds], dtype=np.float64)
+		self.cellSize = cellSize
+		self.build_grid()
+
+	@classmethod
+	def from_columns(cls, columns, grid, cellSize):
+		# An index from prebuilt arrays (see gt7trackdb.py), nothing is copied
+		index = cls.__new__(cls)
+		for name in INDEX_COLUMNS:
+			setattr(index, name, columns[name])
+		index.count = len(index.track)
+		index.grid = grid
+		index.cellSize = cellSize
+		return index
+
+	def build_grid(self):
+		# Every segment is listed in each cell its bounding box overlaps
+		cells = {}
+		x0 = np.floor(np.minimum(self.p1x, self.p2x) / self.cellSize).astype(np.int64)
+		x1 = np.floor(np.maximum(self.p1x, self.p2x) / self.cellSize).astype(np.int64)
+		y0 = np.floor(np.minimum(self.p1y, self.p2y) / self.cellSize).astype(np.int64)
+		y1 = np.floor(np.maximum(self.p1y, self.p2y) / self.cellSize).astype(np.int64)
+		for i in range(self.count):
+			for cx in range(x0[i], x1[i] + 1):
+				for cy in range(y0[i], y1[i] + 1):
+					cells.setdefault(cell_code(cx, cy), []).append(i)
+		self.grid = CellTable.from_dict(cells)
+
+	def candidates(self, L1X, L1Y, L2X, L2Y, maxCells=64):
+		# Row numbers, ascending, of the segments near the movement L1 -> L2
+		cx0 = int(np.floor(min(L1X, L2X) / self.cellSize))
+		cx1 = int(np.floor(max(L1X, L2X) / self.cellSize))
+		cy0 = int(np.floor(min(L1Y, L2Y) / self.cellSize))
+		cy1 = int(np.floor(max(L1Y, L2Y) / self.cellSize))
+		if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > maxCells:
+			# a long jump (e.g. lost packets); not worth walking the grid
+			return np.arange(self.count)
+		found = []
+		for cx in range(cx0, cx1 + 1):
+			for cy in range(cy0, cy1 + 1):
+				rows = self.grid.get(cell_code(cx, cy))
+				if rows is not None:
+					found.append(rows)
+		if not found:
+			return np.zeros(0, dtype=np.int64)
+		if len(found) == 1:
+			return found[0]
+		return np.unique(np.concatenate(found))
+
+	def find_matching_track(self, L1X, L1Y, L2X, L2Y, MinX, MinY, MaxX, MaxY, max_matches=3, min_iou=0.02):
+		# Same arguments and result as find_matching_track
+		rows = self.candidates(L1X, L1Y, L2X, L2Y)
+		if len(rows) == 0:
+			return None
+
+		# The direction of the movement must match
+		direction = line_direction(L2X - L1X, L2Y - L1Y)
+		rows = rows[self.direction[rows] == DIRECTIONS.index(direction)]
+		if len(rows) == 0:
+			return None
+
+		# Segment intersection, as in line_intersects
+		p0_x = self.p1x[rows]
+		p0_y = self.p1y[rows]
+		s1_x = self.p2x[rows] - p0_x
+		s1_y = self.p2y[rows] - p0_y
+		s2_x = L2X - L1X
+		s2_y = L2Y - L1Y
+		denominator = -s2_x * s1_y + s1_x * s2_y
+		with np.errstate(divide='ignore', invalid='ignore'):
+			s = (-s1_y * (p0_x - L1X) + s1_x * (p0_y - L1Y)) / denominator
+			t = (s2_x * (p0_y - L1Y) - s2_y * (p0_x - L1X)) / denominator
+		hit = (denominator != 0) & (s >= 0) & (s <= 1) & (t >= 0) & (t <= 1)
+		rows = rows[hit]
+		if len(rows) == 0:
+			return None
+
+		# IoU of the lap's box and each track's box
+		outer = get_bounding_box(MinX, MinY, MaxX, MaxY)
+		inner_minx = np.minimum(self.minx[rows], self.maxx[rows])
+		inner_miny = np.minimum(self.miny[rows], self.maxy[rows])
+		inner_maxx = np.maximum(self.minx[rows], self.maxx[rows])
+		inner_maxy = np.maximum(self.miny[rows], self.maxy[rows])
+		left = np.maximum(outer[0], inner_minx)
+		top = np.maximum(outer[1], inner_miny)
+		right = np.minimum(outer[2], inner_maxx)
+		bottom = np.minimum(outer[3], inner_maxy)
+		overlap = (left <= right) & (top <= bottom)
+		intersection_area = np.where(overlap, (right - left) * (bottom - top), 0.0)
+		outer_area = get_bounding_box_area(outer)
+		inner_area = (inner_maxx - inner_minx) * (inner_maxy - inner_miny)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			iou = np.where(overlap, intersection_area / (outer_area + inner_area - intersection_area), 0.0)
+
+		# Best first, ties in file order
+		order = np.argsort(-iou, kind='stable')
+		iou = iou[order]
+		tracks = self.track[rows][order]
+		keep = iou >= iou[0] * (1 - min_iou)
+		return [(float(i), int(track)) for i, track in zip(iou[keep][:max_matches], tracks[keep][:max_matches])]
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Fingerprints: the grid cells (and direction of travel) a track's laps pass
+# through, built from recorded captures with --fingerprint CAPTURE=TRACK
+
+CELL_SIZE = 25.0		# m
+HEADINGS = 8			# direction of travel sectors
+MIN_HEADING_SPEED = 2.0	# m/s, below this the direction of travel is not used
+BOX_SIZE = 500.0		# m, cells of the bounding box table (a new DB_VERSION in gt7trackdb.py when changed)
+
+def heading_of(vx, vy):
+	if vx * vx + vy * vy < MIN_HEADING_SPEED * MIN_HEADING_SPEED:
+		return None
+	return int((math.atan2(vy, vx) + math.pi) / (2 * math.pi) * HEADINGS) % HEADINGS
+
+def load_fingerprints(filename):
+	# Returns {track: set of (cell x, cell y, heading)}, empty when there is no file
+	prints = {}
+	if not os.path.exists(filename):
+		return prints
+	with open(filename, 'r') as f:
+		for row in csv.DictReader(f):
+			prints.setdefault(int(row['TRACK']), set()).add((int(row['CELLX']), int(row['CELLY']), int(row['HEADING'])))
+	return prints
+
+def save_fingerprints(filename, prints):
+	with open(filename, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(['TRACK', 'CELLX', 'CELLY', 'HEADING'])
+		for track in sorted(prints):
+			for cell in sorted(prints[track]):
+				writer.writerow([track, *cell])
+
+FINGERPRINT_CHANNELS = ['pos_x', 'pos_z', 'vel_x', 'vel_z', 'flags']
+
+def fingerprint_cells(data):
+	# The cells visited while driving on track; data needs FINGERPRINT_CHANNELS
+	# 0x8E: car on track, not paused, not loading
+	driving = (data['flags'] & 0b111) == 0b001
+	speed = np.hypot(data['vel_x'], data['vel_z'])
+	data = data[driving & (speed >= MIN_HEADING_SPEED)]
+	cx = np.floor(data['pos_x'] / CELL_SIZE).astype(np.int64)
+	cy = np.floor(data['pos_z'] / CELL_SIZE).astype(np.int64)
+	h = ((np.arctan2(data['vel_z'], data['vel_x']) + np.pi) / (2 * np.pi) * HEADINGS).astype(np.int64) % HEADINGS
+	return set(zip(cx.tolist(), cy.tolist(), h.tolist()))
+
+def build_fingerprint(filename):
+	# The cells visited while driving on track in a capture
+	with CaptureReader(filename) as reader:
+		return fingerprint_cells(decode_capture(reader, FINGERPRINT_CHANNELS))
+
+def fingerprint_tables(index, fingerprints):
+	# (rows with a fingerprint, cell and heading table, cell table, box table)
+	# for the rows of a TrackIndex. Fingerprint cells are grown by one cell
+	# and one heading sector each way to absorb line choice and sector
+	# boundaries. The box table lists the rows without a fingerprint in every
+	# BOX_SIZE cell their bounding box, grown by CELL_SIZE, overlaps.
+	printed = np.array([int(track) in fingerprints for track in index.track], dtype=bool)
+	cells = {}
+	anyHeading = {}
+	for row, track in enumerate(index.track.tolist()):
+		for cx, cy, h in fingerprints.get(track, ()):
+			for dx in (-1, 0, 1):
+				for dy in (-1, 0, 1):
+					anyHeading.setdefault(cell_code(cx + dx, cy + dy), set()).add(row)
+					for dh in (-1, 0, 1):
+						cells.setdefault(cell_code(cx + dx, cy + dy, (h + dh) % HEADINGS), set()).add(row)
+	boxes = {}
+	x0 = np.floor((index.minx - CELL_SIZE) / BOX_SIZE).astype(np.int64)
+	x1 = np.floor((index.maxx + CELL_SIZE) / BOX_SIZE).astype(np.int64)
+	y0 = np.floor((index.miny - CELL_SIZE) / BOX_SIZE).astype(np.int64)
+	y1 = np.floor((index.maxy + CELL_SIZE) / BOX_SIZE).astype(np.int64)
+	for row in np.flatnonzero(~printed).tolist():
+		for bx in range(x0[row], x1[row] + 1):
+			for by in range(y0[row], y1[row] + 1):
+				boxes.setdefault(cell_code(bx, by), set()).add(row)
+	return printed, CellTable.from_dict(cells), CellTable.from_dict(anyHeading), CellTable.from_dict(boxes)
+
+NO_ROWS = np.zeros(0, dtype=np.int64)
+
+class StreamingDetector:
+	# Narrows down the track from the first metres driven. Every time the car
+	# enters a new cell (or changes direction sector), candidates that do not
+	# cover it are dropped: by fingerprint where there is one, otherwise by the
+	# track's bounding box (grown by CELL_SIZE). Only the candidates left are
+	# tested, so a new cell costs as much as there are candidates; the tables
+	# are only looked up for the first cell and after a miss. Packets that
+	# stay in the same cell cost a division and a compare. A cell no candidate
+	# covers starts the narrowing over from the tracks that cover it.
+	# The last candidate is only a match with a fingerprint, or after minMargin
+	# cells on its own: a bounding box alone says little.
+	def __init__(self, index, fingerprints=None, minSteps=8, tables=None, minMargin=8):
+		self.index = index
+		self.minSteps = minSteps
+		self.minMargin = minMargin
+		if tables is None:
+			tables = fingerprint_tables(index, fingerprints or {})
+		self.printed, self.cells, self.anyHeading, self.boxes = tables
+		self.reset()
+
+	def reset(self):
+		self.alive = None		# rows still in the running, None for all of them
+		self.key = None
+		self.steps = 0			# cells covered by every candidate
+		self.runnerUp = 0		# cells covered by the last candidates dropped
+		self.misses = 0
+		self.match = None
+
+	def in_box(self, rows, x, y):
+		index = self.index
+		return (index.minx[rows] - CELL_SIZE <= x) & (x <= index.maxx[rows] + CELL_SIZE) & (index.miny[rows] - CELL_SIZE <= y) & (y <= index.maxy[rows] + CELL_SIZE)
+
+	def printed_rows(self, cx, cy, h):
+		rows = self.anyHeading.get(cell_code(cx, cy)) if h is None else self.cells.get(cell_code(cx, cy, h))
+		return NO_ROWS if rows is None else rows
+
+	def covering(self, x, y, cx, cy, h):
+		# All rows that cover a cell, sorted, from the tables
+		rows = self.boxes.get(cell_code(math.floor(x / BOX_SIZE), math.floor(y / BOX_SIZE)))
+		rows = NO_ROWS if rows is None else rows[self.in_box(rows, x, y)]
+		return np.union1d(rows, self.printed_rows(cx, cy, h))
+
+	def update(self, x, y, vx=0.0, vy=0.0):
+		# Feed one position (x, z in game coordinates); returns the track once
+		# it is the only candidate left, else None
+		cx = math.floor(x / CELL_SIZE)
+		cy = math.floor(y / CELL_SIZE)
+		h = heading_of(vx, vy)
+		key = (cx, cy, h)
+		if key == self.key:
+			return self.match
+		self.key = key
+		self.steps += 1
+
+		if self.alive is None:
+			before = self.index.count
+			alive = self.covering(x, y, cx, cy, h)
+		else:
+			before = len(self.alive)
+			rows = self.alive
+			cover = ~self.printed[rows] & self.in_box(rows, x, y)
+			printedRows = self.printed_rows(cx, cy, h)
+			if len(printedRows):
+				cover |= np.isin(rows, printedRows)
+			alive = rows[cover]
+		if len(alive):
+			if len(alive) < before:
+				self.runnerUp = self.steps - 1
+			self.alive = alive
+		else:
+			# somewhere no candidate knows about (another layout, an unknown
+			# track): start over from the tracks that cover it, if any
+			self.misses += 1
+			cover = self.covering(x, y, cx, cy, h) if self.alive is not None else alive
+			self.alive = cover if len(cover) else None
+			self.steps = 1 if len(cover) else 0
+			self.runnerUp = 0
+
+		if self.match is None and self.steps >= self.minSteps and self.alive is not None and len(self.alive) == 1:
+			row = int(self.alive[0])
+			if self.printed[row] or self.steps - self.runnerUp >= self.minMargin:
+				self.match = int(self.index.track[row])
+		return self.match
+
+	def candidates(self):
+		if self.alive is None:
+			return [int(track) for track in self.index.track]
+		return [int(track) for track in self.index.track[self.alive]]
@@ -0,0 +1,160 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+# pip3 install numpy
+import numpy as np
+from gt7track import INDEX_COLUMNS, CellTable, TrackIndex, fingerprint_tables, load_fingerprints, load_track_bounds
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Compiled track database.
+#
+# gt7trackdetect.csv (and gt7trackprints.csv) compiled into one binary file:
+# the TrackIndex columns, its start/finish grid and the fingerprint and
+# bounding box tables of the streaming detector, each as a packed array.
+# Loading maps the file and points NumPy at it, so startup does not grow with
+# the number of layouts.
+# The header records size, mtime and hash of the sources; the file is rebuilt
+# when they change.
+#
+#   header    magic, version, index cell size, section count, then for both
+#             sources: size, mtime ns, sha256
+#   sections  offset and element count of each array, in SECTIONS order
+#   arrays    8 byte aligned
+
+DB_MAGIC = b'GT7T'
+DB_VERSION = 2
+
+_HEADER = struct.Struct('<4sHxxdI4xqq32sqq32s')
+_SECTION = struct.Struct('<qq')
+
+SECTIONS = [(name, np.int8 if name == 'direction' else np.int64 if name == 'track' else np.float64) for name in INDEX_COLUMNS] + [
+	('grid_codes', np.int64), ('grid_offsets', np.int64), ('grid_rows', np.int64),
+	('printed', np.bool_),
+	('cells_codes', np.int64), ('cells_offsets', np.int64), ('cells_rows', np.int64),
+	('any_codes', np.int64), ('any_offsets', np.int64), ('any_rows', np.int64),
+	('boxes_codes', np.int64), ('boxes_offsets', np.int64), ('boxes_rows', np.int64),
+]
+
+class TrackDatabaseError(Exception):
+	pass
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def source_stamp(filename):
+	# (size, mtime ns) of a source file, (-1, 0) when there is none
+	try:
+		st = os.stat(filename)
+	except FileNotFoundError:
+		return -1, 0
+	return st.st_size, st.st_mtime_ns
+
+def source_hash(filename):
+	try:
+		with open(filename, 'rb') as f:
+			return hashlib.sha256(f.read()).digest()
+	except FileNotFoundError:
+		return bytes(32)
+
+def compile_database(csvFile, printsFile, dbFile):
+	# Build the index and tables from the sources and write them to dbFile
+	index = TrackIndex(load_track_bounds(csvFile))
+	printed, cells, anyHeading, boxes = fingerprint_tables(index, load_fingerprints(printsFile))
+	arrays = {name: getattr(index, name) for name in INDEX_COLUMNS}
+	for prefix, table in (('grid', index.grid), ('cells', cells), ('any', anyHeading), ('boxes', boxes)):
+		arrays[prefix + '_codes'] = table.codes
+		arrays[prefix + '_offsets'] = table.offsets
+		arrays[prefix + '_rows'] = table.rows
+	arrays['printed'] = printed
+
+	sections = []
+	offset = _HEADER.size + len(SECTIONS) * _SECTION.size
+	blobs = []
+	for name, dtype in SECTIONS:
+		data = np.ascontiguousarray(arrays[name], dtype=dtype).tobytes()
+		offset += -offset % 8
+		sections.append((offset, len(arrays[name])))
+		blobs.append((offset, data))
+		offset += len(data)
+
+	header = _HEADER.pack(DB_MAGIC, DB_VERSION, index.cellSize, len(SECTIONS),
+		*source_stamp(csvFile), source_hash(csvFile), *source_stamp(printsFile), source_hash(printsFile))
+
+	# written next to the old one and moved into place, so a detector starting
+	# at the same time never maps a half written file
+	temp = f'{dbFile}.{os.getpid()}.tmp'
+	with open(temp, 'wb') as f:
+		f.write(header)
+		for section in sections:
+			f.write(_SECTION.pack(*section))
+		for offset, data in blobs:
+			f.write(bytes(offset - f.tell()))
+			f.write(data)
+	os.replace(temp, dbFile)
+
+def read_header(mm):
+	if len(mm) < _HEADER.size:
+		raise TrackDatabaseError('truncated track database')
+	magic, version, cellSize, count, csvSize, csvTime, csvHash, printsSize, printsTime, printsHash = _HEADER.unpack_from(mm, 0)
+	if magic != DB_MAGIC or version != DB_VERSION or count != len(SECTIONS):
+		raise TrackDatabaseError('not a compatible track database')
+	return cellSize, (csvSize, csvTime), csvHash, (printsSize, printsTime), printsHash
+
+def is_current(dbFile, csvFile, printsFile):
+	# True when dbFile was compiled from the sources as they are now. A changed
+	# mtime alone (a checkout, a copy) is checked against the hash, and the
+	# stamps are brought up to date when the content is the same.
+	try:
+		with open(dbFile, 'rb') as f:
+			head = f.read(_HEADER.size)
+		cellSize, csvStamp, csvHash, printsStamp, printsHash = read_header(head)
+	except (FileNotFoundError, TrackDatabaseError):
+		return False
+	if csvStamp == source_stamp(csvFile) and printsStamp == source_stamp(printsFile):
+		return True
+	if csvHash != source_hash(csvFile) or printsHash != source_hash(printsFile):
+		return False
+	header = _HEADER.pack(DB_MAGIC, DB_VERSION, cellSize, len(SECTIONS),
+		*source_stamp(csvFile), csvHash, *source_stamp(printsFile), printsHash)
+	with open(dbFile, 'r+b') as f:
+		f.write(header)
+	return True
+
+def open_database(dbFile):
+	# Returns (TrackIndex, fingerprint tables) backed by a read-only map of dbFile
+	with open(dbFile, 'rb') as f:
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	cellSize = read_header(mm)[0]
+	arrays = {}
+	for i, (name, dtype) in enumerate(SECTIONS):
+		offset, count = _SECTION.unpack_from(mm, _HEADER.size + i * _SECTION.size)
+		arrays[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=offset)
+	tables = {prefix: CellTable(arrays[prefix + '_codes'], arrays[prefix + '_offsets'], arrays[prefix + '_rows']) for prefix in ('grid', 'cells', 'any', 'boxes')}
+	index = TrackIndex.from_columns(arrays, tables['grid'], cellSize)
+	return index, (arrays['printed'], tables['cells'], tables['any'], tables['boxes'])
+
+def load_database(csvFile='gt7trackdetect.csv', printsFile='gt7trackprints.csv', dbFile=None):
+	# The compiled form of csvFile and printsFile, (re)building it when needed
+	if dbFile is None:
+		dbFile = os.path.splitext(csvFile)[0] + '.db'
+	if not is_current(dbFile, csvFile, printsFile):
+		compile_database(csvFile, printsFile, dbFile)
+	return open_database(dbFile)
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Compile the track bounds and fingerprints into a binary track database')
+	parser.add_argument('--csv', default='gt7trackdetect.csv', help='track bounds (default gt7trackdetect.csv)')
+	parser.add_argument('--prints', default='gt7trackprints.csv', help='fingerprints (default gt7trackprints.csv)')
+	parser.add_argument('--db', help='output file (default the csv file with .db)')
+	args = parser.parse_args()
+
+	dbFile = args.db or os.path.splitext(args.csv)[0] + '.db'
+	start = time.perf_counter()
+	compile_database(args.csv, args.prints, dbFile)
+	index, tables = open_database(dbFile)
+	print(f'{index.count} layouts, {len(index.grid.codes)} grid cells, {int(tables[0].sum())} fingerprints in {time.perf_counter() - start:.3f} s -> {dbFile}', file=sys.stderr)
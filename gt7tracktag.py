@@ -0,0 +1,240 @@
+import argparse
+import csv
+import hashlib
+import os
+import sys
+import time
+from multiprocessing import Pool
+# pip3 install numpy
+import numpy as np
+from gt7batch import decode_capture
+from gt7capture import CaptureError, CaptureReader, int_to_ip
+from gt7track import FINGERPRINT_CHANNELS, fingerprint_cells, load_fingerprints, save_fingerprints
+from gt7trackdb import load_database
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Offline track identification for a directory of captures.
+#
+# Each capture is decoded in columns, split into runs where the lap counter
+# goes back (a restart, or another event), and every lap crossing of a run is
+# matched the way gt7trackdetect.py does live: the segment between the last
+# packet before and the first packet after the crossing, against the position
+# bounds of the run so far. The first confident match of a run is kept, else
+# the best one seen. A capture with several consoles has the runs of each
+# console in turn, by address, numbered per console. Results go to a CSV table
+# keyed on the file's SHA-256, so files that were already tagged are skipped,
+# even after a rename. A table from before the SOURCE column is tagged again.
+# With --fingerprints, the runs tagged with a single confident match are added
+# to the fingerprints of their track, which builds gt7trackprints.csv from the
+# capture archive.
+
+FIELDS = ['FILE', 'SHA256', 'SIZE', 'MTIME', 'SOURCE', 'RUN', 'TRACK', 'IOU', 'MATCHES']
+CONFIDENT_IOU = 0.96
+
+# per worker process state, set up by _init_worker
+_worker = {}
+
+def _init_worker(csvFile, printsFile, knownHashes):
+	_worker['index'] = load_database(csvFile, printsFile)[0]
+	_worker['known'] = knownHashes
+
+def file_hash(filename):
+	h = hashlib.sha256()
+	with open(filename, 'rb') as f:
+		while True:
+			block = f.read(1 << 20)
+			if not block:
+				break
+			h.update(block)
+	return h.hexdigest()
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def runs(laps):
+	# [start, stop) ranges of a session between points where the lap goes back
+	cuts = np.flatnonzero(laps[1:] < laps[:-1]) + 1
+	bounds = [0] + cuts.tolist() + [len(laps)]
+	return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def crossings(data):
+	# For every lap crossing into lap 2 or later of a run: (old x, old y,
+	# new x, new y, min x, min y, max x, max y), as the live detector sees it
+	x = data['pos_x'].astype(np.float64)
+	y = data['pos_z'].astype(np.float64)
+	lap = data['current_lap'].astype(np.int64)
+	counted = lap > 0
+	minX = np.minimum.accumulate(np.where(counted, x, np.inf))
+	minY = np.minimum.accumulate(np.where(counted, y, np.inf))
+	maxX = np.maximum.accumulate(np.where(counted, x, -np.inf))
+	maxY = np.maximum.accumulate(np.where(counted, y, -np.inf))
+	previous = np.maximum.accumulate(lap)
+	at = np.flatnonzero((lap[1:] > previous[:-1]) & (lap[1:] > 1)) + 1
+	return np.stack([x[at - 1], y[at - 1], x[at], y[at], minX[at], minY[at], maxX[at], maxY[at]], axis=1)
+
+def match_runs(data, index):
+	# The best matches (as find_matching_track returns them) of each run, or
+	# None for runs without a match. data needs pos_x, pos_z, current_lap, flags.
+	# 0x8E: car on track, not paused, not loading
+	data = data[(data['flags'] & 0b111) == 0b001]
+	results = []
+	for start, stop in runs(data['current_lap']):
+		best = None
+		for crossing in crossings(data[start:stop]):
+			matches = index.find_matching_track(*crossing.tolist())
+			if not matches:
+				continue
+			if best is None or matches[0][0] > best[0][0]:
+				best = matches
+			if len(matches) == 1 and matches[0][0] > CONFIDENT_IOU:
+				best = matches
+				break
+		results.append(best)
+	return results
+
+def tag_session(filename):
+	# Returns (filename, sha256, size, mtime, [(source, run, track, iou,
+	# matches)]) or (filename, None, None, None, error message). Content
+	# already in the table is not decoded: (filename, sha256, size, mtime, None).
+	index = _worker['index']
+	try:
+		st = os.stat(filename)
+		digest = file_hash(filename)
+		if digest in _worker['known']:
+			return filename, digest, st.st_size, st.st_mtime_ns, None
+		with CaptureReader(filename) as reader:
+			data = decode_capture(reader, ['pos_x', 'pos_z', 'current_lap', 'flags'])
+	except (CaptureError, OSError) as e:
+		return filename, None, None, None, str(e)
+
+	results = []
+	for source in np.unique(data['source']):
+		ip = int_to_ip(int(source))
+		for run, best in enumerate(match_runs(data[data['source'] == source], index)):
+			if best is None:
+				results.append((ip, run, '', '', ''))
+			else:
+				results.append((ip, run, best[0][1], round(best[0][0], 4), '|'.join(str(track) for iou, track in best)))
+	if not results:
+		results.append(('', 0, '', '', ''))
+	return filename, digest, st.st_size, st.st_mtime_ns, results
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def load_table(filename):
+	# The rows of an existing table, empty when there is none or it has other
+	# columns
+	if not os.path.exists(filename):
+		return []
+	with open(filename, 'r', newline='') as f:
+		reader = csv.DictReader(f)
+		rows = list(reader)
+	return rows if reader.fieldnames == FIELDS else []
+
+def tag_directory(directory, output, csvFile='gt7trackdetect.csv', printsFile='gt7trackprints.csv', workers=None, out=sys.stderr):
+	table = load_table(output)
+	knownHashes = {row['SHA256'] for row in table}
+	# path, size and mtime unchanged: the hash in the table still holds, and
+	# the file does not have to be read at all
+	knownFiles = {(row['FILE'], row['SIZE'], row['MTIME']) for row in table}
+
+	files = []
+	unchanged = 0
+	for name in sorted(os.listdir(directory)):
+		path = os.path.join(directory, name)
+		if not os.path.isfile(path) or not name.endswith('.gt7'):
+			continue
+		st = os.stat(path)
+		if (path, str(st.st_size), str(st.st_mtime_ns)) in knownFiles:
+			unchanged += 1
+			continue
+		files.append(path)
+
+	# compile the track database once here, rather than racing in every worker
+	load_database(csvFile, printsFile)
+
+	start = time.perf_counter()
+	tagged = skipped = failed = 0
+	# appended to, or written anew (with the header) when there is nothing
+	# to keep
+	with open(output, 'a' if table else 'w', newline='') as f:
+		writer = csv.DictWriter(f, fieldnames=FIELDS)
+		if not table:
+			writer.writeheader()
+		with Pool(workers, initializer=_init_worker, initargs=(csvFile, printsFile, knownHashes)) as pool:
+			for filename, digest, size, mtime, results in pool.imap_unordered(tag_session, files):
+				if digest is None:
+					print(f'{filename}: {results}', file=out)
+					failed += 1
+					continue
+				if digest in knownHashes:
+					# same content under another name (or touched); record the
+					# name with the results already known
+					rows = [row for row in table if row['SHA256'] == digest]
+					for row in rows:
+						writer.writerow(dict(row, FILE=filename, SIZE=size, MTIME=mtime))
+					skipped += 1
+					continue
+				knownHashes.add(digest)
+				for source, run, track, iou, matches in results:
+					row = {'FILE': filename, 'SHA256': digest, 'SIZE': size, 'MTIME': mtime, 'SOURCE': source, 'RUN': run, 'TRACK': track, 'IOU': iou, 'MATCHES': matches}
+					table.append(row)
+					writer.writerow(row)
+				f.flush()
+				tagged += 1
+	print(f'{tagged} tagged, {skipped} already known, {failed} failed, {unchanged} unchanged in {time.perf_counter() - start:.1f} s', file=out)
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def fingerprint_runs(filename):
+	# The fingerprint cells of each run of a capture, by (source, run) as
+	# tag_session numbers the runs
+	with CaptureReader(filename) as reader:
+		data = decode_capture(reader, FINGERPRINT_CHANNELS + ['current_lap'])
+	data = data[(data['flags'] & 0b111) == 0b001]
+	cells = {}
+	for source in np.unique(data['source']):
+		own = data[data['source'] == source]
+		for run, (start, stop) in enumerate(runs(own['current_lap'])):
+			cells[int_to_ip(int(source)), run] = fingerprint_cells(own[start:stop])
+	return cells
+
+def build_fingerprints(table, printsFile, out=sys.stderr):
+	# Adds every run of the table with a single confident match to the
+	# fingerprints of its track
+	confident = {}
+	for row in table:
+		if row['TRACK'] and '|' not in row['MATCHES'] and float(row['IOU']) > CONFIDENT_IOU:
+			filename, tracks = confident.get(row['SHA256'], (None, {}))
+			tracks[row['SOURCE'], int(row['RUN'])] = int(row['TRACK'])
+			# the last name the content was seen under
+			confident[row['SHA256']] = row['FILE'], tracks
+	prints = load_fingerprints(printsFile)
+	added = 0
+	for filename, tracks in confident.values():
+		try:
+			cells = fingerprint_runs(filename)
+		except (CaptureError, OSError) as e:
+			print(f'{filename}: {e}', file=out)
+			continue
+		for run, track in tracks.items():
+			if run in cells:
+				prints.setdefault(track, set()).update(cells[run])
+				added += 1
+	save_fingerprints(printsFile, prints)
+	print(f'{added} runs added, {len(prints)} tracks with a fingerprint -> {printsFile}', file=out)
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Tag a directory of capture files with the track they were recorded on')
+	parser.add_argument('directory', help='directory with .gt7 capture files')
+	parser.add_argument('--output', default='gt7tracktags.csv', help='session to track table, also the cache (default gt7tracktags.csv)')
+	parser.add_argument('--csv', default='gt7trackdetect.csv', help='track bounds (default gt7trackdetect.csv)')
+	parser.add_argument('--prints', default='gt7trackprints.csv', help='fingerprints (default gt7trackprints.csv)')
+	parser.add_argument('--workers', type=int, help='number of worker processes (default one per core)')
+	parser.add_argument('--fingerprints', action='store_true', help='then add the confidently tagged runs to the fingerprints')
+	args = parser.parse_args()
+
+	tag_directory(args.directory, args.output, args.csv, args.prints, args.workers)
+	if args.fingerprints:
+		build_fingerprints(load_table(args.output), args.prints)
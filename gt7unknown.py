@@ -0,0 +1,216 @@
+import argparse
+import json
+import sys
+import time
+# pip3 install numpy
+import numpy as np
+from gt7batch import BatchError, records, single_source
+from gt7capture import CaptureReader
+from gt7parallel import decode_parallel
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Explorer for the undocumented offsets, over whole captures.
+#
+# The unknown floats, and every bit of the flag bytes as a 0/1 series, are
+# correlated with the known channels: Pearson at lag 0, and at every lag up to
+# max_lag packets either way, where a positive lag means the unknown follows
+# the known channel. All series are standardised once into float32 matrices,
+# so a lag is one matrix product of (unknowns x packets) by (packets x known)
+# on shifted views, with no per packet loop; past LAG_SAMPLES packets the lags
+# other than 0 are estimated on every n-th packet. The flag bits also get toggle
+# statistics. Packets are in packet id order; lost packets are not filled in.
+
+UNKNOWN_FLOATS = ['unknown_28', 'unknown_94', 'unknown_98', 'unknown_9c', 'unknown_a0', 'unknown_d4', 'unknown_d8', 'unknown_dc', 'unknown_e0', 'unknown_e4', 'unknown_e8', 'unknown_ec', 'unknown_f0']
+FLAG_BYTES = ['flags', 'flags2', 'unknown_93']
+KNOWN = ['speed', 'rpm', 'throttle', 'brake', 'susp_fl', 'susp_fr', 'susp_rl', 'susp_rr', 'rot_pitch', 'rot_yaw', 'rot_roll']
+
+MAX_LAG = 60			# packets, one second
+LAG_SAMPLES = 1 << 18	# packets used per lag, see lagged_correlations
+
+def unknown_series(data):
+	# (names, columns): the unknown floats, then the flag bytes bit by bit as
+	# 'flags.0' ... 'unknown_93.7'
+	names = list(UNKNOWN_FLOATS)
+	columns = [data[name] for name in UNKNOWN_FLOATS]
+	for byte in FLAG_BYTES:
+		for bit in range(8):
+			names.append(f'{byte}.{bit}')
+			columns.append((data[byte] >> bit) & 1)
+	return names, columns
+
+def varies(column):
+	# False for a column with one value (non-finite values aside)
+	if not len(column):
+		return False
+	if column.dtype.kind == 'f':
+		with np.errstate(invalid='ignore'):
+			low, high = np.nanmin(column), np.nanmax(column)
+		return bool(low < high)
+	return bool(column.min() < column.max())
+
+def standardize(columns):
+	# The columns as one (packets, columns) float32 matrix, column-major so
+	# every column is contiguous, each at zero mean and unit variance;
+	# non-finite values count as the mean
+	m = np.empty((len(columns[0]) if columns else 0, len(columns)), dtype=np.float32, order='F')
+	for i, column in enumerate(columns):
+		x = m[:, i]
+		x[:] = column
+		finite = np.isfinite(x)
+		allFinite = bool(finite.all())
+		if not allFinite:
+			x[~finite] = 0
+		count = max(int(finite.sum()), 1)
+		x -= np.float32(x.sum(dtype=np.float64) / count)
+		if not allFinite:
+			x[~finite] = 0
+		std = np.sqrt(np.einsum('i,i->', x, x, dtype=np.float64) / count)
+		if std > 0:
+			x /= np.float32(std)
+	return m
+
+def lagged_correlations(u, k, maxLag=MAX_LAG, samples=LAG_SAMPLES):
+	# (lags, array of shape (lags, unknowns, known)) for standardised matrices;
+	# at lag l > 0 unknown[t] is paired with known[t - l]. Away from lag 0,
+	# long captures use every stride-th packet (about `samples` of them),
+	# plenty for the estimate and it keeps the time flat: the matrices are
+	# split by packet index modulo stride once, so every lag is a product of
+	# two contiguous slices.
+	n = len(u)
+	stride = max(1, n // samples)
+	us = [np.asfortranarray(u[r::stride]) for r in range(stride)] if stride > 1 else [u]
+	ks = [np.asfortranarray(k[r::stride]) for r in range(stride)] if stride > 1 else [k]
+	lags = np.arange(-maxLag, maxLag + 1)
+	out = np.zeros((len(lags), u.shape[1], k.shape[1]), dtype=np.float32)
+	for i, lag in enumerate(lags):
+		if lag == 0:
+			if n:
+				out[i] = u.T @ k / n
+			continue
+		if lag > 0:
+			a = us[lag % stride][lag // stride:]
+			b = ks[0]
+		else:
+			a = us[0]
+			b = ks[-lag % stride][-lag // stride:]
+		m = min(len(a), len(b))
+		if m:
+			out[i] = a[:m].T @ b[:m] / m
+	return lags, out
+
+def bit_stats(data, sampleRate=60.0):
+	# Per bit of the flag bytes: fraction of packets set, toggles, toggles per
+	# minute and the mean length of a run of set packets
+	stats = []
+	minutes = max(len(data[FLAG_BYTES[0]]) / sampleRate / 60, 1e-9)
+	for byte in FLAG_BYTES:
+		values = data[byte]
+		for bit in range(8):
+			b = ((values >> bit) & 1).astype(np.int8)
+			ones = int(b.sum())
+			if 0 < ones < len(b):
+				edges = np.diff(b)
+				rises = int((edges == 1).sum())
+				toggles = rises + int((edges == -1).sum())
+				runs = rises + int(b[0] == 1)
+			else:
+				toggles = 0
+				runs = int(ones > 0)
+			stats.append({
+				'series': f'{byte}.{bit}',
+				'set': ones / len(b) if len(b) else 0.0,
+				'toggles': toggles,
+				'togglesPerMinute': toggles / minutes,
+				'meanRun': ones / runs if runs else 0.0,
+			})
+	return stats
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def explore(data, maxLag=MAX_LAG):
+	# The report: one entry per unknown series, ranked by the strongest
+	# correlation found at any lag
+	# contiguous copies of the columns, rather than strided views into the records
+	data = {name: np.ascontiguousarray(data[name]) for name in UNKNOWN_FLOATS + FLAG_BYTES + KNOWN}
+	names, columns = unknown_series(data)
+	known = [data[name] for name in KNOWN]
+	# constant series correlate with nothing: only the others are standardised
+	# and multiplied
+	varying = np.array([varies(c) for c in columns])
+	knownVarying = np.array([varies(c) for c in known])
+	u = standardize([c for c, v in zip(columns, varying) if v])
+	k = standardize([c for c, v in zip(known, knownVarying) if v])
+	lags, part = lagged_correlations(u, k, maxLag)
+	corr = np.zeros((len(lags), len(columns), len(known)), dtype=np.float32)
+	corr[np.ix_(np.arange(len(lags)), np.flatnonzero(varying), np.flatnonzero(knownVarying))] = part
+	zero = corr[maxLag]
+
+	bits = {s['series']: s for s in bit_stats(data)}
+	entries = []
+	for i, name in enumerate(names):
+		entry = {'series': name, 'constant': not varying[i]}
+		if name in bits:
+			entry.update(bits[name])
+		if varying[i] and knownVarying.any():
+			j = int(np.argmax(np.abs(zero[i])))
+			entry['known'] = KNOWN[j]
+			entry['r'] = float(zero[i, j])
+			best = np.abs(corr[:, i, :])
+			l, j = np.unravel_index(int(np.argmax(best)), best.shape)
+			entry['lagKnown'] = KNOWN[j]
+			entry['lag'] = int(lags[l])
+			entry['lagR'] = float(corr[l, i, j])
+			entry['score'] = abs(entry['lagR'])
+		else:
+			entry['score'] = 0.0
+		entries.append(entry)
+	entries.sort(key=lambda e: -e['score'])
+	return {
+		'packets': len(data['speed']),
+		'maxLag': maxLag,
+		'known': [name for name, v in zip(KNOWN, knownVarying) if v],
+		'series': entries,
+	}
+
+def print_report(report, out=sys.stdout):
+	print(f'{report["packets"]} packets, lags up to ±{report["maxLag"]} packets, known channels: {", ".join(report["known"])}', file=out)
+	print(file=out)
+	print('{:<15} {:<11} {:>7} {:<11} {:>7} {:>5} {:>7} {:>9}'.format('series', 'best at 0', 'r', 'best lag', 'r', 'lag', 'set', 'toggle/m'), file=out)
+	constant = []
+	for e in report['series']:
+		if e['constant']:
+			constant.append(e['series'])
+			continue
+		bits = '{:>7.1%} {:>9.1f}'.format(e['set'], e['togglesPerMinute']) if 'set' in e else ''
+		if 'known' in e:
+			print('{:<15} {:<11} {:>+7.3f} {:<11} {:>+7.3f} {:>5} {}'.format(e['series'], e['known'], e['r'], e['lagKnown'], e['lagR'], e['lag'], bits), file=out)
+		else:
+			print('{:<15} {:<11} {:>7} {:<11} {:>7} {:>5} {}'.format(e['series'], '–', '', '–', '', '', bits), file=out)
+	if constant:
+		print(file=out)
+		print('constant: ' + ', '.join(constant), file=out)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Rank the unknown packet fields by how they correlate with known channels')
+	parser.add_argument('capture', help='capture file recorded with --record')
+	parser.add_argument('--max-lag', type=int, default=MAX_LAG, help=f'largest lag in packets, either way (default {MAX_LAG})')
+	parser.add_argument('--workers', type=int, help='decoding processes (default one per core)')
+	parser.add_argument('--source', help='only packets from this console ip')
+	parser.add_argument('--json', metavar='FILE', help='also write the report as JSON')
+	args = parser.parse_args()
+
+	# the correlations are over the packets of one car
+	with CaptureReader(args.capture) as reader:
+		try:
+			source = single_source(records(reader), args.source)
+		except BatchError as e:
+			sys.exit(str(e))
+	start = time.perf_counter()
+	data = decode_parallel(args.capture, UNKNOWN_FLOATS + FLAG_BYTES + KNOWN, args.workers, source=source)
+	decoded = time.perf_counter()
+	report = explore(data, args.max_lag)
+	print_report(report)
+	print(f'\ndecoded in {decoded - start:.1f} s, analysed in {time.perf_counter() - decoded:.1f} s', file=sys.stderr)
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(report, f, indent=1)
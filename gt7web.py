@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import socket
+import struct
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+from gt7packet import FIELDS
+from gt7receiver import TelemetryReceiver
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Live dashboard for any number of browsers, over HTTP and WebSocket (stdlib
+# only).
+#
+# One receiver subscribes to all consoles and keeps only the newest packet of
+# each; ingest never waits for a viewer. Every viewer runs its own loop at its
+# own rate (capped by the server) and sends only the channels whose value
+# changed since the last frame that viewer was sent. A viewer that does not
+# keep up gets frames skipped while its socket buffer is above SOFT_LIMIT,
+# which is safe as the next frame is relative to what it last got, and is
+# disconnected when it stays behind for DROP_AFTER seconds.
+#
+#   GET /                 the dashboard page
+#   GET /consoles         JSON: the consoles and their packet rate and loss
+#   GET /ws?console=IP&channels=a,b&rate=N
+#                         WebSocket; the first message is {"console", "channels",
+#                         "rate"}, then {"id": packet id, "c": {channel: value}}
+#                         per frame. Sending {"channels": [...]} or {"rate": N}
+#                         changes the subscription.
+
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+DEFAULT_PORT = 8077
+MAX_RATE = 30				# frames per second per viewer
+SOFT_LIMIT = 64 << 10		# bytes queued to a viewer above which frames are skipped
+DROP_AFTER = 5.0			# seconds a viewer may stay above SOFT_LIMIT
+PRECISION = 4				# decimals sent, also what counts as a change
+
+DEFAULT_CHANNELS = ['packet_id', 'current_lap', 'total_laps', 'car_speed', 'rpm', 'current_gear', 'suggested_gear', 'throttle', 'brake', 'fuel_level', 'fuel_capacity', 'water_temp', 'oil_temp', 'oil_pressure', 'tyre_temp_fl', 'tyre_temp_fr', 'tyre_temp_rl', 'tyre_temp_rr', 'boost', 'last_lap', 'best_lap', 'position', 'total_positions']
+
+# channels can also be TelemetryPacket properties
+PROPERTIES = ['car_speed', 'current_gear', 'suggested_gear', 'boost']
+
+PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>GT7 telemetry</title>
+<style>body{font-family:monospace;background:#111;color:#ddd}td{padding:0 1em}td.v{text-align:right;min-width:8em}#s{color:#888}</style>
+</head><body>
+<div id="s">connecting</div><table id="t"></table>
+<script>
+const q = new URLSearchParams(location.search);
+const ws = new WebSocket((location.protocol == 'https:' ? 'wss://' : 'ws://') + location.host + '/ws?' + q.toString());
+const cells = {}; let frames = 0, bytes = 0, id = 0;
+ws.onmessage = (e) => {
+	const m = JSON.parse(e.data); bytes += e.data.length;
+	if (m.channels) {
+		const t = document.getElementById('t'); t.innerHTML = '';
+		for (const c of m.channels) { const r = t.insertRow(); r.insertCell().textContent = c; cells[c] = r.insertCell(); cells[c].className = 'v'; }
+		document.title = 'GT7 ' + m.console; return;
+	}
+	frames++; id = m.id;
+	for (const c in m.c) cells[c].textContent = m.c[c] === null ? '–' : m.c[c];
+};
+ws.onclose = () => { document.getElementById('s').textContent = 'disconnected'; };
+setInterval(() => { document.getElementById('s').textContent = `packet ${id}  ${frames} frames/s  ${bytes} B/s`; frames = bytes = 0; }, 1000);
+</script></body></html>
+'''
+
+class WebSocketError(Exception):
+	pass
+
+def accept_key(key):
+	return base64.b64encode(hashlib.sha1(key.encode() + WS_GUID).digest()).decode()
+
+def ws_frame(payload, opcode=0x1):
+	# One unmasked frame, as a server sends them
+	n = len(payload)
+	if n < 126:
+		header = struct.pack('!BB', 0x80 | opcode, n)
+	elif n < 1 << 16:
+		header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+	else:
+		header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+	return header + payload
+
+def unmask(mask, payload):
+	# XOR with the 4 byte mask, as one big integer
+	n = len(payload)
+	key = (mask * (n // 4 + 1))[:n]
+	return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+async def read_frame(reader):
+	# Returns (opcode, payload) of the next frame; client frames are masked
+	b0, b1 = await reader.readexactly(2)
+	n = b1 & 0x7F
+	if n == 126:
+		n = struct.unpack('!H', await reader.readexactly(2))[0]
+	elif n == 127:
+		n = struct.unpack('!Q', await reader.readexactly(8))[0]
+	if n > 1 << 16:
+		raise WebSocketError('frame too large')
+	mask = await reader.readexactly(4) if b1 & 0x80 else None
+	payload = await reader.readexactly(n)
+	if mask is not None:
+		payload = unmask(mask, payload)
+	return b0 & 0x0F, payload
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class Viewer:
+	# One browser: its subscription, what it was last sent and its counters
+	def __init__(self, writer, console, channels, rate):
+		self.writer = writer
+		self.console = console
+		self.channels = channels
+		self.rate = rate
+		self.sent = {}				# channel -> value as last sent
+		self.lastId = None
+		self.behindSince = None
+		self.frames = 0
+		self.skipped = 0
+		self.bytesSent = 0
+
+	def subscribe(self, channels=None, rate=None):
+		if channels is not None:
+			self.channels = channels
+			self.sent = {}
+		if rate is not None:
+			self.rate = rate
+		self.send({'console': self.console, 'channels': self.channels, 'rate': self.rate})
+
+	def send(self, message, opcode=0x1):
+		data = ws_frame(json.dumps(message, separators=(',', ':')).encode() if opcode == 0x1 else message, opcode)
+		self.writer.write(data)
+		self.bytesSent += len(data)
+
+	def backlog(self):
+		return self.writer.transport.get_write_buffer_size()
+
+	def frame(self, packet):
+		# The channels that changed since the last frame (empty when none did)
+		changed = {}
+		sent = self.sent
+		for name in self.channels:
+			value = getattr(packet, name)
+			if isinstance(value, float):
+				value = round(value, PRECISION) if math.isfinite(value) else None
+			if name not in sent or sent[name] != value:
+				sent[name] = value
+				changed[name] = value
+		return changed
+
+class DashboardServer:
+	def __init__(self, ips, maxRate=MAX_RATE):
+		self.maxRate = maxRate
+		self.latest = {}			# console ip -> newest TelemetryPacket
+		self.viewers = set()
+		self.dropped = 0
+		self.receiver = TelemetryReceiver(ips, self.on_packet)
+		self.server = None
+
+	def on_packet(self, packet, ts, console):
+		self.latest[console.ip] = packet
+
+	async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+		await self.receiver.start()
+		self.server = await asyncio.start_server(self.handle, host, port)
+		return self
+
+	def close(self):
+		self.receiver.close()
+		if self.server is not None:
+			self.server.close()
+		for viewer in list(self.viewers):
+			viewer.writer.close()
+
+	# ––– HTTP –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+	async def handle(self, reader, writer):
+		try:
+			request = await reader.readuntil(b'\r\n\r\n')
+			lines = request.decode('latin-1').split('\r\n')
+			method, target, version = lines[0].split(' ', 2)
+			headers = {}
+			for line in lines[1:]:
+				if ':' in line:
+					name, value = line.split(':', 1)
+					headers[name.strip().lower()] = value.strip()
+			url = urlsplit(target)
+			if method != 'GET':
+				self.respond(writer, '405 Method Not Allowed', 'text/plain', b'GET only\n')
+			elif url.path == '/':
+				self.respond(writer, '200 OK', 'text/html; charset=utf-8', PAGE.encode())
+			elif url.path == '/consoles':
+				consoles = [{'ip': c.ip, 'packetsPerSecond': round(c.rate(), 1), 'packet': c.pktid, 'lost': c.lost, 'lap': c.lap} for c in self.receiver.consoles.values()]
+				self.respond(writer, '200 OK', 'application/json', json.dumps({'consoles': consoles, 'viewers': len(self.viewers), 'dropped': self.dropped}).encode())
+			elif url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket' and 'sec-websocket-key' in headers:
+				await self.websocket(reader, writer, headers['sec-websocket-key'], parse_qs(url.query))
+				return
+			else:
+				self.respond(writer, '404 Not Found', 'text/plain', b'not found\n')
+			await writer.drain()
+		except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+			pass
+		writer.close()
+
+	def respond(self, writer, status, contentType, body):
+		writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {contentType}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+
+	def parse_channels(self, text):
+		channels = [c for c in text.split(',') if c] if text else DEFAULT_CHANNELS
+		unknown = [c for c in channels if c not in FIELDS and c not in PROPERTIES]
+		if unknown:
+			raise WebSocketError('unknown channels: ' + ', '.join(unknown))
+		return channels
+
+	def parse_rate(self, value):
+		# Frames per second asked for, capped at the server's; 0, negative and
+		# nan would stall or spin the viewer's loop
+		rate = float(value)
+		if not math.isfinite(rate) or rate <= 0:
+			raise WebSocketError(f'rate must be a number above 0, not {value}')
+		return min(rate, self.maxRate)
+
+	# ––– WebSocket ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+	async def websocket(self, reader, writer, key, query):
+		consoles = list(self.receiver.consoles)
+		console = query.get('console', consoles[:1])[0]
+		try:
+			if console not in self.receiver.consoles:
+				raise WebSocketError(f'unknown console {console}')
+			channels = self.parse_channels(query.get('channels', [''])[0])
+			rate = self.parse_rate(query.get('rate', [self.maxRate])[0])
+		except (WebSocketError, ValueError) as e:
+			self.respond(writer, '400 Bad Request', 'text/plain', f'{e}\n'.encode())
+			await writer.drain()
+			writer.close()
+			return
+
+		# a small kernel send buffer, so a viewer that stops reading shows up
+		# in the backlog soon
+		sock = writer.get_extra_info('socket')
+		if sock is not None:
+			sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOFT_LIMIT)
+		writer.write(f'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: {accept_key(key)}\r\n\r\n'.encode())
+		viewer = Viewer(writer, console, channels, rate)
+		viewer.subscribe()
+		self.viewers.add(viewer)
+		sender = asyncio.create_task(self.send_frames(viewer))
+		try:
+			while not sender.done():
+				opcode, payload = await read_frame(reader)
+				if opcode == 0x8:
+					viewer.send(payload[:2], 0x8)
+					break
+				elif opcode == 0x9:
+					viewer.send(payload, 0xA)
+				elif opcode == 0x1:
+					# subscription changes
+					try:
+						message = json.loads(payload)
+						channels = self.parse_channels(','.join(message['channels'])) if 'channels' in message else None
+						rate = self.parse_rate(message['rate']) if 'rate' in message else None
+						viewer.subscribe(channels, rate)
+					except (WebSocketError, ValueError, TypeError, KeyError) as e:
+						viewer.send({'error': str(e)})
+		except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError, WebSocketError):
+			# gone, broken, or the server shutting down
+			pass
+		finally:
+			sender.cancel()
+			self.viewers.discard(viewer)
+			writer.close()
+
+	async def send_frames(self, viewer):
+		# The viewer's own loop: never blocks on the socket, skips frames while
+		# the viewer is behind and disconnects it when it stays behind
+		while True:
+			await asyncio.sleep(1 / viewer.rate)
+			packet = self.latest.get(viewer.console)
+			if packet is None or packet.packet_id == viewer.lastId:
+				continue
+			if viewer.backlog() > SOFT_LIMIT:
+				now = time.monotonic()
+				if viewer.behindSince is None:
+					viewer.behindSince = now
+				elif now - viewer.behindSince > DROP_AFTER:
+					self.dropped += 1
+					viewer.writer.transport.abort()
+					return
+				viewer.skipped += 1
+				continue
+			viewer.behindSince = None
+			viewer.lastId = packet.packet_id
+			changed = viewer.frame(packet)
+			if changed:
+				viewer.send({'id': packet.packet_id, 'c': changed})
+				viewer.frames += 1
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+async def serve(ips, host, port, maxRate):
+	server = await DashboardServer(ips, maxRate).start(host, port)
+	print(f'dashboard on http://{host}:{port}/?console={ips[0]}', file=sys.stderr)
+	try:
+		while True:
+			await asyncio.sleep(10)
+			for viewer in server.viewers:
+				print(f'{viewer.console:<15} {viewer.rate:>5.0f}/s {viewer.frames:>8} frames {viewer.skipped:>6} skipped {viewer.bytesSent:>10} bytes', file=sys.stderr)
+	finally:
+		server.close()
+
+async def watch(host, port, console, channels, rate, delay, seconds):
+	# A WebSocket client for testing: prints frames and bytes per second;
+	# delay stalls between reads to play a slow viewer
+	reader, writer = await asyncio.open_connection(host, port)
+	query = f'console={console}&rate={rate}' + (f'&channels={channels}' if channels else '')
+	key = base64.b64encode(os.urandom(16)).decode()
+	writer.write(f'GET /ws?{query} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'.encode())
+	response = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+	if ' 101 ' not in response.split('\r\n')[0] or accept_key(key) not in response:
+		raise WebSocketError(response.split('\r\n')[0])
+	start = last = time.monotonic()
+	frames = size = 0
+	try:
+		while time.monotonic() - start < seconds:
+			opcode, payload = await read_frame(reader)
+			if opcode == 0x8:
+				print('closed by the server', file=sys.stderr)
+				break
+			frames += 1
+			size += len(payload)
+			now = time.monotonic()
+			if now - last >= 1:
+				print(f'{frames / (now - last):6.1f} frames/s {size / max(frames, 1):6.0f} bytes/frame  {payload[:80].decode()}', flush=True)
+				frames = size = 0
+				last = now
+			if delay:
+				await asyncio.sleep(delay)
+	except asyncio.IncompleteReadError:
+		print('disconnected by the server', file=sys.stderr)
+	writer.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Serve a live dashboard to any number of browsers over WebSocket')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('serve', help='listen to consoles and serve the dashboard')
+	p.add_argument('ips', nargs='+', help='playstation ip addresses')
+	p.add_argument('--host', default='127.0.0.1', help='address to serve on (default 127.0.0.1, 0.0.0.0 for the network)')
+	p.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to serve on (default {DEFAULT_PORT})')
+	p.add_argument('--max-rate', type=float, default=MAX_RATE, help=f'most frames per second per viewer (default {MAX_RATE})')
+	p = sub.add_parser('watch', help='connect like a browser and print what arrives')
+	p.add_argument('console', help='console ip to subscribe to')
+	p.add_argument('--host', default='127.0.0.1', help='dashboard address (default 127.0.0.1)')
+	p.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'dashboard port (default {DEFAULT_PORT})')
+	p.add_argument('--channels', help='comma separated channels (default the dashboard set)')
+	p.add_argument('--rate', type=float, default=MAX_RATE, help='frames per second to ask for')
+	p.add_argument('--delay', type=float, default=0, help='seconds to stall after each frame, to play a slow viewer')
+	p.add_argument('--seconds', type=float, default=10, help='how long to watch (default 10)')
+	args = parser.parse_args()
+	if args.command == 'serve' and not (math.isfinite(args.max_rate) and args.max_rate > 0):
+		parser.error('--max-rate must be above 0')
+	if args.command == 'watch' and not (math.isfinite(args.rate) and args.rate > 0):
+		parser.error('--rate must be above 0')
+
+	try:
+		if args.command == 'serve':
+			asyncio.run(serve(args.ips, args.host, args.port, args.max_rate))
+		else:
+			asyncio.run(watch(args.host, args.port, args.console, args.channels, args.rate, args.delay, args.seconds))
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gt7capture import CaptureWriter, ip_to_int
+from gt7synth import SyntheticCar
+
+CONSOLE_A = '192.168.1.10'
+CONSOLE_B = '192.168.1.11'
+PACKETS = 3000		# a bit over two laps of the short synthetic track
+
+def write_capture(filename, cars):
+	# One datagram of each (ip, car) per tick, plus what a real network adds:
+	# repeats, packets out of order and the odd foreign datagram
+	writer = CaptureWriter(filename)
+	ts = 1_000_000_000
+	for tick in range(PACKETS):
+		ts += 16_666_667
+		for n, (ip, car) in enumerate(cars):
+			source = ip_to_int(ip)
+			data = car.datagram()
+			if tick % 211 == 5:
+				# swapped with the next one
+				later = car.datagram()
+				writer.write(later, ts=ts + n, source=source)
+				writer.write(data, ts=ts + n, source=source)
+				continue
+			writer.write(data, ts=ts + n, source=source)
+			if tick % 97 == 3:
+				writer.write(data, ts=ts + n, source=source)
+			if tick % 500 == 7:
+				writer.write(b'not telemetry', ts=ts + n, source=source)
+	writer.close()
+	return filename
+
+@pytest.fixture(scope='session')
+def capture(tmp_path_factory):
+	# One console
+	return write_capture(str(tmp_path_factory.mktemp('capture') / 'one.gt7'), [(CONSOLE_A, SyntheticCar(seed=1, length=800.0))])
+
+@pytest.fixture(scope='session')
+def two_consoles(tmp_path_factory):
+	# Two consoles whose packet ids overlap
+	cars = [(CONSOLE_A, SyntheticCar(seed=1, length=800.0)), (CONSOLE_B, SyntheticCar(seed=2, length=900.0, packetId=500))]
+	return write_capture(str(tmp_path_factory.mktemp('capture') / 'two.gt7'), cars)
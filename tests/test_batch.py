@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from conftest import CONSOLE_A, CONSOLE_B, PACKETS
+from gt7batch import PACKET_DTYPE, BatchError, car_speed, current_gear, decode_capture, records, single_source, slip_ratios
+from gt7capture import CaptureReader, ip_to_int
+from gt7packet import decode, peek_header, salsa20_dec
+
+CHANNELS = [name for name in PACKET_DTYPE.names if name != 'magic']
+
+def per_packet(reader, source=None):
+	# What the receiver delivers: (ts, source, TelemetryPacket) of every packet
+	# newer than the newest so far from its console
+	newest = {}
+	rows = []
+	for ts, address, data in reader:
+		if source is not None and address != source:
+			continue
+		header = peek_header(data)
+		if header is None or header[0] <= newest.get(address, -1):
+			continue
+		newest[address] = header[0]
+		rows.append((ts, ip_to_int(address), decode(salsa20_dec(bytes(data), header[1]))))
+	return rows
+
+def assert_same(data, rows):
+	assert len(data) == len(rows)
+	assert data['ts'].tolist() == [ts for ts, source, p in rows]
+	assert data['source'].tolist() == [source for ts, source, p in rows]
+	for name in CHANNELS:
+		expected = np.array([getattr(p, name) for ts, source, p in rows], dtype=data.dtype.fields[name][0])
+		assert np.array_equal(data[name], expected, equal_nan=data[name].dtype.kind == 'f'), name
+
+@pytest.mark.parametrize('chunk', [8192, 100])
+def test_batch_matches_per_packet(capture, chunk):
+	with CaptureReader(capture) as reader:
+		data = decode_capture(reader, CHANNELS, chunk=chunk)
+		assert_same(data, per_packet(reader))
+	assert len(data) == PACKETS
+
+def test_stale_filter_carries_across_chunks(capture):
+	with CaptureReader(capture) as reader:
+		ids = decode_capture(reader, ['packet_id'], chunk=7)['packet_id']
+	assert (np.diff(ids.astype(np.int64)) > 0).all()
+
+def test_fewer_channels(capture):
+	with CaptureReader(capture) as reader:
+		data = decode_capture(reader, ['rpm', 'current_lap'])
+		full = decode_capture(reader, CHANNELS)
+	assert data.dtype.names == ('ts', 'source', 'rpm', 'current_lap')
+	assert np.array_equal(data['rpm'], full['rpm'])
+
+def test_derived_channels(capture):
+	with CaptureReader(capture) as reader:
+		data = decode_capture(reader, CHANNELS)
+		rows = per_packet(reader)
+	assert np.allclose(car_speed(data), [p.car_speed for ts, source, p in rows])
+	assert current_gear(data).tolist() == [p.current_gear for ts, source, p in rows]
+	moving = [n for n, (ts, source, p) in enumerate(rows) if p.slip_ratios is not None]
+	assert np.allclose(slip_ratios(data)[moving], [rows[n][2].slip_ratios for n in moving])
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Captures with several consoles
+
+def test_two_consoles_keep_both(two_consoles):
+	with CaptureReader(two_consoles) as reader:
+		data = decode_capture(reader, CHANNELS, chunk=300)
+		assert_same(data, per_packet(reader))
+	for ip in (CONSOLE_A, CONSOLE_B):
+		assert np.count_nonzero(data['source'] == ip_to_int(ip)) == PACKETS
+
+def test_pick_a_console(two_consoles):
+	with CaptureReader(two_consoles) as reader:
+		data = decode_capture(reader, CHANNELS, source=CONSOLE_B)
+		assert_same(data, per_packet(reader, CONSOLE_B))
+
+def test_single_source(capture, two_consoles):
+	with CaptureReader(capture) as reader:
+		assert single_source(records(reader)) is None
+	with CaptureReader(two_consoles) as reader:
+		rec = records(reader)
+		assert single_source(rec, CONSOLE_A) == CONSOLE_A
+		with pytest.raises(BatchError, match='--source'):
+			single_source(rec)
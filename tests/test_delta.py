@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+
+from gt7delta import PAUSED, TICK, DeltaEngine
+
+LENGTH = 600.0		# m, a straight "lap" along x
+
+class Driver:
+	# Packets of a car going round a LENGTH m lap, one per tick
+	def __init__(self):
+		self.packetId = 100
+		self.x = 0.0
+
+	def packet(self, lap, speed=0.0, flags=0):
+		self.packetId += 1
+		return SimpleNamespace(packet_id=self.packetId, current_lap=lap, pos_x=self.x, pos_y=0.0, pos_z=0.0, flags=flags, speed=speed)
+
+	def lap(self, engine, lap, speed):
+		# speed in m/s; the first packet of a lap is at its start
+		self.x = 0.0
+		while self.x < LENGTH:
+			engine.update(self.packet(lap, speed))
+			self.x += speed * TICK
+
+def test_best_lap_becomes_the_reference():
+	engine = DeltaEngine()
+	car = Driver()
+	car.lap(engine, 1, 50.0)		# joined mid lap: no known start
+	car.lap(engine, 2, 40.0)
+	assert engine.bestTicks is None
+	car.lap(engine, 3, 50.0)
+	assert engine.bestLap == 2
+	assert engine.bestTicks * TICK == pytest.approx(LENGTH / 40.0, abs=2 * TICK)
+	car.lap(engine, 4, 45.0)
+	assert engine.bestLap == 3
+	car.lap(engine, 5, 45.0)
+	# slower than lap 3: still the reference
+	assert engine.bestLap == 3
+
+def test_delta_to_the_reference():
+	engine = DeltaEngine()
+	car = Driver()
+	car.lap(engine, 1, 50.0)
+	car.lap(engine, 2, 50.0)
+	# same pace: no delta; half the pace: behind by the time lost so far
+	car.x = 0.0
+	for n in range(300):
+		engine.update(car.packet(3, 50.0))
+		car.x += 50.0 * TICK
+		assert engine.delta == pytest.approx(0.0, abs=2 * TICK)
+	start = car.x
+	for n in range(120):
+		engine.update(car.packet(3, 25.0))
+		car.x += 25.0 * TICK
+	covered = car.x - 25.0 * TICK - start
+	assert engine.delta == pytest.approx(covered / 25.0 - covered / 50.0, abs=2 * TICK)
+
+def test_no_reference_no_delta():
+	engine = DeltaEngine()
+	car = Driver()
+	car.lap(engine, 1, 50.0)
+	assert engine.delta is None
+	engine.update(car.packet(2, 50.0))
+	assert engine.delta is None
+
+def test_paused_and_dropped_packets():
+	engine = DeltaEngine()
+	car = Driver()
+	engine.update(car.packet(1))
+	engine.update(car.packet(2))
+	for n in range(10):
+		engine.update(car.packet(2, flags=PAUSED))
+	assert engine.lapTicks == 1
+	car.packetId += 4		# lost on the way
+	engine.update(car.packet(2))
+	assert engine.lapTicks == 6
+
+def test_jumps_use_the_speed():
+	engine = DeltaEngine()
+	car = Driver()
+	engine.update(car.packet(1, 30.0))
+	car.x = 5000.0		# a reset to the pits
+	engine.update(car.packet(1, 30.0))
+	assert engine.distance == pytest.approx(30.0 * TICK)
+
+def test_restart_is_not_a_reference():
+	engine = DeltaEngine()
+	car = Driver()
+	car.lap(engine, 1, 50.0)
+	car.lap(engine, 2, 50.0)
+	car.lap(engine, 1, 60.0)		# restarted the race during lap 2
+	assert engine.bestTicks is None
+	car.lap(engine, 2, 60.0)
+	car.lap(engine, 3, 60.0)
+	assert engine.bestLap == 2
+	assert engine.bestTicks == 600
+
+def test_lap_longer_than_the_tables():
+	engine = DeltaEngine(capacity=100)
+	car = Driver()
+	car.lap(engine, 1, 50.0)
+	car.lap(engine, 2, 50.0)		# 720 ticks
+	car.lap(engine, 3, 50.0)
+	assert engine.bestTicks is None
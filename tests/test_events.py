@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import CONSOLE_B
+from gt7batch import decode_capture
+from gt7capture import CaptureReader
+from gt7events import CHANNELS, EVENT_DTYPE, GEAR, KINDS, LIMITER, Debouncer, EventEngine, EventLog, GearDetector, detect_batch, detect_stream, read_log
+
+def test_stream_matches_batch(capture):
+	with CaptureReader(capture) as reader:
+		events = detect_batch(decode_capture(reader, CHANNELS))
+		streamed = detect_stream(reader)
+	assert len(events)
+	assert len(streamed) == len(events)
+	assert (streamed == events).all()
+
+def test_one_console_of_two(two_consoles):
+	with CaptureReader(two_consoles) as reader:
+		events = detect_batch(decode_capture(reader, CHANNELS, source=CONSOLE_B))
+		streamed = detect_stream(reader, CONSOLE_B)
+	assert len(events)
+	assert np.array_equal(streamed, events)
+
+def test_lockup_and_limiter():
+	# conditions the synthetic car never gets into
+	engine = EventEngine(onTicks=2, offTicks=2)
+	def packet(n, brake=0, throttle=0, front=100.0, rpm=7000.0):
+		return SimpleNamespace(packet_id=n, car_speed=100.0, tyre_speeds=(front, front, 100.0, 100.0), brake=brake, throttle=throttle, rev_limiter=8000.0, rpm=rpm, current_gear=3)
+	feed = [packet(1, throttle=255), packet(2, brake=255, front=50.0), packet(3, brake=255, front=20.0), packet(4, brake=255, front=60.0),
+		packet(5, throttle=255, rpm=8000.0), packet(6, throttle=255, rpm=8100.0), packet(7, throttle=255), packet(8, throttle=255)]
+	events = [e for n, p in enumerate(feed) for e in engine.update(p, n)]
+	events = np.array(events + engine.finish(), dtype=EVENT_DTYPE)
+	assert [(KINDS[e['kind']], int(e['wheel']), int(e['start_id']), int(e['end_id'])) for e in events] == [
+		('lockup', 0, 2, 4), ('lockup', 1, 2, 4), ('limiter', -1, 5, 6)]
+	assert events['value'][0] == pytest.approx(0.2)
+	assert events['value'][2] == 8100.0
+
+def test_debounce():
+	# on after onTicks packets in a row (from the first), off after offTicks
+	# packets without (at the last one it held)
+	d = Debouncer(LIMITER, -1, onTicks=3, offTicks=2, highest=True)
+	held = [1, 1, 0, 1, 1, 1, 0, 1, 0, 0, 1]
+	ended = [d.update(bool(h), float(n), n, n * 10) for n, h in enumerate(held)]
+	assert [e for e in ended if e is not None] == [(LIMITER, -1, -1, -1, 3, 7, 30, 70, 7.0)]
+	assert ended[9] is not None
+	assert d.finish() is None
+
+def test_gear_changes():
+	g = GearDetector(gearTicks=2)
+	gears = [1, 1, 2, 1, 2, 2, 2, 3, 3]
+	changes = [e for e in (g.update(gear, n, n) for n, gear in enumerate(gears)) if e is not None]
+	# the short visit to 2 does not count
+	assert changes == [(GEAR, -1, 1, 2, 4, 4, 4, 4, 0.0), (GEAR, -1, 2, 3, 7, 7, 7, 7, 0.0)]
+
+def test_log_round_trip(capture, tmp_path):
+	with CaptureReader(capture) as reader:
+		events = detect_batch(decode_capture(reader, CHANNELS))
+	filename = str(tmp_path / 'events.log')
+	for part in (events[:5], events[5:]):
+		log = EventLog(filename)
+		log.write(part)
+		log.close()
+	assert np.array_equal(read_log(filename), events)
+	with open(filename, 'r+b') as f:
+		f.write(b'GT7X')
+	with pytest.raises(ValueError):
+		read_log(filename)
@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+import math
+import os
+import socket
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from gt7export import ExportError, Exporter, open_output, read_binary
+from gt7packet import OFFSETS, FieldSelection, salsa20_dec
+from gt7synth import SyntheticCar
+
+NAMES = ['rpm', 'packet_id', 'speed', 'current_lap', 'gears', 'pos_x']
+
+@pytest.fixture(scope='module')
+def packets():
+	# decrypted packets of the synthetic car, the last with a nan and an inf
+	car = SyntheticCar(seed=4)
+	plain = [bytearray(salsa20_dec(car.datagram())) for i in range(500)]
+	struct.pack_into('<f', plain[-1], OFFSETS['speed'][0], math.nan)
+	struct.pack_into('<f', plain[-1], OFFSETS['pos_x'][0], -math.inf)
+	return [bytes(ddata) for ddata in plain]
+
+def export(packets, fmt, names=NAMES, blockSize=256):
+	selection = FieldSelection(names)
+	out = io.BytesIO()
+	exporter = Exporter(out, selection, fmt, blockSize)
+	exporter.write_header()
+	for ddata in packets:
+		exporter.write(ddata[:selection.end])
+	exporter.flush()
+	assert exporter.records == len(packets)
+	return selection, out.getvalue()
+
+def expected(selection, packets):
+	return [selection.struct.unpack_from(ddata) for ddata in packets]
+
+def same(a, b):
+	return all(x == y or (isinstance(x, float) and math.isnan(x) and math.isnan(y)) for x, y in zip(a, b))
+
+def test_packet_order(packets):
+	# fields come out in packet order, whatever order they were asked for
+	selection, data = export(packets[:1], 'csv')
+	assert data.split(b'\n')[0].decode().split(',') == sorted(NAMES, key=lambda name: OFFSETS[name][0])
+
+def test_binary(packets):
+	selection, data = export(packets, 'binary')
+	names, records = read_binary(io.BytesIO(data))
+	assert names == selection.names
+	rows = list(records)
+	assert len(rows) == len(packets)
+	assert all(same(r, e) for r, e in zip(rows, expected(selection, packets)))
+
+def test_csv(packets):
+	selection, data = export(packets, 'csv')
+	rows = list(csv.reader(io.StringIO(data.decode())))
+	assert rows[0] == selection.names
+	assert len(rows) == len(packets) + 1
+	codes = [code for offset, code, name in selection.layout]
+	for row, e in zip(rows[1:], expected(selection, packets)):
+		# 9 digits give back the float32 exactly
+		values = [float(np.float32(v)) if code == 'f' else int(v) for v, code in zip(row, codes)]
+		assert same(values, e)
+
+def test_jsonl(packets):
+	selection, data = export(packets, 'jsonl')
+	lines = data.decode().splitlines()
+	assert len(lines) == len(packets)
+	for line, e in zip(lines[:-1], expected(selection, packets)):
+		record = json.loads(line)
+		assert list(record) == selection.names
+		assert [float(np.float32(v)) if isinstance(v, float) else v for v in record.values()] == list(e)
+	# JSON has no nan or inf
+	last = json.loads(lines[-1])
+	assert last['speed'] is None and last['pos_x'] is None
+	assert last['rpm'] == dict(zip(selection.names, expected(selection, packets)[-1]))['rpm']
+
+def test_not_an_export():
+	with pytest.raises(ExportError):
+		Exporter(io.BytesIO(), FieldSelection(['rpm']), 'xml')
+	with pytest.raises(ExportError):
+		read_binary(io.BytesIO(b'GT7E\x01\x00\x00\x00'))
+	with pytest.raises(ExportError):
+		read_binary(io.BytesIO(b'GT'))
+
+def test_unix_socket(packets, tmp_path):
+	path = str(tmp_path / 'gt7.sock')
+	server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	server.bind(path)
+	server.listen(1)
+	received = []
+
+	def accept():
+		conn, address = server.accept()
+		with conn:
+			while True:
+				chunk = conn.recv(65536)
+				if not chunk:
+					break
+				received.append(chunk)
+
+	thread = threading.Thread(target=accept)
+	thread.start()
+	selection = FieldSelection(['packet_id'])
+	exporter = Exporter(open_output('unix:' + path), selection, 'binary')
+	exporter.write_header()
+	for ddata in packets:
+		exporter.write(ddata)
+	exporter.close()
+	thread.join(10)
+	server.close()
+	names, records = read_binary(io.BytesIO(b''.join(received)))
+	assert [r[0] for r in records] == [e[0] for e in expected(selection, packets)]
+	assert os.path.exists(path)
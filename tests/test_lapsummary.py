@@ -0,0 +1,77 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import CONSOLE_B
+from gt7batch import decode_capture, output_dtype
+from gt7capture import CaptureReader
+from gt7lapsummary import CHANNELS, FULL_THROTTLE, PAUSED, SUMMARY_DTYPE, FuelProjection, LapSummarizer, same_summaries, summarize_batch, summarize_stream
+from gt7session import Session, write_session
+
+def test_stream_matches_batch(capture):
+	with CaptureReader(capture) as reader:
+		summaries = summarize_batch(decode_capture(reader, CHANNELS))
+		streamed = summarize_stream(reader)
+	assert len(summaries) >= 2
+	assert summaries['complete'][0]
+	assert same_summaries(streamed, summaries)
+
+def test_one_console_of_two(two_consoles):
+	with CaptureReader(two_consoles) as reader:
+		summaries = summarize_batch(decode_capture(reader, CHANNELS, source=CONSOLE_B))
+		streamed = summarize_stream(reader, source=CONSOLE_B)
+	assert len(summaries) >= 2
+	assert same_summaries(streamed, summaries)
+
+def test_empty():
+	assert len(summarize_batch(np.zeros(0, dtype=output_dtype(CHANNELS)))) == 0
+
+def test_figures_per_lap(capture):
+	with CaptureReader(capture) as reader:
+		data = decode_capture(reader, CHANNELS)
+	summaries = summarize_batch(data)
+	lap = data['current_lap']
+	for n, s in enumerate(summaries[:-1]):
+		rows = data[lap == s['lap']]
+		after = data[np.flatnonzero(lap == s['lap'])[-1] + 1]
+		assert s['complete']
+		assert s['fuel_start'] == rows['fuel_level'][0]
+		assert s['fuel_end'] == after['fuel_level']
+		assert s['lap_time'] == after['last_lap']
+		assert s['tyre_max_fl'] == rows['tyre_temp_fl'].max()
+		assert s['top_speed'] == pytest.approx(3.6 * rows['speed'].max())
+	assert not summaries['complete'][-1]
+
+def test_session_matches_capture(capture, tmp_path):
+	directory = str(tmp_path / 'session')
+	write_session(capture, directory, CHANNELS, track=7)
+	with CaptureReader(capture) as reader:
+		summaries = summarize_batch(decode_capture(reader, CHANNELS))
+	with Session(directory) as session:
+		assert same_summaries(summarize_batch(session.read(CHANNELS), session.laps), summaries)
+
+def test_fuel_projection():
+	projection = FuelProjection(window=2)
+	assert math.isnan(projection.update(False, 2.0, 50.0))
+	assert projection.update(True, 2.0, 48.0) == 24.0
+	assert projection.update(True, 4.0, 44.0) == pytest.approx(44.0 / 3.0)
+	# refuelled: not a lap to average over
+	assert projection.update(True, -30.0, 74.0) == pytest.approx(74.0 / 3.0)
+	# only the last two laps count
+	assert projection.update(True, 4.0, 70.0) == pytest.approx(70.0 / 4.0)
+
+def test_paused_packets_count_ticks_only():
+	def packet(n, lap, throttle=FULL_THROTTLE, flags=0, temp=80.0):
+		return SimpleNamespace(packet_id=n, current_lap=lap, last_lap=90000, fuel_level=50.0 - n / 100, flags=flags, car_speed=100.0, throttle=throttle,
+			oil_temp=temp, water_temp=temp, tyre_temp_fl=temp, tyre_temp_fr=temp, tyre_temp_rl=temp, tyre_temp_rr=temp)
+	summarizer = LapSummarizer()
+	feed = [packet(1, 1), packet(2, 1), packet(3, 1, flags=PAUSED, temp=200.0), packet(6, 1, throttle=0), packet(7, 2)]
+	summaries = [s for s in (summarizer.update(p) for p in feed) if s is not None]
+	assert len(summaries) == 1
+	s = np.array(summaries, dtype=SUMMARY_DTYPE)[0]
+	assert s['ticks'] == 6 and s['complete'] and s['lap_time'] == 90000
+	assert s['oil_peak'] == 80.0
+	assert s['full_throttle'] == pytest.approx(2 / 60)
+	assert s['fuel_used'] == pytest.approx(0.06)
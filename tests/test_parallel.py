@@ -0,0 +1,32 @@
+import numpy as np
+
+from gt7batch import decode_capture
+from gt7capture import CaptureReader
+from gt7parallel import decode_parallel, shards
+
+def first_arrivals(every):
+	# the first arrival of every (console, packet id), in that order
+	return every[np.unique(every[['source', 'packet_id']], return_index=True)[1]]
+
+def test_shards():
+	assert shards(10, 3) == [(0, 3), (3, 6), (6, 10)]
+	assert shards(2, 4) == [(0, 1), (1, 2)]
+
+def test_parallel_matches_batch(capture):
+	data = decode_parallel(capture, ['packet_id', 'rpm', 'pos_x'], workers=2)
+	with CaptureReader(capture) as reader:
+		expected = first_arrivals(decode_capture(reader, ['packet_id', 'rpm', 'pos_x'], fresh=False))
+	assert np.array_equal(data, expected)
+
+def test_parallel_keeps_repeats(capture):
+	every = decode_parallel(capture, ['packet_id'], workers=2, unique=False)
+	unique = decode_parallel(capture, ['packet_id'], workers=2)
+	assert len(every) > len(unique)
+	assert np.array_equal(np.unique(every['packet_id']), unique['packet_id'])
+
+def test_parallel_keeps_both_consoles(two_consoles):
+	data = decode_parallel(two_consoles, ['packet_id', 'rpm'], workers=2)
+	with CaptureReader(two_consoles) as reader:
+		expected = first_arrivals(decode_capture(reader, ['packet_id', 'rpm'], fresh=False))
+	assert len(np.unique(data['source'])) == 2
+	assert np.array_equal(data[['source', 'packet_id', 'rpm']], expected[['source', 'packet_id', 'rpm']])
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from gt7pipeline import BLOCK, DATAGRAM, DROP_NEWEST, DROP_OLDEST, PACKET, Pipeline, PipelineError, StageQueue
+
+def test_drop_oldest():
+	q = StageQueue(3, DROP_OLDEST)
+	assert [q.put(n) for n in range(5)] == [True, True, True, False, False]
+	assert q.get(10) == [2, 3, 4]
+	assert (q.offered, q.dropped, q.maxDepth) == (5, 2, 3)
+
+def test_drop_newest():
+	q = StageQueue(3, DROP_NEWEST)
+	assert [q.put(n) for n in range(5)] == [True, True, True, False, False]
+	assert q.get(2) == [0, 1]
+	assert q.put(5)
+	assert q.get(10) == [2, 5]
+	assert (q.offered, q.dropped) == (6, 2)
+
+def test_block_waits_for_room():
+	q = StageQueue(2, BLOCK)
+	q.put(0)
+	q.put(1)
+	done = threading.Event()
+
+	def publisher():
+		q.put(2)
+		done.set()
+
+	thread = threading.Thread(target=publisher)
+	thread.start()
+	assert not done.wait(0.2)
+	assert q.get(1) == [0]
+	assert done.wait(5)
+	thread.join()
+	assert q.get(10) == [1, 2]
+	assert (q.offered, q.dropped, q.waits) == (3, 0, 1)
+
+def test_close():
+	q = StageQueue(2, BLOCK)
+	q.put(0)
+	q.put(1)
+	# a blocked publisher is let go, and what is queued is still handed out
+	thread = threading.Thread(target=q.put, args=(2,))
+	thread.start()
+	time.sleep(0.1)
+	q.close()
+	thread.join(5)
+	assert not thread.is_alive()
+	assert not q.put(3)
+	assert sorted(q.get(10)) == [0, 1, 2]
+	assert q.get(10) is None
+
+def test_wake_in_batches():
+	q = StageQueue(100, DROP_OLDEST, wake=10)
+	q.put(0)
+	start = time.monotonic()
+	assert q.get(100, timeout=0.1) == [0]
+	assert time.monotonic() - start >= 0.09
+
+def test_bad_queues():
+	with pytest.raises(PipelineError):
+		StageQueue(10, 'drop-random')
+	with pytest.raises(PipelineError):
+		StageQueue(0)
+	with pytest.raises(PipelineError):
+		Pipeline().add('slow', print, wake=10)
+
+def test_pipeline_routes_and_drains():
+	packets = []
+	datagrams = []
+	flushed = []
+	pipeline = Pipeline()
+	pipeline.add('display', packets.append, PACKET, capacity=8, policy=DROP_OLDEST)
+	pipeline.add('record', datagrams.append, DATAGRAM, capacity=1000, policy=DROP_NEWEST, flush=lambda: flushed.append(len(datagrams)), interval=0.05, wake=32)
+	with pytest.raises(PipelineError):
+		pipeline.add('display', print)
+	assert pipeline.wants(DATAGRAM) and not pipeline.wants('other')
+	pipeline.start()
+	for n in range(100):
+		pipeline.on_packet(n, n, None)
+		pipeline.on_datagram(b'x', '10.0.0.1', n)
+	pipeline.stop()
+	counters = pipeline.counters()
+	assert counters['record']['processed'] == len(datagrams) == 100
+	assert counters['display']['offered'] == 100
+	assert counters['display']['processed'] + counters['display']['dropped'] == 100
+	# the newest packet always gets through to a drop-oldest consumer
+	assert packets[-1][0] == 99
+	assert flushed[-1] == 100
+
+def test_consumer_errors_are_counted():
+	def consume(item):
+		if item % 2:
+			raise ValueError(item)
+
+	pipeline = Pipeline()
+	stage = pipeline.add('odd', consume, 'numbers', capacity=100, policy=BLOCK)
+	pipeline.start()
+	for n in range(10):
+		pipeline.publish('numbers', n)
+	pipeline.stop()
+	assert (stage.processed, stage.errors) == (10, 5)
+	assert isinstance(stage.lastError, ValueError)
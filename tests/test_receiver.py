@@ -0,0 +1,83 @@
+import asyncio
+import os
+import socket
+
+import pytest
+
+from gt7packet import FieldSelection
+from gt7receiver import TelemetryReceiver
+from gt7stats import PipelineStats
+from gt7synth import SyntheticCar
+
+CONSOLE_A = '127.0.0.21'
+CONSOLE_B = '127.0.0.22'
+STRANGER = '127.0.0.23'
+
+def traffic():
+	# (ip, datagram): packets 1, 2, 3 and 5 of one console (4 comes late, 5
+	# twice), something that is not telemetry, a full size datagram with a bad
+	# magic, packet 1 of a second console and a datagram from a stranger
+	car = SyntheticCar(seed=1)
+	a = [car.datagram() for i in range(5)]
+	b = SyntheticCar(seed=2).datagram()
+	return [(CONSOLE_A, a[0]), (CONSOLE_A, a[1]), (CONSOLE_A, a[2]), (CONSOLE_A, a[4]), (CONSOLE_A, a[3]), (CONSOLE_A, a[4]),
+		(CONSOLE_A, b'not telemetry'), (CONSOLE_A, os.urandom(len(a[0]))), (CONSOLE_B, b), (STRANGER, b)]
+
+async def receive(datagrams, **kwargs):
+	# Send all datagrams before the receiver gets to read any, and return it
+	# with what it delivered as (console ip, packet)
+	delivered = []
+	receiver = TelemetryReceiver([CONSOLE_A, CONSOLE_B], lambda packet, ts, console: delivered.append((console.ip, packet)), **kwargs)
+	await receiver.start(bind='127.0.0.1', port=0)
+	port = receiver.sock.getsockname()[1]
+	senders = {}
+	try:
+		for ip, data in datagrams:
+			if ip not in senders:
+				senders[ip] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+				senders[ip].bind((ip, 0))
+			senders[ip].sendto(data, ('127.0.0.1', port))
+		for i in range(50):
+			await asyncio.sleep(0.01)
+			if sum(console.received for console in receiver.consoles.values()) + receiver.unknown == len(datagrams):
+				break
+	finally:
+		receiver.close()
+		for s in senders.values():
+			s.close()
+	return receiver, delivered
+
+def test_counters_without_draining():
+	receiver, delivered = asyncio.run(receive(traffic(), drain=False))
+	a = receiver.consoles[CONSOLE_A]
+	assert [p.packet_id for ip, p in delivered if ip == CONSOLE_A] == [1, 2, 3, 5]
+	assert (a.received, a.delivered, a.skipped) == (8, 4, 0)
+	assert (a.stale, a.outOfOrder, a.lost, a.gaps) == (2, 1, 1, 1)
+	assert (a.foreign, a.magic) == (2, 1)
+	assert a.pktid == 5 and a.lap == delivered[-2][1].current_lap
+	assert receiver.consoles[CONSOLE_B].delivered == 1
+	assert receiver.unknown == 1
+
+def test_draining_delivers_the_newest():
+	receiver, delivered = asyncio.run(receive(traffic(), drain=True))
+	a = receiver.consoles[CONSOLE_A]
+	assert [(ip, p.packet_id) for ip, p in delivered] == [(CONSOLE_A, 5), (CONSOLE_B, 1)]
+	assert (a.received, a.delivered, a.skipped) == (8, 1, 3)
+	assert (a.stale, a.outOfOrder, a.lost, a.gaps) == (2, 1, 1, 1)
+
+def test_stats_peek_only_superseded_packets():
+	stats = PipelineStats()
+	receiver, delivered = asyncio.run(receive(traffic(), drain=True, stats=stats))
+	# the datagrams before the last of each console only have their header
+	# peeked at; the last ones are decrypted whole, as is the peeked packet
+	# that ends up delivered (the last of the first console is garbage)
+	assert stats.histograms['header'].count == 7
+	assert stats.histograms['decrypt'].count == 3
+	assert len(delivered) == 2
+
+@pytest.mark.parametrize('drain', [False, True])
+def test_fields(drain):
+	selection = FieldSelection(['packet_id', 'rpm'])
+	receiver, delivered = asyncio.run(receive(traffic(), drain=drain, fields=selection))
+	ids = [selection.record(selection.struct.unpack_from(p)).packet_id for ip, p in delivered if ip == CONSOLE_A]
+	assert ids == ([1, 2, 3, 5] if not drain else [5])
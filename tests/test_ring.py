@@ -0,0 +1,101 @@
+import os
+import struct
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from gt7capture import ip_to_int
+from gt7packet import decode, salsa20_dec
+from gt7ring import HEADER_SIZE, MAX_SOURCES, SLOT_SIZE, FrameReader, FrameWriter, RingError, ring_source
+from gt7synth import SyntheticCar
+
+CONSOLE_A = '192.168.1.10'
+CONSOLE_B = '192.168.1.11'
+
+@pytest.fixture
+def ring():
+	# a ring of 8 slots that two consoles publish to
+	writer = FrameWriter(f'gt7test{os.getpid()}', 8, [CONSOLE_A, CONSOLE_B])
+	yield writer
+	writer.close()
+
+def packets(n, seed=1):
+	car = SyntheticCar(seed=seed)
+	return [decode(salsa20_dec(car.datagram())) for i in range(n)]
+
+def publish(writer, count):
+	# alternately from each console, receive time = sequence number
+	for n, p in enumerate(packets(count)):
+		writer.publish(p, n, ip_to_int(CONSOLE_A if n % 2 == 0 else CONSOLE_B))
+
+def test_poll_in_order(ring):
+	reader = FrameReader(ring.shm.name)
+	assert reader.sources == [CONSOLE_A, CONSOLE_B]
+	assert reader.poll() == []
+	sent = packets(5)
+	for n, p in enumerate(sent):
+		ring.publish(p, 1000 + n, ip_to_int(CONSOLE_A if n % 2 == 0 else CONSOLE_B))
+	frames = reader.poll()
+	assert [(seq, ts, source) for seq, ts, source, p in frames] == [(n, 1000 + n, CONSOLE_A if n % 2 == 0 else CONSOLE_B) for n in range(5)]
+	assert [p for seq, ts, source, p in frames] == sent
+	assert reader.poll() == []
+	assert (reader.read, reader.lost) == (5, 0)
+	reader.close()
+
+def test_lapped_reader_skips_ahead(ring):
+	reader = FrameReader(ring.shm.name)
+	publish(ring, 20)
+	frames = reader.poll()
+	# the ring only holds the last 8
+	assert [seq for seq, ts, source, p in frames] == list(range(12, 20))
+	assert reader.lost == 12
+	reader.close()
+
+def test_from_start_and_latest(ring):
+	publish(ring, 5)
+	reader = FrameReader(ring.shm.name, fromStart=True)
+	assert [seq for seq, ts, source, p in reader.poll(limit=3)] == [0, 1, 2]
+	publish(ring, 2)
+	assert reader.latest()[0] == 6
+	assert reader.lost == 3
+	assert reader.latest() is None
+	reader.close()
+
+def test_torn_slot_is_not_read(ring):
+	reader = FrameReader(ring.shm.name)
+	publish(ring, 3)
+	# as the writer leaves a slot while it is being written
+	pos = HEADER_SIZE + 1 * SLOT_SIZE
+	ring.buf[pos:pos + 8] = struct.pack('<Q', (1 << 64) - 1)
+	assert [seq for seq, ts, source, p in reader.poll()] == [0, 2]
+	assert reader.lost == 1
+	reader.close()
+
+def test_ring_source(ring):
+	reader = FrameReader(ring.shm.name)
+	assert ring_source(reader, CONSOLE_B) == CONSOLE_B
+	with pytest.raises(RingError, match='--source'):
+		ring_source(reader)
+	with pytest.raises(RingError):
+		ring_source(reader, '10.0.0.1')
+	reader.close()
+	one = FrameWriter(f'gt7test{os.getpid()}one', 8, [CONSOLE_A])
+	try:
+		reader = FrameReader(one.shm.name)
+		assert ring_source(reader) == CONSOLE_A
+		reader.close()
+	finally:
+		one.close()
+	with pytest.raises(RingError):
+		FrameWriter(f'gt7test{os.getpid()}many', 8, [f'10.0.0.{i}' for i in range(MAX_SOURCES + 1)])
+
+def test_display_needs_a_console(ring):
+	# gt7telemetry.py refuses a ring of two consoles without --source
+	result = subprocess.run([sys.executable, os.path.join(ROOT, 'gt7telemetry.py'), '--ring', ring.shm.name], capture_output=True, text=True, timeout=30)
+	assert result.returncode == 2
+	assert 'pick one with --source' in result.stderr
+	result = subprocess.run([sys.executable, os.path.join(ROOT, 'gt7telemetry.py'), '--ring', ring.shm.name, '--source', '10.0.0.1'], capture_output=True, text=True, timeout=30)
+	assert result.returncode == 2
+	assert 'not in the ring' in result.stderr
@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import CONSOLE_B, ROOT
+from gt7rollup import TICK, Rollup
+
+LEVELS = [(1, 30), (10, 12), (60, 10)]
+
+@pytest.fixture(scope='module')
+def fed():
+	# 10 minutes of two channels at 60 Hz; the 1 s ring keeps the last 30 s
+	rng = np.random.default_rng(5)
+	t = np.arange(600 * 60) * TICK
+	values = np.stack([rng.normal(100, 20, len(t)), np.sin(t)], axis=1)
+	rollup = Rollup(['a', 'b'], LEVELS)
+	for ti, v in zip(t, values):
+		rollup.add(ti, v)
+	return rollup, t, values
+
+def buckets(t, values, resolution, start, end):
+	# min, max, mean and last of every bucket of the raw values
+	rows = []
+	for b in range(int(start // resolution), int(end // resolution) + 1):
+		v = values[(t >= b * resolution) & (t < (b + 1) * resolution)]
+		if len(v):
+			rows.append((b * resolution, v.min(axis=0), v.max(axis=0), v.mean(axis=0), v[-1]))
+	return rows
+
+@pytest.mark.parametrize('start, end, resolution', [(580, 599, 1), (490, 599, 10), (0, 599, 60), (590, 599.9, 1)])
+def test_query_matches_raw_values(fed, start, end, resolution):
+	rollup, t, values = fed
+	window = rollup.query(start, end, maxPoints=100)
+	assert window['resolution'] == resolution
+	expected = buckets(t, values, resolution, start, end)
+	assert window['t'].tolist() == [row[0] for row in expected]
+	for i, name in enumerate(['min', 'max', 'mean', 'last']):
+		assert np.allclose(window[name], [row[i + 1] for row in expected]), name
+
+def test_fewer_points_take_a_coarser_level(fed):
+	rollup = fed[0]
+	assert rollup.query(570, 599, maxPoints=10)['resolution'] == 10
+	assert rollup.query(570, 599, maxPoints=2)['resolution'] == 60
+	# older than the 10 s ring: the coarsest level, however many points
+	assert rollup.query(0, 599, maxPoints=10000)['resolution'] == 60
+
+def test_open_buckets(fed):
+	# the newest buckets of every level are still open and part of the query
+	rollup, t, values = fed
+	window = rollup.query(None, None, maxPoints=1000)
+	assert window['t'][-1] == 540
+	assert np.allclose(window['last'][-1], values[-1])
+	assert np.allclose(window['max'][-1], values[t >= 540].max(axis=0))
+
+def test_memory_is_fixed():
+	rollup = Rollup(['a'], LEVELS)
+	size = rollup.nbytes()
+	for n in range(10000):
+		rollup.add(n * 0.5, np.array([float(n)]))
+	assert rollup.nbytes() == size
+	assert rollup.query(None, None, 1000) is not None
+	assert Rollup(['a'], LEVELS).query() is None
+
+def test_packets_count_time_in_ids():
+	from types import SimpleNamespace
+	rollup = Rollup(['rpm'], LEVELS)
+	for n in range(120):
+		rollup.update(SimpleNamespace(packet_id=1000 + n * 2, rpm=float(n)))
+	assert rollup.now == pytest.approx(238 * TICK)
+	window = rollup.query()
+	assert window['t'].tolist() == [0.0, 1.0, 2.0, 3.0]
+	assert window['max'][:, 0].tolist() == [29.0, 59.0, 89.0, 119.0]
+
+def test_replay_needs_a_console(two_consoles):
+	script = os.path.join(ROOT, 'gt7rollup.py')
+	result = subprocess.run([sys.executable, script, 'replay', two_consoles], capture_output=True, text=True, timeout=60)
+	assert result.returncode != 0
+	assert '--source' in result.stderr
+	result = subprocess.run([sys.executable, script, 'replay', two_consoles, '--source', CONSOLE_B, '--points', '6'], capture_output=True, text=True, timeout=60)
+	assert result.returncode == 0, result.stderr
+	assert result.stderr.startswith('3000 packets')
+	assert result.stdout.startswith('car_speed at 10 s')
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import CONSOLE_A, CONSOLE_B, PACKETS
+from gt7batch import PACKET_DTYPE, BatchError, decode_capture
+from gt7capture import CaptureReader
+from gt7session import LAP_CHANNELS, TRACK_CHANNELS, Session, SessionError, write_session
+
+CHANNELS = [name for name in PACKET_DTYPE.names if name != 'magic']
+
+@pytest.fixture(scope='module')
+def decoded(capture):
+	with CaptureReader(capture) as reader:
+		return decode_capture(reader, CHANNELS)
+
+@pytest.fixture(scope='module')
+def session(capture, tmp_path_factory):
+	directory = str(tmp_path_factory.mktemp('session') / 'one')
+	assert write_session(capture, directory, chunk=500, track=7) == PACKETS
+	with Session(directory) as session:
+		yield session
+
+def test_round_trip(session, decoded):
+	data = session.read()
+	assert session.track == 7
+	assert data.dtype.names == ('ts',) + tuple(CHANNELS)
+	for name in data.dtype.names:
+		assert np.array_equal(data[name], decoded[name], equal_nan=data[name].dtype.kind == 'f'), name
+
+@pytest.mark.parametrize('start, stop', [(0, 1), (499, 501), (123, 2876), (2900, 5000), (-10, 10), (3000, 3000)])
+def test_rows_across_chunks(session, decoded, start, stop):
+	data = session.read(['packet_id', 'pos_x'], start, stop)
+	assert np.array_equal(data['packet_id'], decoded['packet_id'][max(start, 0):stop])
+	assert np.array_equal(data['pos_x'], decoded['pos_x'][max(start, 0):stop])
+
+def test_lap_index(session, decoded):
+	laps = session.laps
+	lap = decoded['current_lap']
+	assert laps['lap'].tolist() == [int(lap[0])] + lap[1:][lap[1:] != lap[:-1]].tolist()
+	assert laps['start'][0] == 0 and laps['stop'][-1] == PACKETS
+	assert (laps['start'][1:] == laps['stop'][:-1]).all()
+	for row in laps[:-1]:
+		assert row['lap_time'] == decoded['last_lap'][row['stop']]
+		assert row['ticks'] == decoded['packet_id'][row['stop']] - row['first_id']
+	assert laps['lap_time'][-1] == -1
+	number = int(laps['lap'][1])
+	data = session.lap(number, ['current_lap', 'packet_id'])
+	assert (data['current_lap'] == number).all()
+	assert data['packet_id'][0] == laps['first_id'][1]
+
+def test_some_channels(capture, tmp_path):
+	# the lap index and track channels are always stored
+	directory = str(tmp_path / 'rpm')
+	write_session(capture, directory, ['rpm'], track=7)
+	with Session(directory) as session:
+		assert session.order == ['ts', 'rpm'] + LAP_CHANNELS + TRACK_CHANNELS
+		with pytest.raises(SessionError, match='car_speed'):
+			session.read(['car_speed'])
+
+def test_errors(session, capture, tmp_path):
+	with pytest.raises(SessionError, match='no lap'):
+		session.lap(999)
+	with pytest.raises(SessionError, match='is not a'):
+		Session(str(tmp_path))
+	# overwritten: unfinished until the new session.json is in place
+	directory = str(tmp_path / 'again')
+	write_session(capture, directory, ['rpm'], track=7)
+	os.remove(os.path.join(directory, 'session.json'))
+	with pytest.raises(SessionError):
+		Session(directory)
+	assert write_session(capture, directory, ['rpm'], track=8) == PACKETS
+	with Session(directory) as session:
+		assert session.track == 8
+
+def test_session_needs_a_console(two_consoles, tmp_path):
+	with pytest.raises(BatchError, match='--source'):
+		write_session(two_consoles, str(tmp_path / 'both'), track=7)
+	assert write_session(two_consoles, str(tmp_path / 'b'), source=CONSOLE_B, track=7) == PACKETS
+	with Session(str(tmp_path / 'b')) as session:
+		assert session.read(['packet_id'])['packet_id'][0] == 500
+		assert session.meta['source'] == CONSOLE_B
+	assert write_session(two_consoles, str(tmp_path / 'a'), source=CONSOLE_A, track=7) == PACKETS
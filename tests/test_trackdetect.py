@@ -0,0 +1,171 @@
+import csv
+import os
+import runpy
+import shutil
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import ROOT
+import numpy as np
+
+from gt7track import CELL_SIZE, StreamingDetector, heading_of, TrackBounds, TrackIndex, find_matching_track, load_track_bounds
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# The script, against a stand-in for granturismo's Listener
+
+def listener_for(feed):
+	class Listener:
+		def __init__(self, ip):
+			self.feed = iter(feed)
+
+		def start(self):
+			pass
+
+		def close(self):
+			pass
+
+		def get(self):
+			# StopIteration ends the script once the feed is used up
+			lap, x, z = next(self.feed)
+			flags = SimpleNamespace(loading_or_processing=False, paused=False, car_on_track=True)
+			return SimpleNamespace(flags=flags, lap_count=lap, position=SimpleNamespace(x=x, z=z), velocity=SimpleNamespace(x=1.0, z=0.0))
+	return Listener
+
+def run_script(feed, tmp_path, monkeypatch):
+	intake = types.ModuleType('granturismo.intake')
+	intake.Listener = listener_for(feed)
+	granturismo = types.ModuleType('granturismo')
+	granturismo.intake = intake
+	monkeypatch.setitem(sys.modules, 'granturismo', granturismo)
+	monkeypatch.setitem(sys.modules, 'granturismo.intake', intake)
+	# the compiled database goes next to the CSV: keep it out of the tree
+	shutil.copy(os.path.join(ROOT, 'gt7trackdetect.csv'), tmp_path)
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setattr(sys, 'argv', ['gt7trackdetect.py', '127.0.0.1', '--prints', str(tmp_path / 'prints.csv')])
+	with pytest.raises(StopIteration):
+		runpy.run_path(os.path.join(ROOT, 'gt7trackdetect.py'), run_name='__main__')
+
+def test_script_matches_a_lap_crossing(tmp_path, monkeypatch, capsys):
+	with open(os.path.join(ROOT, 'gt7trackdetect.csv'), newline='') as f:
+		row = next(csv.DictReader(f))
+	assert row['DIRECTION'] == 'PX'
+	mx = (float(row['P1X']) + float(row['P2X'])) / 2
+	my = (float(row['P1Y']) + float(row['P2Y'])) / 2
+	# the corners of the track's bounds on lap 1, then across the line
+	feed = [(1, float(row['MINX']), float(row['MINY'])), (1, float(row['MAXX']), float(row['MAXY'])), (1, mx - 1, my), (2, mx + 1, my)]
+	run_script(feed, tmp_path, monkeypatch)
+	assert f'Got a +96% match: {row["TRACK"]}' in capsys.readouterr().out
+
+def test_database_index_matches(tmp_path):
+	# the index of the compiled database is a TrackIndex like any other
+	from gt7trackdb import load_database
+	csvFile = shutil.copy(os.path.join(ROOT, 'gt7trackdetect.csv'), tmp_path)
+	index = load_database(csvFile, str(tmp_path / 'prints.csv'))[0]
+	tracks = load_track_bounds(csvFile)
+	e = tracks[0]
+	mx, my = (e.P1X + e.P2X) / 2, (e.P1Y + e.P2Y) / 2
+	q = (mx - 1, my, mx + 1, my, e.MINX, e.MINY, e.MAXX, e.MAXY)
+	assert find_matching_track(*q, index) == find_matching_track(*q, tracks)
+	assert find_matching_track(*q, index)[0][1] == e.TRACK
+
+@pytest.fixture(scope='module')
+def track_bounds():
+	return load_track_bounds(os.path.join(ROOT, 'gt7trackdetect.csv'))
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def test_streaming_nowhere_known(track_bounds):
+	detector = StreamingDetector(TrackIndex(track_bounds), {})
+	for i in range(200):
+		assert detector.update(1e6 + i * CELL_SIZE, 1e6, 1.0, 0.0) is None
+	assert len(detector.candidates()) == len(track_bounds)
+
+def bounds(track, maxX, maxY):
+	return TrackBounds(TRACK=track, P1X=0, P1Y=0, P2X=0, P2Y=10, DIRECTION='PX', MINX=0, MINY=0, MAXX=maxX, MAXY=maxY)
+
+def test_streaming_needs_a_margin_without_fingerprints():
+	# no fingerprints: the big track is only reported once it has covered
+	# minMargin more cells than the small one, not as soon as it is the last
+	detector = StreamingDetector(TrackIndex([bounds(1, 2000, 2000), bounds(2, 300, 300)]), {}, minSteps=8, minMargin=8)
+	x = CELL_SIZE / 2
+	while x <= 300 + CELL_SIZE:
+		assert detector.update(x, 100, 10.0, 0.0) is None
+		x += CELL_SIZE
+	assert detector.candidates() == [1, 2]
+	for i in range(7):
+		assert detector.update(x, 100, 10.0, 0.0) is None
+		x += CELL_SIZE
+	assert detector.candidates() == [1]
+	assert detector.update(x, 100, 10.0, 0.0) == 1
+
+def test_streaming_starts_over_when_lost(track_bounds):
+	index = TrackIndex(track_bounds)
+	e = track_bounds[0]
+	detector = StreamingDetector(index, {})
+	detector.update((e.MINX + e.MAXX) / 2, (e.MINY + e.MAXY) / 2)
+	narrowed = len(detector.candidates())
+	assert narrowed < index.count
+	detector.update(1e6, 1e6)
+	assert detector.misses == 1
+	assert len(detector.candidates()) == index.count
+
+def brute_force(track_bounds, prints, walk):
+	# The candidates after each cell of a walk, every track checked every time
+	def covers(e, x, y, cell):
+		if e.TRACK in prints:
+			cx, cy, h = cell
+			return any(abs(cx - px) <= 1 and abs(cy - py) <= 1 and (h - ph) % 8 in (0, 1, 7) for px, py, ph in prints[e.TRACK])
+		return e.MINX - CELL_SIZE <= x <= e.MAXX + CELL_SIZE and e.MINY - CELL_SIZE <= y <= e.MAXY + CELL_SIZE
+	alive = list(track_bounds)
+	after = []
+	for x, y, cell in walk:
+		left = [e for e in alive if covers(e, x, y, cell)]
+		alive = left or [e for e in track_bounds if covers(e, x, y, cell)] or list(track_bounds)
+		after.append(sorted(e.TRACK for e in alive))
+	return after
+
+def test_streaming_matches_brute_force(track_bounds):
+	# a drive across the map, through tracks with and without fingerprints
+	rng = np.random.default_rng(3)
+	e = track_bounds[0]
+	x, y = e.MINX, e.MINY
+	walk = []
+	for i in range(400):
+		x += rng.uniform(0, 40)
+		y += rng.uniform(-20, 20)
+		walk.append((x, y, (int(np.floor(x / CELL_SIZE)), int(np.floor(y / CELL_SIZE)), heading_of(10.0, 0.0))))
+	# fingerprints of every other track along the way
+	prints = {t.TRACK: {cell for x, y, cell in walk[::7]} for t in track_bounds[::2]}
+	detector = StreamingDetector(TrackIndex(track_bounds), prints, minSteps=10**6)
+	expected = brute_force(track_bounds, prints, walk)
+	for (x, y, cell), tracks in zip(walk, expected):
+		detector.update(x, y, 10.0, 0.0)
+		assert sorted(detector.candidates()) == tracks
+
+def test_streaming_fingerprint_matches_at_once():
+	# with a fingerprint the last candidate is a match after minSteps
+	prints = {1: {(n, 4, 4) for n in range(40)}}
+	detector = StreamingDetector(TrackIndex([bounds(1, 2000, 2000), bounds(2, 2000, 2000)]), prints, minSteps=4)
+	steps = [detector.update((n + 0.5) * CELL_SIZE, 4.5 * CELL_SIZE, 10.0, 0.0) for n in range(4)]
+	assert detector.candidates() == [1, 2]
+	assert steps == [None] * 4
+	# off the fingerprint: only the box of track 2 still covers it
+	assert detector.update(4.5 * CELL_SIZE, 20.5 * CELL_SIZE, 10.0, 0.0) is None
+	assert detector.candidates() == [2]
+
+def test_streaming_database_tables(track_bounds, tmp_path):
+	# the tables mapped from the compiled database narrow down the same way
+	from gt7trackdb import load_database
+	csvFile = shutil.copy(os.path.join(ROOT, 'gt7trackdetect.csv'), tmp_path)
+	index, tables = load_database(csvFile, str(tmp_path / 'prints.csv'))
+	mapped = StreamingDetector(index, tables=tables)
+	built = StreamingDetector(TrackIndex(track_bounds), {})
+	e = track_bounds[5]
+	for n in range(60):
+		x = e.MINX + (e.MAXX - e.MINX) * n / 60
+		y = e.MINY + (e.MAXY - e.MINY) * n / 60
+		assert mapped.update(x, y, 10.0, 10.0) == built.update(x, y, 10.0, 10.0)
+		assert mapped.candidates() == built.candidates()
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from conftest import ROOT
+from gt7bench import tiled_tracks, track_queries
+from gt7track import TrackIndex, find_matching_track, load_track_bounds
+
+@pytest.fixture(scope='module')
+def track_bounds():
+	return load_track_bounds(os.path.join(ROOT, 'gt7trackdetect.csv'))
+
+@pytest.mark.parametrize('size', [100, 1000])
+def test_index_matches_linear_scan(track_bounds, size):
+	tracks = tiled_tracks(track_bounds, size)
+	index = TrackIndex(tracks)
+	queries = track_queries(track_bounds)
+	assert queries
+	for q in queries:
+		assert index.find_matching_track(*q) == find_matching_track(*q, tracks)
+
+def test_index_misses(track_bounds):
+	index = TrackIndex(track_bounds)
+	q = (1e6 - 1, 1e6, 1e6 + 1, 1e6, 1e6 - 10, 1e6 - 10, 1e6 + 10, 1e6 + 10)
+	assert not find_matching_track(*q, track_bounds)
+	assert index.find_matching_track(*q) == find_matching_track(*q, track_bounds)
+
+def test_index_through_find_matching_track(track_bounds):
+	# find_matching_track hands an index its own query
+	index = TrackIndex(track_bounds)
+	for q in track_queries(track_bounds):
+		assert find_matching_track(*q, index) == index.find_matching_track(*q)
@@ -0,0 +1,93 @@
+import csv
+import io
+import os
+import shutil
+
+import numpy as np
+
+from conftest import CONSOLE_A, CONSOLE_B, ROOT
+from gt7batch import decode_capture
+from gt7capture import CaptureReader
+from gt7track import FINGERPRINT_CHANNELS, fingerprint_cells, load_fingerprints
+from gt7capture import int_to_ip
+import gt7tracktag
+from gt7tracktag import FIELDS, build_fingerprints, fingerprint_runs, load_table, runs, tag_directory, tag_session
+
+def row(filename, source, run, track, iou, matches):
+	return {'FILE': filename, 'SHA256': 'ab' * 32, 'SIZE': '0', 'MTIME': '0', 'SOURCE': source, 'RUN': str(run), 'TRACK': str(track), 'IOU': str(iou), 'MATCHES': matches}
+
+def test_fingerprint_runs(two_consoles):
+	with CaptureReader(two_consoles) as reader:
+		data = decode_capture(reader, FINGERPRINT_CHANNELS + ['current_lap'])
+	data = data[(data['flags'] & 0b111) == 0b001]
+	expected = {}
+	for source in np.unique(data['source']):
+		own = data[data['source'] == source]
+		for run, (start, stop) in enumerate(runs(own['current_lap'])):
+			expected[int_to_ip(int(source)), run] = fingerprint_cells(own[start:stop])
+	cells = fingerprint_runs(two_consoles)
+	assert {source for source, run in cells} == {CONSOLE_A, CONSOLE_B}
+	assert cells == expected
+	assert all(cells.values())
+
+def test_build_fingerprints(two_consoles, tmp_path):
+	# only runs with a single confident match go in, added to what is there
+	printsFile = str(tmp_path / 'prints.csv')
+	cells = fingerprint_runs(two_consoles)
+	table = [row(two_consoles, CONSOLE_A, 0, 847, 0.99, '847'), row(two_consoles, CONSOLE_B, 0, 853, 0.99, '853|854'), row(two_consoles, CONSOLE_B, 0, 900, 0.5, '900')]
+	build_fingerprints(table, printsFile, out=io.StringIO())
+	assert load_fingerprints(printsFile) == {847: cells[CONSOLE_A, 0]}
+	build_fingerprints([row(two_consoles, CONSOLE_B, 0, 847, 0.97, '847')], printsFile, out=io.StringIO())
+	assert load_fingerprints(printsFile) == {847: cells[CONSOLE_A, 0] | cells[CONSOLE_B, 0]}
+
+def test_build_fingerprints_missing_file(tmp_path):
+	printsFile = str(tmp_path / 'prints.csv')
+	build_fingerprints([row(str(tmp_path / 'gone.gt7'), CONSOLE_A, 0, 847, 0.99, '847')], printsFile, out=io.StringIO())
+	assert load_fingerprints(printsFile) == {}
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Tagging a directory
+
+def archive(tmp_path, *captures):
+	directory = tmp_path / 'sessions'
+	directory.mkdir()
+	for n, capture in enumerate(captures):
+		shutil.copy(capture, directory / f'{n}.gt7')
+	shutil.copy(os.path.join(ROOT, 'gt7trackdetect.csv'), tmp_path)
+	return str(directory), str(tmp_path / 'gt7trackdetect.csv'), str(tmp_path / 'prints.csv'), str(tmp_path / 'tags.csv')
+
+def tag(directory, csvFile, printsFile, output):
+	out = io.StringIO()
+	tag_directory(directory, output, csvFile, printsFile, workers=1, out=out)
+	return out.getvalue()
+
+def test_runs_per_console(two_consoles, tmp_path):
+	directory, csvFile, printsFile, output = archive(tmp_path, two_consoles)
+	assert tag(directory, csvFile, printsFile, output).startswith('1 tagged')
+	table = load_table(output)
+	assert {row['SOURCE'] for row in table} == {CONSOLE_A, CONSOLE_B}
+	for source in (CONSOLE_A, CONSOLE_B):
+		assert [row['RUN'] for row in table if row['SOURCE'] == source][0] == '0'
+	# tagged already: nothing to read the second time
+	assert tag(directory, csvFile, printsFile, output).startswith('0 tagged, 0 already known, 0 failed, 1 unchanged')
+	assert load_table(output) == table
+
+def test_table_without_source_is_tagged_again(capture, tmp_path):
+	directory, csvFile, printsFile, output = archive(tmp_path, capture)
+	with open(output, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow([name for name in FIELDS if name != 'SOURCE'])
+		writer.writerow([os.path.join(directory, '0.gt7'), 'ab' * 32, 1, 1, 0, '', '', ''])
+	assert tag(directory, csvFile, printsFile, output).startswith('1 tagged')
+	with open(output, newline='') as f:
+		assert next(csv.reader(f)) == FIELDS
+	assert [row['SOURCE'] for row in load_table(output)] == [CONSOLE_A]
+
+def test_vanished_file(tmp_path):
+	# a file removed between the listing and its worker is an error row, not
+	# an exception out of the pool
+	csvFile = shutil.copy(os.path.join(ROOT, 'gt7trackdetect.csv'), tmp_path)
+	gt7tracktag._init_worker(csvFile, str(tmp_path / 'prints.csv'), set())
+	filename, digest, size, mtime, error = tag_session(str(tmp_path / 'gone.gt7'))
+	assert digest is None and size is None
+	assert 'gone.gt7' in error
@@ -0,0 +1,119 @@
+import asyncio
+import base64
+import json
+import math
+import os
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+from gt7web import PRECISION, DashboardServer, Viewer, accept_key, read_frame, ws_frame
+
+CONSOLE = '127.0.0.41'
+
+class Sink:
+	# Stands in for a viewer's StreamWriter
+	def __init__(self):
+		self.data = bytearray()
+
+	def write(self, data):
+		self.data += data
+
+def packet(packet_id, **values):
+	return SimpleNamespace(packet_id=packet_id, **values)
+
+def test_frames_carry_changes_only():
+	viewer = Viewer(Sink(), CONSOLE, ['rpm', 'current_lap', 'water_temp'], 10)
+	assert viewer.frame(packet(1, rpm=3000.0, current_lap=1, water_temp=85.0)) == {'rpm': 3000.0, 'current_lap': 1, 'water_temp': 85.0}
+	assert viewer.frame(packet(2, rpm=3100.0, current_lap=1, water_temp=85.0)) == {'rpm': 3100.0}
+	# below the precision sent: no change
+	assert viewer.frame(packet(3, rpm=3100.0 + 10 ** -(PRECISION + 2), current_lap=1, water_temp=85.0)) == {}
+	assert viewer.frame(packet(4, rpm=math.nan, current_lap=2, water_temp=85.0)) == {'rpm': None, 'current_lap': 2}
+	assert viewer.frame(packet(5, rpm=math.inf, current_lap=2, water_temp=85.0)) == {}
+
+def test_resubscribing_starts_over():
+	viewer = Viewer(Sink(), CONSOLE, ['rpm'], 10)
+	p = packet(1, rpm=3000.0, current_lap=1)
+	viewer.frame(p)
+	viewer.subscribe(['rpm', 'current_lap'])
+	assert viewer.frame(p) == {'rpm': 3000.0, 'current_lap': 1}
+	viewer.subscribe(rate=5)
+	assert viewer.frame(p) == {}
+	assert viewer.rate == 5
+
+def test_ws_frames():
+	async def roundtrip(payload):
+		reader = asyncio.StreamReader()
+		reader.feed_data(ws_frame(payload))
+		return await read_frame(reader)
+	for size in (0, 125, 126, 60000):
+		assert asyncio.run(roundtrip(b'x' * size)) == (0x1, b'x' * size)
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Viewers over a socket
+
+def client_frame(payload, opcode=0x1):
+	# a masked frame, as a browser sends them
+	mask = os.urandom(4)
+	masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+	return struct.pack('!BB', 0x80 | opcode, 0x80 | len(payload)) + mask + masked
+
+async def connect(port, query):
+	reader, writer = await asyncio.open_connection('127.0.0.1', port)
+	key = base64.b64encode(os.urandom(16)).decode()
+	writer.write(f'GET /ws?{query} HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n\r\n'.encode())
+	response = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+	return reader, writer, response, key
+
+async def message(reader):
+	opcode, payload = await asyncio.wait_for(read_frame(reader), 5)
+	return json.loads(payload)
+
+def with_server(test):
+	async def run():
+		dashboard = DashboardServer([CONSOLE], maxRate=50)
+		# no receiver socket: packets are handed in through on_packet
+		dashboard.server = await asyncio.start_server(dashboard.handle, '127.0.0.1', 0)
+		try:
+			await test(dashboard, dashboard.server.sockets[0].getsockname()[1])
+		finally:
+			dashboard.server.close()
+			for viewer in list(dashboard.viewers):
+				viewer.writer.close()
+	asyncio.run(run())
+
+@pytest.mark.parametrize('rate', ['0', '-5', 'nan', 'inf', 'fast'])
+def test_bad_rate_is_refused(rate):
+	async def test(dashboard, port):
+		reader, writer, response, key = await connect(port, f'console={CONSOLE}&rate={rate}')
+		assert response.startswith('HTTP/1.1 400')
+		assert not dashboard.viewers
+		writer.close()
+	with_server(test)
+
+def test_viewer_gets_changes():
+	console = SimpleNamespace(ip=CONSOLE)
+	async def test(dashboard, port):
+		dashboard.on_packet(packet(1, rpm=3000.0, current_lap=1), 0, console)
+		reader, writer, response, key = await connect(port, f'console={CONSOLE}&channels=rpm,current_lap&rate=100')
+		assert response.startswith('HTTP/1.1 101') and accept_key(key) in response
+		assert await message(reader) == {'console': CONSOLE, 'channels': ['rpm', 'current_lap'], 'rate': 50}
+		assert await message(reader) == {'id': 1, 'c': {'rpm': 3000.0, 'current_lap': 1}}
+		dashboard.on_packet(packet(2, rpm=3500.0, current_lap=1), 0, console)
+		assert await message(reader) == {'id': 2, 'c': {'rpm': 3500.0}}
+		# a bad rate is an error message, the subscription stays
+		for rate in (0, -1, 'x', [1]):
+			writer.write(client_frame(json.dumps({'rate': rate}).encode()))
+			assert 'error' in await message(reader)
+		writer.write(client_frame(b'{"rate": NaN}'))
+		assert 'error' in await message(reader)
+		writer.write(client_frame(json.dumps({'rate': 20}).encode()))
+		assert (await message(reader))['rate'] == 20
+		dashboard.on_packet(packet(3, rpm=3500.0, current_lap=2), 0, console)
+		assert await message(reader) == {'id': 3, 'c': {'current_lap': 2}}
+		writer.write(client_frame(b'\x03\xe8', 0x8))
+		opcode, payload = await asyncio.wait_for(read_frame(reader), 5)
+		assert opcode == 0x8
+		writer.close()
+	with_server(test)